@@ -1,4 +1,4 @@
-import copy  # Used for Deepcopy, to never edit the raw data frame
+import collections
 import yaml
 
 import numpy as np
@@ -101,11 +101,11 @@ def import_tform_config(tform_config_path='.\tform_config.yaml', raw_df=None):
             assert getattr(transform, each_tform[1]), \
                 "Transform '{}' Not Available ".format(each_tform[1]) +\
                 "from Tform_1d1d."
-            if type(each_tform[2]) == 'int':
+            if isinstance(each_tform[2], int):
                 assert each_tform[2] >= 0 and each_tform[2] < df_cols, \
                     "Source Column given in '{}' out of Range" \
                     .format(command) + " Of Raw DataFrame."
-            if type(each_tform[2]) == 'tuple':
+            if isinstance(each_tform[2], (list, tuple)):
                 assert 4 >= len(each_tform[2]), 'too many arguments' +\
                     ' provided. Maximum of 4 allow at the moment.'
     print("Successfully Loaded {} Transforms to Try!".format(
@@ -113,7 +113,8 @@ def import_tform_config(tform_config_path='.\tform_config.yaml', raw_df=None):
     return tform_command_list, tform_command_dict
 
 
-def apply_tform(raw_df, tform_commands, rgb_col_number=6):
+def apply_tform(raw_df, tform_commands, rgb_col_number=6, cache=None,
+                key=None):
     """ Function that applies transformations
 
     Parameters
@@ -132,6 +133,20 @@ def apply_tform(raw_df, tform_commands, rgb_col_number=6):
                      (Index=1, transform, source),
                      (Index=2, transform, source),
                      As explained elsewhere
+                     The source is a column number, or a list
+                     [x, y, meta...] for the two-array transforms (power):
+                     y can be 'None'.
+    cache : TformCache (optional)
+            memo of the transformed columns, shared by the transform runs.
+            A column already made for this file (same key) by another run
+            is taken from it instead of being computed again.
+    key : hashable (optional)
+          the name of the file raw_df comes from, used by the cache (and
+          needed with it: the columns of the files are told apart by it)
+
+    The raw data is never copied, nor written to: each transform is given
+    a read-only view of its source column (see _read_only_column), and only
+    the new output array is written.
 
     Returns
     -------
@@ -142,55 +157,235 @@ def apply_tform(raw_df, tform_commands, rgb_col_number=6):
               and the remainder are passed as zero (with # as col name?)
 
     """
+    if cache is not None and key is None:
+        raise ValueError('apply_tform needs the key of the file to use a'
+                         ' cache')
     # First get new column names:
     old_names = list(raw_df.columns)
+    assert len(old_names) > 0, 'the raw dataframe has no columns'
     new_names = list(range(rgb_col_number))
     for command in tform_commands:
-        if type(command[2]) == 'int':
-            new_names[command[0]] = old_names[command[2]] + '__tform__' +\
-                command[1]
-        elif type(command[2]) == 'tuple' and command[1] == 'power':
-            if command[2][1] == 'None':
-                new_names[command[0]] = old_names[command[2][0]] +\
-                    '__tform__' + command[1]
-            else:
-                new_names[command[0]] = str(old_names[command[2][0]] + '*' +
-                                            old_names[command[2][1]]) +\
-                                          '__tform__' + command[1]
-
-    # Now initialize output df with zeros from length of first df column
-    df_len = len(raw_df[old_names[0]])
-    zero_arr = np.zeros([df_len, rgb_col_number])
-    tform_df = pd.DataFrame(data=zero_arr, columns=new_names)
-
-    # And now, apply each transform and assign the output to the
-    #   Column as instructed in that command
+        new_names[command[0]] = _tform_column_name(old_names, command)
+
+    # Now initialize output data with zeros from length of first df column,
+    #   apply each transform and place the output in the column
+    #   as instructed in that command
+    tform_data = np.zeros([len(raw_df), rgb_col_number])
     for command in tform_commands:
-        if type(command[2]) == 'int':
-            target_raw = raw_df[old_names[command[2]]]
-            # Get raw data (series?) from source
-            # Perform the tform
-            transform_function = getattr(transform, command[1])
-            tform_data = transform_function(target_raw)
-            # Save in output df
-            tform_df[new_names[command[0]]] = tform_data
-        if type(command[2]) == 'list':
-            # if command[1] == 'power':
-            # the power trasnformation is in the form of x^(n)y^(m).
-            # the arguments should be inputted as (x, y, n, m)
-            data_series_1 = raw_df[old_names[command[2][0]]]
-            data_series_2 = raw_df[old_names[command[2][1]]]
-            if len(command[2]) == 2:
-                meta_data = None
-            else:
-                meta_data = command[2][2:]
-            transform_function = getattr(transform, command[1])
-            tform_data = transform_function(
-                    data_series_1, data_series_2, meta_data)
+        if cache is None:
+            tform_data[:, command[0]] = _tform_column(raw_df, command)
+        else:
+            tform_data[:, command[0]] = cache.get(
+                (key,) + tform_key(command),
+                lambda: _tform_column(raw_df, command))
+    tform_df = pd.DataFrame(data=tform_data, columns=new_names)
     return tform_df
 
 
-def tform_tuples(list_of_tuples, tform_commands, rgb_format="RGBrgb"):
+def tform_key(command):
+    """
+    The (transform, source) key of a tform command: the part of it that
+    decides the data of the column (the Index only decides where it goes).
+    List sources, [x, y, meta...], are made into tuples.
+    """
+    source = command[2]
+    if isinstance(source, (list, tuple)):
+        source = tuple(source)
+    return (command[1], source)
+
+
+def _tform_column_name(old_names, command):
+    """
+    Name of the column made by a tform command:
+    SourceColumnName__tform__TformName, with 'x*y' as the source name of
+    the two-array transforms.
+    """
+    if isinstance(command[2], (list, tuple)):
+        if len(command[2]) < 2 or command[2][1] in (None, 'None'):
+            source_name = old_names[command[2][0]]
+        else:
+            source_name = str(old_names[command[2][0]] + '*' +
+                              old_names[command[2][1]])
+    else:
+        source_name = old_names[command[2]]
+    return source_name + '__tform__' + command[1]
+
+
+def _tform_column(raw_df, command):
+    """
+    The transformed data of one tform command, as a 1-d array.
+    """
+    transform_function = getattr(transform, command[1])
+    if isinstance(command[2], (list, tuple)):
+        # the power trasnformation is in the form of x^(n)y^(m).
+        # the arguments should be inputted as (x, y, n, m)
+        data_series_1 = _read_only_column(raw_df, command[2][0])
+        if len(command[2]) < 2 or command[2][1] in (None, 'None'):
+            data_series_2 = None
+        else:
+            data_series_2 = _read_only_column(raw_df, command[2][1])
+        if len(command[2]) <= 2:
+            meta_data = None
+        else:
+            meta_data = command[2][2:]
+        tform_data = transform_function(
+                data_series_1, data_series_2, meta_data)
+    else:
+        # Get raw data from source and perform the tform
+        target_raw = _read_only_column(raw_df, command[2])
+        tform_data = transform_function(target_raw)
+    return np.asarray(tform_data)
+
+
+def _read_only_column(raw_df, column):
+    """
+    Read-only numpy view of column number `column` of raw_df (a copy only
+    if pandas has to make one, e.g. for a column of mixed types). Any
+    transform that tries to edit it in place raises a ValueError, so the
+    raw data can be shared by every transform run without a defensive copy.
+    """
+    data = raw_df.iloc[:, column].to_numpy().view()
+    data.setflags(write=False)
+    return data
+
+
+def plan_tform_keys(tform_command_dict, tform_command_list=None):
+    """
+    Collect the distinct (transform, source) keys of the transform runs,
+    with the number of runs that use each of them.
+
+    Parameters
+    ----------
+    tform_command_dict : dict of List-of-Transform-tuples
+                         as given by import_tform_config
+    tform_command_list : list of str (optional)
+                         the runs to plan for. Default is all of the dict.
+
+    Returns
+    -------
+    key_runs : dict
+               {(transform, source): number of runs using it}. The keys
+               used by more than one run are worth keeping in a TformCache.
+    """
+    if tform_command_list is None:
+        tform_command_list = list(tform_command_dict.keys())
+    key_runs = {}
+    for run in tform_command_list:
+        if tform_command_dict[run] is None:
+            continue
+        for key in set(tform_key(command)
+                       for command in tform_command_dict[run]):
+            key_runs[key] = key_runs.get(key, 0) + 1
+    return key_runs
+
+
+class TformCache():
+    """
+    Memo of the transformed columns of each file, shared by the transform
+    runs of hardy_multi_transform, so that a (transform, source) pair used
+    by many runs (as 'raw' of the same column often is) is only computed
+    once per file.
+
+    The columns are kept in least recently used order, within a budget of
+    max_bytes: when it is passed, the oldest columns are dropped first.
+    As the runs go one after the other over all of the files, a budget
+    smaller than the shared columns of the whole data set drops each column
+    before the next run asks for it: fill() makes them all up front, one
+    file at a time, and tells if they fit.
+
+    Parameters
+    ----------
+    max_bytes : int
+                memory budget of the kept columns, in bytes
+    shared_keys : iterable (optional)
+                  the (transform, source) keys worth keeping (e.g. the ones
+                  plan_tform_keys finds in more than one run). The other
+                  columns are computed, but not kept. Default keeps all.
+    """
+
+    def __init__(self, max_bytes=256*2**20, shared_keys=None):
+        self.max_bytes = max_bytes
+        if shared_keys is not None:
+            shared_keys = set(shared_keys)
+        self.shared_keys = shared_keys
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._columns = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __contains__(self, key):
+        return key in self._columns
+
+    def get(self, key, compute):
+        """
+        The column of key, (file key, transform, source), made with
+        compute() if it is not kept yet. (Only the columns of the keys
+        worth keeping count as hits or misses.)
+        """
+        if key in self._columns:
+            self._columns.move_to_end(key)
+            self.hits += 1
+            return self._columns[key]
+        if self.shared_keys is not None and key[1:] not in self.shared_keys:
+            return compute()
+        self.misses += 1
+        # A copy that owns its data, so that nbytes is what is kept
+        column = np.array(compute())
+        self._put(key, column)
+        return column
+
+    def fill(self, list_of_tuples):
+        """
+        Makes the columns of the shared_keys of every file, going through
+        the files once (each column is made once per file), so that the
+        runs only take them from the cache.
+
+        Parameters
+        ----------
+        list_of_tuples : iterable of tuples
+                         the (filename_str, DataFrame, label) raw tuples
+
+        Returns
+        -------
+        filled : bool
+                 False if the columns did not fit in max_bytes, in which
+                 case the cache is left empty (it would only drop them
+                 before they are used)
+        """
+        if self.shared_keys is None:
+            raise ValueError('TformCache.fill needs the shared_keys')
+        commands = [[0, key[0], list(key[1]) if isinstance(key[1], tuple)
+                     else key[1]] for key in self.shared_keys]
+        for raw_data in list_of_tuples:
+            for command in commands:
+                self.misses += 1
+                column = np.array(_tform_column(raw_data[1], command))
+                if self.nbytes + column.nbytes > self.max_bytes:
+                    self.clear()
+                    return False
+                self._put((raw_data[0],) + tform_key(command), column)
+        return True
+
+    def _put(self, key, column):
+        if column.nbytes > self.max_bytes:
+            return
+        column.setflags(write=False)
+        self._columns[key] = column
+        self.nbytes += column.nbytes
+        while self.nbytes > self.max_bytes:
+            old_key, old_column = self._columns.popitem(last=False)
+            self.nbytes -= old_column.nbytes
+
+    def clear(self):
+        self._columns.clear()
+        self.nbytes = 0
+
+
+def tform_tuples(list_of_tuples, tform_commands, rgb_format="RGBrgb",
+                 cache=None):
     """
     Wrapping function to apply a list of transform commands to each
     dataframe in the list_of_tuples, and replace it with a same-format
@@ -207,6 +402,10 @@ def tform_tuples(list_of_tuples, tform_commands, rgb_format="RGBrgb"):
         String of how we will parse the output files.
         Input here to get the output dataframe size.
         The default is "RGBrgb".
+    cache : TformCache, optional
+        memo of the transformed columns of each file, shared by the
+        transform runs (see apply_tform). The files are told apart by
+        their filename_str.
 
     Returns
     -------
@@ -214,16 +413,131 @@ def tform_tuples(list_of_tuples, tform_commands, rgb_format="RGBrgb"):
         Formatted the same as the input list, but each DataFrame is
         replaced with the Transformed DF.
 
+    """
+    transformed_tuples = list(iter_tform_tuples(list_of_tuples,
+                                                tform_commands,
+                                                rgb_format=rgb_format,
+                                                cache=cache))
+
+    return transformed_tuples
+
+
+def iter_tform_tuples(list_of_tuples, tform_commands, rgb_format="RGBrgb",
+                      cache=None):
+    """
+    Generator version of tform_tuples: yields each transformed tuple
+    (filename_str, DataFrame, label) as soon as it is made, so that
+    list_of_tuples can itself be a generator of raw tuples.
+    The raw DataFrames are not copied (apply_tform only reads them).
     """
     rgb_n = len(rgb_format)
-    transformed_tuples = []
     for raw_data in list_of_tuples:
         fname = raw_data[0]
-        raw_df = copy.deepcopy(raw_data[1])
-        # ^DeepCopy will FORCE writing new data to avoid messing with RAW.
+        raw_df = raw_data[1]
         label = raw_data[2]
-        tform_df = apply_tform(raw_df, tform_commands, rgb_n)
-        tform_tup = (fname, tform_df, label)
-        transformed_tuples.append(tform_tup)
+        tform_df = apply_tform(raw_df, tform_commands, rgb_n, cache=cache,
+                               key=fname)
+        yield (fname, tform_df, label)
+
+
+# Transforms of transformations.py that work along the last axis of a
+#   (n_files, n_points) array (cwt_1d does not: its output is 2-D).
+_AXIS_AWARE = ('raw', 'exp', 'nlog', 'log10', 'reciprocal', 'cumsum',
+               'derivative_1d', 'derivative_2d', 'power')
+
+
+def batch_tform_tuples(list_of_tuples, tform_commands, rgb_format="RGBrgb"):
+    """
+    Batch version of tform_tuples: the same transformed tuples, made with
+    one call of each transform for a whole group of files instead of one
+    call per file.
+
+    The files are grouped by shape (number of rows, and column names), and
+    the data of each group stacked into one (n_files, n_points, n_columns)
+    array; each transform then works on the (n_files, n_points) source
+    array of the group along its last axis. Files of other lengths are in
+    other groups, so there is no padding. The transformed frames of a
+    group are views of one (n_files, n_points, 6) array.
+    (Transforms that can't work on 2-D arrays, and groups of non-numeric
+    data, are applied one file at a time, as in apply_tform.)
+
+    Parameters
+    ----------
+    list_of_tuples : List of Tuples
+        (filename_str, DataFrame, label) tuples
+    tform_commands : List of List(3)
+        Described in depth elsewhere
+    rgb_format : str, optional
+        String of how we will parse the output files.
+        Input here to get the output dataframe size.
+        The default is "RGBrgb".
 
+    Returns
+    -------
+    transformed_tuples : List of Tuples
+        Formatted the same as the input list, but each DataFrame is
+        replaced with the Transformed DF.
+    """
+    list_of_tuples = list(list_of_tuples)
+    rgb_n = len(rgb_format)
+    groups = {}
+    for i, raw_data in enumerate(list_of_tuples):
+        raw_df = raw_data[1]
+        key = (len(raw_df), tuple(raw_df.columns))
+        groups.setdefault(key, []).append(i)
+
+    transformed_tuples = [None] * len(list_of_tuples)
+    for indices in groups.values():
+        raw_dfs = [list_of_tuples[i][1] for i in indices]
+        tform_dfs = _batch_apply_tform(raw_dfs, tform_commands, rgb_n)
+        for i, tform_df in zip(indices, tform_dfs):
+            transformed_tuples[i] = (list_of_tuples[i][0], tform_df,
+                                     list_of_tuples[i][2])
     return transformed_tuples
+
+
+def _batch_apply_tform(raw_dfs, tform_commands, rgb_col_number=6):
+    """
+    apply_tform for a group of dataframes with the same shape and columns.
+    """
+    old_names = list(raw_dfs[0].columns)
+    new_names = list(range(rgb_col_number))
+    for command in tform_commands:
+        new_names[command[0]] = _tform_column_name(old_names, command)
+    values = np.stack([raw_df.to_numpy() for raw_df in raw_dfs])
+    if values.dtype == object:
+        # Not one numeric array: one file at a time
+        return [apply_tform(raw_df, tform_commands, rgb_col_number)
+                for raw_df in raw_dfs]
+    values.setflags(write=False)
+
+    tform_data = np.zeros(values.shape[:2] + (rgb_col_number,))
+    for command in tform_commands:
+        if command[1] in _AXIS_AWARE:
+            tform_data[:, :, command[0]] = _batch_tform_column(values,
+                                                               command)
+        else:
+            for i, raw_df in enumerate(raw_dfs):
+                tform_data[i, :, command[0]] = _tform_column(raw_df, command)
+    return [pd.DataFrame(data=tform_data[i], columns=new_names)
+            for i in range(len(raw_dfs))]
+
+
+def _batch_tform_column(values, command):
+    """
+    _tform_column for a (n_files, n_points, n_columns) array: the
+    (n_files, n_points) transformed data of one tform command.
+    """
+    transform_function = getattr(transform, command[1])
+    if isinstance(command[2], (list, tuple)):
+        data_1 = values[:, :, command[2][0]]
+        if len(command[2]) < 2 or command[2][1] in (None, 'None'):
+            data_2 = None
+        else:
+            data_2 = values[:, :, command[2][1]]
+        if len(command[2]) <= 2:
+            meta_data = None
+        else:
+            meta_data = command[2][2:]
+        return transform_function(data_1, data_2, meta_data)
+    return transform_function(values[:, :, command[2]])
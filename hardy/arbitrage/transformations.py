@@ -1,6 +1,14 @@
+import functools
+
 import numpy as np
 import pandas as pd
-from scipy import signal
+from scipy import fft
+
+"""
+The transforms work on 1-D arrays. All but cwt_1d also take a 2-D
+(n_files, n_points) array, and then work along its last axis, one row per
+file (see arbitrage.batch_tform_tuples).
+"""
 
 
 def raw(raw_array):
@@ -42,7 +50,7 @@ def nlog(raw_array):
 
     # NOTE: All Elements in array MUST be Positive!?
     #       IF Not, option to normalize first??
-    assert min(raw_array) > 0, "Log will not accept negative values!"
+    assert np.min(raw_array) > 0, "Log will not accept negative values!"
     log_array = np.log(raw_array)
     return log_array
 
@@ -62,7 +70,7 @@ def log10(raw_array):
 
     # NOTE: All Elements in array MUST be Positive!?
     #       IF Not, option to normalize first??
-    assert min(raw_array) > 0, "Log will not accept negative values!"
+    assert np.min(raw_array) > 0, "Log will not accept negative values!"
     log_array = np.log10(raw_array)
     return log_array
 
@@ -94,8 +102,9 @@ def cumsum(raw_array):
     -------
     cumsum _array: np.ndarray
                cumulative sum of values in the input array
+               (along the last axis)
     '''
-    cumsum_array = np.cumsum(raw_array)
+    cumsum_array = np.cumsum(raw_array, axis=np.ndim(raw_array)-1)
     return cumsum_array
 
 
@@ -115,11 +124,11 @@ def derivative_1d(raw_array, spacing=0):
     '''
 
     if spacing == 0:
-        spacing = np.arange(np.size(raw_array))
+        spacing = np.arange(np.shape(raw_array)[-1])
     else:
         spacing = spacing
 
-    derivative_array = np.gradient(raw_array, spacing)
+    derivative_array = np.gradient(raw_array, spacing, axis=-1)
 
     return derivative_array
 
@@ -140,21 +149,24 @@ def derivative_2d(x, y, meta_data=None):
                  array representing the slope between x and y
     """
 
-    diff_x = np.diff(x)
-    diff_y = np.diff(y)
+    diff_x = np.diff(x, axis=-1)
+    diff_y = np.diff(y, axis=-1)
 
     slope_array = diff_y/diff_x
 
-    slope_array = np.concatenate((slope_array, np.array([0])))
+    # The last point of each array has a slope of 0
+    slope_array = np.concatenate(
+        (slope_array, np.zeros(np.shape(slope_array)[:-1] + (1,))), axis=-1)
 
     return slope_array
 
 
-def cwt_1d(raw_df, xy=0):
+def cwt_1d(raw_df, xy=0, w_method='linear', n_widths=None, widths=None):
     """
     Transform to execute a "Continuous Wavelet Transform" on a 1d data array
     pass it a raw XY data and tell it which column to use for the transform.
-    See Documentaion on CWT transform:
+    The transform is the one of scipy.signal.cwt with a Ricker wavelet
+    (see cwt_batch, which does it through FFT convolutions):
     https://docs.scipy.org/doc/scipy/reference/generated/
     scipy.signal.cwt.html#scipy.signal.cwt
     Note: I need to do testing to understand the in/outputs here...
@@ -169,15 +181,20 @@ def cwt_1d(raw_df, xy=0):
     xy:     boolean, or string 'x', or 'y'
                 information on which dataframe column to transform.
                 ignored if an 1D array is passed instead.
-    w_method: string or boolean?
-                input instructions guiding how to choose wavelet sizes.
-                default should be linear, with options for log- or exponential?
-                (Will have to experiment with data to discover best option)
+    w_method: string
+                how to choose wavelet sizes (see cwt_widths): 'linear'
+                (default, every width from 1 to M-1) or 'log'
+                (n_widths log-spaced widths)
+    n_widths: int
+                number of widths of the 'log' method
+    widths: array (optional)
+                the wavelet widths to use, instead of w_method
 
     Returns
     ----------
-    cwt_matrix: np.ndarray (MxM)
-                Square M-by-M matrix of the wavelet transform data
+    cwt_matrix: np.ndarray (n_widths x M)
+                The wavelet transform data, one row per width: an
+                (M-1)-by-M matrix with the 'linear' widths
                 (Not yet compressed to plottable 0-1 data)
 
     """
@@ -209,14 +226,120 @@ def cwt_1d(raw_df, xy=0):
             "Needs Dataframe or 1-Dimensional Data Array!"
 
     data_n = len(data)
-    widths = np.arange(1, data_n, 1)
-    cwt_matrix = signal.cwt(data, signal.ricker, widths)
+    if widths is None:
+        widths = cwt_widths(data_n, w_method=w_method, n_widths=n_widths)
+    cwt_matrix = cwt_batch(np.asarray(data)[np.newaxis], widths)[0]
     # Optional different Signal to compare with: "Morlet2" but not working?)
-    # cwt_matrix = signal.cwt(data, signal.morlet, widths)
 
     return cwt_matrix
 
 
+def cwt_widths(data_n, w_method='linear', n_widths=None):
+    ''' Function that gives the wavelet widths of cwt_1d
+
+    Parameters
+    ----------
+    data_n: int
+            number of points of the data
+    w_method: str
+              'linear' gives every width from 1 to data_n-1. 'log' gives
+              n_widths widths from 1 to data_n-1, evenly spaced on a log
+              scale (and rounded, so fewer if some round to the same one).
+    n_widths: int
+              number of widths of the 'log' method (default 64)
+
+    Returns
+    -------
+    widths: np.ndarray
+            the widths, in increasing order
+    '''
+    if w_method == 'linear':
+        return np.arange(1, data_n, 1)
+    elif w_method == 'log':
+        if n_widths is None:
+            n_widths = 64
+        return np.unique(np.round(np.geomspace(1, data_n-1, n_widths)))
+    raise ValueError("w_method should be 'linear' or 'log', got {}"
+                     .format(w_method))
+
+
+def ricker(points, a):
+    ''' Function that returns a Ricker ("Mexican hat") wavelet, as
+    scipy.signal.ricker did
+
+    Parameters
+    ----------
+    points: int
+            number of points of the wavelet
+    a: float
+       width of the wavelet
+
+    Returns
+    -------
+    wavelet: np.ndarray
+             array of length points, centered on its middle
+    '''
+    A = 2 / (np.sqrt(3 * a) * (np.pi**0.25))
+    wsq = a**2
+    vec = np.arange(0, points) - (points - 1.0) / 2
+    xsq = vec**2
+    mod = (1 - xsq / wsq)
+    gauss = np.exp(-xsq / (2 * wsq))
+    return A * mod * gauss
+
+
+@functools.lru_cache(maxsize=1)
+def _cwt_kernels(data_n, widths):
+    '''
+    The FFTs of the Ricker wavelets of the given widths (a tuple), for
+    signals of data_n points, with the FFT length and the length of each
+    wavelet. Cached, so that all the signals of a data set (of the same
+    length) share them. Only the last set is kept: with the linear widths
+    of a few thousand points, one set takes hundreds of MB.
+    '''
+    lengths = [int(np.ceil(min(10 * width, data_n))) for width in widths]
+    # Long enough for the linear (not circular) convolution
+    n_fft = fft.next_fast_len(data_n + max(lengths) - 1, real=True)
+    kernels = np.empty((len(widths), n_fft // 2 + 1), dtype=np.complex128)
+    for i, (width, length) in enumerate(zip(widths, lengths)):
+        kernels[i] = fft.rfft(ricker(length, width)[::-1], n_fft)
+    kernels.setflags(write=False)
+    return kernels, n_fft, np.array(lengths)
+
+
+def cwt_batch(signals, widths):
+    ''' Function that computes the Ricker wavelet transform of many
+    signals at once, with FFT convolutions: the same output as
+    scipy.signal.cwt(signal, scipy.signal.ricker, widths) for each signal,
+    to within float rounding.
+
+    Parameters
+    ----------
+    signals: np.ndarray
+             array of shape (n_signals, M), the signals to transform
+    widths: array
+            the wavelet widths
+
+    Returns
+    -------
+    cwt_matrices: np.ndarray
+                  array of shape (n_signals, len(widths), M)
+    '''
+    signals = np.asarray(signals, dtype=np.float64)
+    n_signals, data_n = signals.shape
+    kernels, n_fft, lengths = _cwt_kernels(
+        data_n, tuple(float(width) for width in widths))
+    signals_fft = fft.rfft(signals, n_fft)
+    cwt_matrices = np.empty((n_signals, len(lengths), data_n))
+    for i, length in enumerate(lengths):
+        # One width at a time, for all of the signals: the 'same' part of
+        #   the full convolution, as in scipy.signal.convolve
+        full = fft.irfft(signals_fft * kernels[i], n_fft)
+        start = (length - 1) // 2
+        cwt_matrices[:, i] = full[:, start:start + data_n]
+    return cwt_matrices
+
+
 def power(x, y=None, meta_data=None):
     ''' Function that multiplies two arrays x^m & y^n, element
     by element. If y is None, it return x*x
@@ -241,7 +364,7 @@ def power(x, y=None, meta_data=None):
     else:
         m = 1
         n = 1
-    if y and n:
+    if y is not None:
         multi_array = np.multiply(np.power(x, m), np.power(y, n))
         return multi_array
     else:
@@ -4,7 +4,12 @@ import yaml
 
 import pandas as pd
 import plotly.graph_objects as go
+import tensorflow as tf
 
+from hardy.handling import to_catalogue
+from hardy.handling.labels import LABEL_CODEC_FILE, LabelCodec
+from hardy.handling.pre_processing import RUN_MARKER
+from hardy.handling.sequences import ImageSequence
 from keras.preprocessing.image import NumpyArrayIterator
 from plotly.subplots import make_subplots
 
@@ -19,7 +24,9 @@ def report_dataframes(report_path):
     for i in range(len(categories)):
         yaml_path = report_path+categories[i]+'/report/'
         yaml_file_name = [file for file in os.listdir(yaml_path)
-                          if file != 'run_tform_config.yaml' and not
+                          if file not in ('run_tform_config.yaml', RUN_MARKER,
+                                          LABEL_CODEC_FILE)
+                          and not
                           (file.startswith('.') or file.endswith('.csv'))]
         with open(yaml_path+yaml_file_name[0], 'r') as file:
             import_dict[categories[i]] = yaml.load(
@@ -258,7 +265,7 @@ def summary_dataframe(report_path):
     return summary_df
 
 
-def model_analysis(model, test_set, test_set_list=None):
+def model_analysis(model, test_set, test_set_list=None, label_codec=None):
 
     ''' The function that provides analysis of a trained model for
     its predicted output and actual output
@@ -273,7 +280,13 @@ def model_analysis(model, test_set, test_set_list=None):
     test_set: keras.ImageDataGenerator iterator
                  the interator instance created using the
                  keras.ImageDataGenerator. This can either be a
-                 NumpyArrayIterator or a DirectoryIterator
+                 NumpyArrayIterator or a DirectoryIterator (or an
+                 ImageSequence or a tf.data.Dataset, which are handled
+                 as the former)
+    label_codec: hardy.handling.LabelCodec (optional)
+                 the label -> class index mapping the test set was made
+                 with, to name the predicted classes. Default is the sorted
+                 labels of test_set_list.
 
     Returns
     -------
@@ -289,19 +302,16 @@ def model_analysis(model, test_set, test_set_list=None):
     for n in range(len(predictions)):
         probabilities.append(np.round(predictions[n], 3))
 
-    labels_dict = {}
+    if type(test_set) == NumpyArrayIterator or \
+            isinstance(test_set, (ImageSequence, tf.data.Dataset)):
+        # Read from the lists, not from their tuples: the lazy image lists
+        # would make every image again
+        labels = list(to_catalogue._image_labels(test_set_list))
+        if label_codec is None:
+            label_codec = LabelCodec.from_labels(labels)
 
-    if type(test_set) == NumpyArrayIterator:
-        labels = []
-        for i in range(len(test_set_list)):
-            labels.append(test_set_list[i][:][2])
-
-        for i, label in enumerate(np.unique(labels)):
-            for j in range(len(labels)):
-                if labels[j] == label:
-                    labels_dict.update({i: label})
-
-        filenames = [n[0][:][:] for n in test_set_list]
+        filenames = to_catalogue._image_serials(test_set_list)
+        predicted_labels = label_codec.decode(predicted_class_indices)
 
     else:
         labels_indices = (test_set.class_indices)
@@ -315,7 +325,7 @@ def model_analysis(model, test_set, test_set_list=None):
                 if key in filenames[i]:
                     labels.append(key)
 
-    predicted_labels = [labels_dict[k] for k in predicted_class_indices]
+        predicted_labels = [labels_dict[k] for k in predicted_class_indices]
 
     result = pd.DataFrame.from_dict({"Filenames": filenames,
                                      "Actual_Labels": labels,
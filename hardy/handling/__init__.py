@@ -3,6 +3,9 @@ from .handling import *               # noqa: F401, F403
 from .to_catalogue import *           # noqa: F401, F403
 from .visualization import *          # noqa: F401, F403
 from .pre_processing import *         # noqa: F401, F403
+from .sequences import *              # noqa: F401, F403
+from .labels import *                 # noqa: F401, F403
+from .records import *                # noqa: F401, F403
 
 # __all__ = [__version__]
 
@@ -1,6 +1,7 @@
 import os.path
 import tkinter
 
+import numpy as np
 import pandas as pd
 
 from os import listdir
@@ -392,6 +393,75 @@ def _smart_read_csv(full_fname, skiprows=0, last_skiprows=None,
     return fdata, last_skiprows
 
 
+def _infer_csv_schema(full_fname, skiprows=0):
+    """
+    Infer the schema of a "homogeneous" set of csv files (all sharing the
+    same header, column count and dtypes) from one of them, so that the
+    others can be parsed with _schema_read_csv without pandas re-sniffing
+    each file.
+
+    Parameters
+    ----------
+    full_fname :    str
+                    joined path and file name of the file to infer from
+    skiprows :      int
+                    rows to skip before the header, as in _smart_read_csv
+
+    Returns
+    -------
+    schema : dict
+             'skiprows' : the rows skipped before the header
+             'header' :   the header line of the file, as read
+             'usecols' :  the names of the columns that _smart_read_csv
+                          and the float64 filter of to_catalogue keep
+                          (the 'Unnamed: 0' index column is left out)
+             'dtype' :    a dict giving those columns their float64 dtype
+    """
+    fdata, last_skiprows = _smart_read_csv(full_fname, skiprows=skiprows)
+    usecols = [column for column in fdata.columns
+               if fdata[column].dtypes is np.dtype('float64')]
+    assert len(usecols) != 0, 'no float column found in ' + full_fname
+    return {'skiprows': last_skiprows,
+            'header': _read_header_line(full_fname, last_skiprows),
+            'usecols': usecols,
+            'dtype': {column: np.float64 for column in usecols}}
+
+
+def _schema_read_csv(full_fname, schema):
+    """
+    Fast read of a csv file with a schema from _infer_csv_schema: only the
+    kept columns are parsed, by the C engine and with fixed dtypes, so
+    there is no type inference and no column to drop afterwards.
+
+    Returns
+    -------
+    fdata : Pandas DataFrame or None
+            The dataframe of the file, or None if the file does not fit the
+            schema (different header, or values that are not numbers), in
+            which case it should be read with _smart_read_csv instead.
+    """
+    if _read_header_line(full_fname, schema['skiprows']) != schema['header']:
+        return None
+    try:
+        fdata = pd.read_csv(full_fname, skiprows=schema['skiprows'],
+                            usecols=schema['usecols'], dtype=schema['dtype'],
+                            engine='c')
+    except (ValueError, TypeError, pd.errors.ParserError):
+        return None
+    # usecols keeps the order of the file, which is the schema order
+    return fdata
+
+
+def _read_header_line(full_fname, skiprows=0):
+    """
+    The header line of a csv file, after skipping skiprows lines.
+    """
+    with open(full_fname, 'r') as file:
+        for n in range(skiprows):
+            file.readline()
+        return file.readline().rstrip('\r\n')
+
+
 def _test_df(fdata, columns_to_pass=2):
     """
     Parameters
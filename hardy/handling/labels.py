@@ -0,0 +1,104 @@
+import os
+import yaml
+
+import numpy as np
+
+"""
+Labels, the encoding of the classification labels into class indices.
+
+    LabelCodec : fixed label -> class index mapping (the labels in sorted
+                 order, as the sets have always been numbered). Made once
+                 for the whole data set, it is shared by learning_set,
+                 test_set and reporting.model_analysis, so that a class has
+                 the same index in every set and fold, even when a set
+                 misses some of the classes. It can be saved next to the
+                 run report and loaded back with the model.
+"""
+
+# Name of the saved LabelCodec, in the report folder of a run
+LABEL_CODEC_FILE = 'label_codec.yaml'
+
+
+class LabelCodec():
+    """
+    Label <-> class index mapping of a classification.
+
+    Parameters
+    ----------
+    label_names : list
+                  the labels of the classes. They are numbered in sorted
+                  order, whatever the order of the list.
+    """
+
+    def __init__(self, label_names):
+        self.label_names = [str(name) for name in np.unique(
+            np.asarray(label_names, dtype=str))]
+        self.class_indices = dict((name, i) for i, name
+                                  in enumerate(self.label_names))
+
+    @classmethod
+    def from_labels(cls, labels):
+        """
+        Codec of the distinct labels of a list (or array) of labels.
+        """
+        return cls(np.unique(np.asarray(labels, dtype=str)))
+
+    @property
+    def num_classes(self):
+        return len(self.label_names)
+
+    def encode(self, labels):
+        """
+        int32 array of the class index of each label. Each distinct label is
+        looked up once; a label unknown to the codec raises a ValueError.
+        """
+        names, inverse = np.unique(np.asarray(labels, dtype=str),
+                                   return_inverse=True)
+        unknown = [name for name in names if name not in self.class_indices]
+        if unknown:
+            raise ValueError('labels {} are not among the classes {}'.format(
+                unknown, self.label_names))
+        lookup = np.array([self.class_indices[name] for name in names],
+                          dtype=np.int32)
+        return lookup[inverse]
+
+    def one_hot(self, labels):
+        """
+        (len(labels), num_classes) float32 one-hot labels, as made by
+        keras.utils.to_categorical.
+        """
+        return np.eye(self.num_classes, dtype=np.float32)[
+            self.encode(labels)]
+
+    def decode(self, class_indices):
+        """
+        List of the labels of an array of class indices (e.g. the argmax of
+        the predictions of a model).
+        """
+        return [self.label_names[i] for i in np.asarray(class_indices)]
+
+    def save(self, path):
+        """
+        Write the mapping to the yaml file path (or to LABEL_CODEC_FILE in
+        the folder path).
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, LABEL_CODEC_FILE)
+        with open(path, 'w') as file:
+            yaml.dump({'class_indices': self.class_indices}, file)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read back a mapping written by save.
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, LABEL_CODEC_FILE)
+        with open(path, 'r') as file:
+            class_indices = yaml.load(file, Loader=yaml.FullLoader)[
+                'class_indices']
+        codec = cls(list(class_indices))
+        assert codec.class_indices == class_indices, \
+            'the saved class indices are not in sorted label order'
+        return codec
@@ -1,6 +1,13 @@
+import hashlib
+import json
 import os
-import random
 import shutil
+import yaml
+
+import numpy as np
+
+# Name of the completion marker of a transform run, in its report folder
+RUN_MARKER = 'run_complete.yaml'
 
 
 def hold_out_test_set(path=None, number_of_files_per_class=100, seed=None,
@@ -9,26 +16,34 @@ def hold_out_test_set(path=None, number_of_files_per_class=100, seed=None,
     Functions that returns a list of filenames
     of the randomly selected files to compose the test set
 
+    The files are grouped by class in one pass over the folder, then the
+    test files of each class are drawn at once, without replacement, with a
+    numpy random Generator (so the same seed gives the same files, whatever
+    the order of the folder listing).
+
     Parameters
     ----------
     path : str
            string containing the path to the files to select from
            the test set from.
 
-    number_of_files_per_class: int
+    number_of_files_per_class: int or float
                                The number of files to select from each class.
+                               A float below 1 is the fraction of the files
+                               of each class to select instead.
+
+    seed: int
+          seed of the random Generator, to repeat the selection
 
     classes: list
              a list containing strings of the classes the data is divided in.
-             The classes are contained in the filename as labels.
+             The classes are contained in the filename as labels. (Each file
+             is given to the first class, in reverse sorted order, that its
+             name ends with. The list itself is not changed.)
 
     file_extension: str
                     the extension of the file to read. The default value is
                     .csv
-    image_list: np.array
-                numpy array representing file names, image data and labels
-    iterator_mode: str
-                   string representing if the data provided is in arrays
 
     Returns
     -------
@@ -36,28 +51,36 @@ def hold_out_test_set(path=None, number_of_files_per_class=100, seed=None,
                              A list containig the strings of filenames
                              randomly selected to be part of the test set.
     '''
-    classes.sort(reverse=True)
-
-    test_set_filenames = []
-
-    whole_list = os.listdir(path)
+    ordered_classes = sorted(classes, reverse=True)
+    endings = [label + file_extension for label in ordered_classes]
 
-    if seed:
-        random.seed(seed)
+    class_files = [[] for label in ordered_classes]
+    with os.scandir(path) as entries:
+        for entry in entries:
+            for i, ending in enumerate(endings):
+                if entry.name.endswith(ending):
+                    class_files[i].append(entry.name)
+                    break
 
-    for i in range(len(classes)):
-
-        file_list = [n for n in whole_list
-                     if n.endswith(classes[i]+file_extension)]
-
-        whole_list = [item_i for item_i in whole_list
-                      if item_i not in file_list]
-
-        file_list_for_selection = file_list
+    rng = np.random.default_rng(seed)
 
-        for i in range(number_of_files_per_class):
-            chosen_file = random.choice(file_list_for_selection)
-            file_list_for_selection.remove(chosen_file)
+    test_set_filenames = []
+    for label, file_list in zip(ordered_classes, class_files):
+        file_list.sort()
+        if isinstance(number_of_files_per_class, float) and \
+                number_of_files_per_class < 1:
+            number_of_files = int(round(number_of_files_per_class *
+                                        len(file_list)))
+        else:
+            number_of_files = int(number_of_files_per_class)
+        if number_of_files > len(file_list):
+            raise ValueError('{} test files were asked for the class "{}",'
+                             ' which only has {} files'.format(
+                                 number_of_files, label, len(file_list)))
+        chosen = rng.choice(len(file_list), size=number_of_files,
+                            replace=False)
+        for index in chosen:
+            chosen_file = file_list[index]
             test_set_filenames.append(str(chosen_file.rstrip(
                                           chosen_file[-4:])))
 
@@ -164,12 +187,133 @@ def save_to_folder(input_path, project_name, run_name):
     '''
 
     hardy_folder_path = input_path + project_name + '/'
-    if not os.path.exists(hardy_folder_path):
-        os.makedirs(hardy_folder_path)
+    # (exist_ok: the runs of hardy_multi_transform can be made at the same
+    # time, by several processes)
+    os.makedirs(hardy_folder_path, exist_ok=True)
 
     transformation_folder_path = hardy_folder_path + run_name + '/'
-
-    if not os.path.exists(transformation_folder_path):
-        os.makedirs(transformation_folder_path)
+    os.makedirs(transformation_folder_path, exist_ok=True)
 
     return transformation_folder_path
+
+
+def data_manifest(input_path, file_extension='.csv'):
+    '''
+    Function that lists the data files of a folder, with their size and
+    modification time, to tell whether the data changed since a run.
+
+    Parameters
+    ----------
+    input_path : str
+                 String containing the path to the .csv files
+    file_extension: str
+                    the extension of the data files. The default value is
+                    .csv
+
+    Returns
+    -------
+    manifest :  list
+                sorted list of [filename, size in bytes, modification time
+                in ns] of each data file
+    '''
+    manifest = []
+    for entry in sorted(os.listdir(input_path)):
+        if entry.endswith(file_extension):
+            stat = os.stat(os.path.join(input_path, entry))
+            manifest.append([entry, stat.st_size, stat.st_mtime_ns])
+    return manifest
+
+
+def run_hash(tform_commands, manifest, **run_options):
+    '''
+    Function that makes the hash identifying a transform run: its transform
+    commands, the data it was made from (see data_manifest) and the options
+    that change its result (plot format, scale, classifier...).
+
+    Returns
+    -------
+    run_hash :  str
+                the sha256 hex digest
+    '''
+    description = json.dumps({'tform_commands': tform_commands,
+                              'manifest': manifest, 'options': run_options},
+                             sort_keys=True, default=str)
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+
+def write_run_marker(run_path, run_name, run_hash):
+    '''
+    Function that marks a transform run as complete, with a RUN_MARKER
+    file in its report folder. The marker is written to a temporary file
+    first and then renamed, so that it is either complete or absent.
+
+    Parameters
+    ----------
+    run_path : str
+               String representing the path of the folder of the run (as
+               given by save_to_folder)
+    run_name : str
+               String representing the transformation applied to the data
+    run_hash : str
+               the hash of the run (see run_hash)
+
+    Returns
+    -------
+    marker_path :  str
+                   String representing the path of the marker file
+    '''
+    report_location = os.path.join(run_path, 'report')
+    if not os.path.exists(report_location):
+        os.makedirs(report_location)
+    marker_path = os.path.join(report_location, RUN_MARKER)
+    temporary_path = marker_path + '.tmp'
+    with open(temporary_path, 'w') as marker_file:
+        yaml.dump({'run_name': run_name, 'run_hash': run_hash}, marker_file)
+        marker_file.flush()
+        os.fsync(marker_file.fileno())
+    os.replace(temporary_path, marker_path)
+    return marker_path
+
+
+def clear_run_marker(run_path):
+    '''
+    Function that removes the completion marker of the folder of a run, if
+    it has one, before the run is made again: a run that stops partway
+    must not be left with the marker of an earlier one.
+
+    Parameters
+    ----------
+    run_path : str
+               String representing the path of the folder of the run
+    '''
+    marker_path = os.path.join(run_path, 'report', RUN_MARKER)
+    if os.path.exists(marker_path):
+        os.remove(marker_path)
+
+
+def run_is_complete(run_path, run_hash):
+    '''
+    Function that tells whether the run of a folder was completed, with the
+    same hash (same transforms, data and options).
+
+    Parameters
+    ----------
+    run_path : str
+               String representing the path of the folder of the run
+    run_hash : str
+               the hash of the run to be made (see run_hash)
+
+    Returns
+    -------
+    complete :  bool
+                True if the folder holds a completion marker of that hash
+    '''
+    marker_path = os.path.join(run_path, 'report', RUN_MARKER)
+    if not os.path.exists(marker_path):
+        return False
+    with open(marker_path, 'r') as marker_file:
+        try:
+            marker = yaml.load(marker_file, Loader=yaml.FullLoader)
+        except yaml.YAMLError:
+            return False
+    return isinstance(marker, dict) and marker.get('run_hash') == run_hash
@@ -0,0 +1,207 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+import hardy.handling.visualization as vis
+
+"""
+Records, a binary store of rendered image sets, to use in place of the
+folders of .png files of flow_from_directory.
+
+    write_image_records : streams (SERIAL, IMG, LABEL) image tuples into a
+                          few fixed-shape uint8 shard files, and writes an
+                          index of their serials and labels last.
+    open_image_records :  the ImageRecords of a folder, if it holds a
+                          complete set (with the expected key).
+    ImageRecords :        random access reader of the records. The shards
+                          are memory mapped, so opening a set costs nothing
+                          and only the images of each batch are read. It
+                          acts like the list of image tuples, and images()
+                          gives the images of a batch, for
+                          sequences.ImageSequence and image_dataset.
+"""
+
+# Name of the index of a set of records, in its folder
+RECORDS_INDEX = 'index.json'
+# Name of the shard files, by shard number
+SHARD_NAME = 'shard_{:05d}.u8'
+
+
+def write_image_records(image_tuples, path, shard_size=4096, key=None,
+                        metadata=None):
+    """
+    Writes a stream of image tuples into a set of records.
+
+    Each image goes straight to the end of its shard file, as 0-255 uint8
+    values, so only one image is held at a time. The index is written last
+    (to a temporary file, renamed), so a set is either complete or absent.
+
+    Parameters
+    ----------
+    image_tuples : iterable of tuples
+                   (SERIAL, IMG, LABEL) tuples, e.g. iter_rgb_tuples. The
+                   images all need the same shape; float images (0 to 1)
+                   are turned into uint8 (see vis.image_as_precision).
+    path : str
+           folder of the records. Records already in it are replaced.
+    shard_size : int
+                 number of images of each shard file
+    key : str (optional)
+          key of the set (such as a pre_processing.run_hash), checked by
+          open_image_records
+    metadata : dict (optional)
+               anything (json-able) to keep with the set
+
+    Returns
+    -------
+    image_records : ImageRecords
+                    the reader of the written set
+    """
+    os.makedirs(path, exist_ok=True)
+    index_path = os.path.join(path, RECORDS_INDEX)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    for old_shard in glob.glob(os.path.join(path, SHARD_NAME.replace(
+            '{:05d}', '*'))):
+        os.remove(old_shard)
+
+    shape = None
+    serials = []
+    labels = []
+    shards = []
+    shard_file = None
+    try:
+        for image_tuple in image_tuples:
+            image = np.asarray(image_tuple[1])
+            if image.dtype != np.uint8:
+                image = vis.image_as_precision(image, 'uint8')
+            if shape is None:
+                shape = image.shape
+            assert image.shape == shape, \
+                'image of {} has shape {}, expected {}'.format(
+                    image_tuple[0], image.shape, shape)
+            if len(serials) % shard_size == 0:
+                if shard_file is not None:
+                    shard_file.close()
+                shards.append(SHARD_NAME.format(len(shards)))
+                shard_file = open(os.path.join(path, shards[-1]), 'wb')
+            shard_file.write(np.ascontiguousarray(image).tobytes())
+            serials.append(str(image_tuple[0]))
+            labels.append(str(image_tuple[2]))
+    finally:
+        if shard_file is not None:
+            shard_file.close()
+
+    index = {'shape': list(shape) if shape is not None else None,
+             'shard_size': shard_size, 'shards': shards,
+             'serials': serials, 'labels': labels, 'key': key,
+             'metadata': metadata}
+    temporary_path = index_path + '.tmp'
+    with open(temporary_path, 'w') as index_file:
+        json.dump(index, index_file)
+        index_file.flush()
+        os.fsync(index_file.fileno())
+    os.replace(temporary_path, index_path)
+    return ImageRecords(path)
+
+
+def open_image_records(path, key=None):
+    """
+    The ImageRecords of the folder path, or None if it does not hold a
+    complete set of records, or if the set was written with another key.
+    """
+    if not os.path.exists(os.path.join(path, RECORDS_INDEX)):
+        return None
+    image_records = ImageRecords(path)
+    if key is not None and image_records.key != key:
+        return None
+    return image_records
+
+
+class ImageRecords():
+    """
+    Reader of a set of records written by write_image_records.
+
+        path :         folder of the records
+        serials :      list of the file names
+        labels :       list of the labels
+        file_indices : int64 array, the position of each file of this set
+                       in the records (a subset only reads some of them)
+        key, metadata : as given to write_image_records
+
+    Parameters
+    ----------
+    path : str
+           folder of the records
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, RECORDS_INDEX), 'r') as index_file:
+            self._index = json.load(index_file)
+        self.shape = tuple(self._index['shape'] or ())
+        self.shard_size = self._index['shard_size']
+        self.key = self._index['key']
+        self.metadata = self._index['metadata']
+        self.serials = self._index['serials']
+        self.labels = self._index['labels']
+        self.file_indices = np.arange(len(self.serials), dtype=np.int64)
+        # The memory maps of the shards, opened when first read (shared
+        # with the subsets)
+        self._shards = {}
+
+    def __len__(self):
+        return len(self.file_indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('ImageRecords index out of range')
+        return (self.serials[index], self.images([index])[0],
+                self.labels[index])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def images(self, indices):
+        """
+        (len(indices), H, W, 3) uint8 images of the files at indices, read
+        shard by shard.
+        """
+        positions = self.file_indices[np.asarray(indices, dtype=np.int64)]
+        shard_numbers = positions // self.shard_size
+        offsets = positions % self.shard_size
+        batch = np.empty((len(positions),) + self.shape, dtype=np.uint8)
+        for shard_number in np.unique(shard_numbers):
+            in_shard = shard_numbers == shard_number
+            batch[in_shard] = self._shard(shard_number)[offsets[in_shard]]
+        return batch
+
+    def _shard(self, shard_number):
+        if shard_number not in self._shards:
+            n_total = len(self._index['serials'])
+            n_images = min(self.shard_size,
+                           n_total - shard_number*self.shard_size)
+            self._shards[shard_number] = np.memmap(
+                os.path.join(self.path, self._index['shards'][shard_number]),
+                dtype=np.uint8, mode='r', shape=(n_images,) + self.shape)
+        return self._shards[shard_number]
+
+    def subset(self, indices):
+        """
+        ImageRecords of the files at indices (in that order), reading the
+        same records.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        subset = object.__new__(ImageRecords)
+        subset.__dict__.update(self.__dict__)
+        subset.file_indices = self.file_indices[indices]
+        subset.serials = [self.serials[i] for i in indices]
+        subset.labels = [self.labels[i] for i in indices]
+        return subset
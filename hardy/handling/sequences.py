@@ -0,0 +1,207 @@
+import keras
+
+import numpy as np
+import tensorflow as tf
+
+"""
+Sequences, Keras-ready batch generators for the image sets.
+
+The usual "arrays" path of learning_set and test_set stacks every image
+of the set into one dense array and hands it to the Keras
+ImageDataGenerator.flow iterator. The sequences here only make the images
+of the batch that Keras asks for, from a more compact source.
+
+    ImageSequence : keras.utils.Sequence over any image source that can
+                    give the images of a list of indices (source.images),
+                    such as to_catalogue.ProfileImages. The batches are
+                    made exactly as the flow iterator makes them: images
+                    scaled to 0-255 uint8 values, returned as float32, and
+                    passed through the ImageDataGenerator, if one is given.
+
+    image_dataset : the same batches as a tf.data.Dataset pipeline
+                    (iterator_mode='tfdata' of learning_set and test_set),
+                    with the images gathered, transformed in parallel and
+                    prefetched while the model trains on the previous
+                    batch.
+"""
+
+
+class ImageSequence(keras.utils.Sequence):
+    """
+    Batch generator of (images, one-hot labels) over an image source.
+
+    Parameters
+    ----------
+    source : object
+             anything with a len() and an images(indices) method giving the
+             (len(indices), H, W, 3) float images (0 to 1), or uint8 images
+             (0 to 255), of those indices
+    y : array
+        one-hot labels of the whole source, in the source order
+    indices : array (optional)
+              the indices of the source that make up this set (e.g. the
+              training part of a split). Default is all of them.
+    batch_size : int
+                 The number of files to group up into a batch
+    shuffle : bool
+              option to shuffle the order of the files at the start and at
+              the end of each epoch, as the flow iterator does
+    image_data_generator : keras ImageDataGenerator (optional)
+                           used for the random transforms and the
+                           standardization of each image, as in the flow
+                           iterator
+    seed : int (optional)
+           seed of the shuffling
+    """
+
+    def __init__(self, source, y, indices=None, batch_size=32,
+                 shuffle=False, image_data_generator=None, seed=None):
+        super().__init__()
+        self.source = source
+        if indices is None:
+            indices = np.arange(len(source))
+        self.indices = np.asarray(indices, dtype=np.int64)
+        # .y follows the set order (not the shuffled one), as in the flow
+        # iterator, so that reports can compare it to the predictions.
+        self.y = np.asarray(y)[self.indices]
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.image_data_generator = image_data_generator
+        self.rng = np.random.default_rng(seed)
+        self.index_array = np.arange(len(self.indices))
+        if shuffle:
+            self.rng.shuffle(self.index_array)
+
+    def __len__(self):
+        return int(np.ceil(len(self.indices) / self.batch_size))
+
+    def __getitem__(self, index):
+        if index >= len(self):
+            raise IndexError('ImageSequence index out of range')
+        batch = self.index_array[index*self.batch_size:
+                                 (index+1)*self.batch_size]
+        batch_x = _float_images(self.source.images(self.indices[batch]))
+        if self.image_data_generator is not None:
+            batch_x = _transform_images(batch_x, self.image_data_generator)
+        return batch_x, self.y[batch]
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.rng.shuffle(self.index_array)
+
+    def reset(self):
+        """
+        Start again from the first batch. (Kept for the flow iterator
+        interface; batches are indexed, so there is nothing to rewind.)
+        """
+        pass
+
+
+def image_dataset(source, y, indices=None, batch_size=32, shuffle=False,
+                  image_data_generator=None, seed=None, cache=False):
+    """
+    tf.data.Dataset of (images, one-hot labels) batches over an image
+    source, made as the ImageSequence batches are.
+
+    The images of an ImageTensor (a source with a .tf_tensor of all of the
+    images) are gathered a batch at a time from that tensor. The images of
+    other sources (e.g. ProfileImages) are made a batch at a time by a
+    parallel map of source.images. The ImageDataGenerator transforms run
+    in a parallel map as well, and the next batches are prefetched.
+
+    Parameters
+    ----------
+    source, y, indices, batch_size, image_data_generator :
+        as in ImageSequence
+    shuffle : bool
+              option to shuffle the files, again at each epoch
+    seed : int (optional)
+           seed of the shuffling, to give the same orders on each run
+    cache : bool
+            option to keep the images made by the source in memory after
+            the first epoch (this does nothing for an ImageTensor, whose
+            images are in memory already)
+
+    Returns
+    -------
+    dataset : tf.data.Dataset
+              a finite dataset (len gives the number of batches), which
+              can be given to keras Model.fit, evaluate and predict
+    """
+    if indices is None:
+        indices = np.arange(len(source))
+    indices = np.asarray(indices, dtype=np.int64)
+    labels = tf.constant(np.asarray(y, dtype=np.float32))
+    autotune = tf.data.AUTOTUNE
+
+    dataset = tf.data.Dataset.from_tensor_slices(indices)
+    images = getattr(source, 'tf_tensor', None)
+    if images is not None:
+        if shuffle:
+            dataset = dataset.shuffle(len(indices), seed=seed,
+                                      reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size).map(
+            lambda index: (tf.cast(tf.gather(images, index), tf.float32),
+                           tf.gather(labels, index)),
+            num_parallel_calls=autotune, deterministic=True)
+    else:
+        image_shape = source.images(indices[:1]).shape[1:]
+
+        def load_batch(index):
+            batch_x = tf.numpy_function(
+                lambda index: _float_images(source.images(index)), [index],
+                tf.float32)
+            batch_x.set_shape((None,) + image_shape)
+            return batch_x, tf.gather(labels, index)
+
+        if shuffle and not cache:
+            # The indices are shuffled, so that only the images of the
+            # next batches are made and held
+            dataset = dataset.shuffle(len(indices), seed=seed,
+                                      reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size).map(
+            load_batch, num_parallel_calls=autotune, deterministic=True)
+        if cache:
+            # The kept images are shuffled (they are all in memory anyway)
+            dataset = dataset.unbatch().cache()
+            if shuffle:
+                dataset = dataset.shuffle(len(indices), seed=seed,
+                                          reshuffle_each_iteration=True)
+            # (unbatch loses the number of batches, which keras uses)
+            dataset = dataset.batch(batch_size).apply(
+                tf.data.experimental.assert_cardinality(
+                    int(np.ceil(len(indices) / batch_size))))
+
+    if image_data_generator is not None:
+        def transform_batch(batch_x, batch_y):
+            transformed = tf.numpy_function(
+                lambda batch_x: _transform_images(batch_x.copy(),
+                                                  image_data_generator),
+                [batch_x], tf.float32)
+            transformed.set_shape(batch_x.shape)
+            return transformed, batch_y
+
+        dataset = dataset.map(transform_batch, num_parallel_calls=autotune,
+                              deterministic=True)
+    return dataset.prefetch(autotune)
+
+
+def _float_images(images):
+    """
+    float32 images (0 to 255) of float (0 to 1) or uint8 images, with the
+    same rounding as learning_set / test_set + flow.
+    """
+    if images.dtype != np.uint8:
+        images = (images.astype('float32')*255).astype('uint8')
+    return images.astype('float32')
+
+
+def _transform_images(batch_x, image_data_generator):
+    """
+    Random transform and standardization of each image of a batch, in
+    place, as in the flow iterator.
+    """
+    for j in range(len(batch_x)):
+        batch_x[j] = image_data_generator.standardize(
+            image_data_generator.random_transform(batch_x[j]))
+    return batch_x
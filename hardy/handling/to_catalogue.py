@@ -1,13 +1,26 @@
+import collections
+import functools
+import itertools
 import keras
+import multiprocessing
 import pickle
 import os
+import threading
 import time
+import weakref
 
 # import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
+import tensorflow as tf
 
 import hardy.handling.visualization as vis
 import hardy.handling.handling as handling
+import hardy.handling.labels as labels
+import hardy.handling.records as records
+import hardy.handling.sequences as sequences
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
 from keras.preprocessing.image import ImageDataGenerator
 
 
@@ -23,6 +36,22 @@ Current Status:
                                 an input_path using smart category finder
                                 and smart/safe read csv (arbitrary rows, and
                                 deletes columns of "bad" data like strings)
+                                Files can be read by a pool of workers.
+
+    PackedDataTuples : Compact, list-like container of the data tuples,
+                       with the data of all files in one float32 buffer.
+
+    ImageTensor : List-like container of the image tuples, with the images
+                  of all files in one uint8 tensor (used for the k-fold
+                  sets).
+
+    RenderedImages : Lazy container of the image tuples, keeping the data
+                     tuples and making the images of each batch as it is
+                     asked for (with workers, and a cache of the images).
+
+    records.ImageRecords : the image tuples of a set of records (sharded
+                           uint8 image files on disk, see records), read a
+                           batch at a time.
 
     ** Note:  Here in Wrapping Function Flow, is where the Arbitrage Transforms
               Would "Intercept" the data and create transforms!
@@ -38,6 +67,12 @@ Current Status:
                     dataframe and creates the image for it via a plot_format
                     string like 'RGBrgb' or "RgBrGb","Rg" or "Rxxgxx" etc.
 
+    rgb_batch :     Same as rgb_visualize, for a whole batch of dataframes
+                    of the same length at once (rgb_list with batch_size).
+
+    rgb_profiles :  Lazy rgb_list, keeping only the 1-D profiles of each
+                    image in a ProfileImages container.
+
     learning_set :  Complex (multi-options) BUT, given the right rules
                     (should be defaults) will turn the image_tuple_list
                     into the proper (255) images, then use the Keras
@@ -47,6 +82,9 @@ Current Status:
 
     test_set:       Does all of that, without splitting the data.
 
+    image_label_codec : The labels.LabelCodec of an image list, to number
+                        the classes of its learning and test sets alike.
+
     #######################################################################
     rgb_list_to_dirflow: Unused for now. Gives the possibility of outputting
                          the rgb_list of tuples to a data structure
@@ -94,7 +132,10 @@ def save_load_data(filename, data=None, save=None, load=None,
         return loaded_data
 
 
-def _data_tuples_from_fnames(input_path='./', skiprows=0, classes=None):
+def _data_tuples_from_fnames(input_path='./', skiprows=0, classes=None,
+                             n_workers=1, chunk_size=None, pool='process',
+                             cache=False, cache_shard_size=1000,
+                             stream=False, homogeneous=False, packed=False):
     """
     Setting up the Data_tuples list, from ONE FOLDER with all of the data
     (OF different classes) inside of it.
@@ -102,9 +143,32 @@ def _data_tuples_from_fnames(input_path='./', skiprows=0, classes=None):
     and determine the classification from the file name.
     Then Return that line of data_tuples in the format of:
     (FileName (no extension), DataFrame, LABEL)
+
+    The files can be read by a pool of workers (n_workers > 1), either
+    processes (pool='process') or threads (pool='thread'). Each worker is
+    handed chunk_size files at a time, and the list of tuples keeps the
+    same order as the single worker loop.
+
+    With cache=True the parsed data is also kept in a binary cache inside
+    input_path (see _cached_data_tuples), and only the files that are new
+    or changed since the last run are read from the csv text again.
+
+    With stream=True a generator of the tuples is returned instead of the
+    list, so that each file can go through the next steps (transform,
+    image) before the following one is read. (When reading through the
+    cache, the list of memory mapped tuples is returned either way.)
+
+    With homogeneous=True all of the files are expected to share the
+    header, column count and dtypes of the first one: its schema is
+    inferred once (see handling._infer_csv_schema), and the other files are
+    parsed with fixed dtypes and only the kept columns. Any file that does
+    not fit the schema is read the usual way.
+
+    With packed=True the tuples are returned in a PackedDataTuples
+    container (one float32 buffer for the whole data set) instead of a
+    list of DataFrames.
     """
     # Get list of classes for later
-    list_of_tuples = []
     if classes is None:
         # This tells us to find the categories on our own.
         #    See "Handling" package for these methods.
@@ -117,77 +181,404 @@ def _data_tuples_from_fnames(input_path='./', skiprows=0, classes=None):
     else:
         pass
 
-    # Now loop through each item in list, load the dataframe, and append
-    # the SERIAL, Dataframe (fixed), and Class to the list of tuples!
+    # Only the csv files are read, anything else in the folder is ignored
+    csv_entries = [entry for entry in os.listdir(input_path)
+                   if entry.endswith('.csv')]
+    if homogeneous and csv_entries:
+        schema = handling._infer_csv_schema(input_path+csv_entries[0],
+                                            skiprows=skiprows)
+    else:
+        schema = None
+    if cache and packed:
+        return PackedDataTuples.from_tuples(_cached_data_tuples(
+            input_path, csv_entries, skiprows, classes, n_workers=n_workers,
+            chunk_size=chunk_size, pool=pool, shard_size=cache_shard_size,
+            schema=schema))
+    elif cache:
+        return _cached_data_tuples(input_path, csv_entries, skiprows,
+                                   classes, n_workers=n_workers,
+                                   chunk_size=chunk_size, pool=pool,
+                                   shard_size=cache_shard_size, schema=schema)
+    elif packed:
+        # Pack the files as they are read, so that their DataFrames
+        # never pile up in memory.
+        return PackedDataTuples.from_tuples(_iter_data_tuples(
+            input_path, csv_entries, skiprows, classes, n_workers=n_workers,
+            chunk_size=chunk_size, pool=pool, bounded=True, schema=schema))
+    elif stream:
+        return _iter_data_tuples(input_path, csv_entries, skiprows, classes,
+                                 n_workers=n_workers, chunk_size=chunk_size,
+                                 pool=pool, bounded=True, schema=schema)
+    else:
+        return _read_data_tuples(input_path, csv_entries, skiprows, classes,
+                                 n_workers=n_workers, chunk_size=chunk_size,
+                                 pool=pool, schema=schema)
+
+
+def _read_data_tuples(input_path, csv_entries, skiprows, classes,
+                      n_workers=1, chunk_size=None, pool='process',
+                      schema=None):
+    """
+    Read the given csv_entries of input_path into a list of data tuples,
+    with one worker or with a pool of n_workers processes or threads.
+    """
+    return _collect_data_tuples(
+        _iter_data_tuples(input_path, csv_entries, skiprows, classes,
+                          n_workers=n_workers, chunk_size=chunk_size,
+                          pool=pool, schema=schema), len(csv_entries))
+
+
+def _iter_data_tuples(input_path, csv_entries, skiprows, classes,
+                      n_workers=1, chunk_size=None, pool='process',
+                      bounded=False, schema=None):
+    """
+    Generator of the data tuples of the given csv_entries of input_path,
+    in the same order as csv_entries.
+
+    With a pool of workers, all of the files are handed to the pool at
+    once, unless bounded=True: then only a few chunks per worker are given
+    at a time, so that a slow consumer does not pile up read files in
+    memory.
+    """
+    read_entry = functools.partial(_read_data_tuple, input_path=input_path,
+                                   skiprows=skiprows, classes=classes,
+                                   schema=schema)
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    # Now loop through each item in list, load the dataframe, and yield
+    # the SERIAL, Dataframe (fixed), and Class tuple!
+    if n_workers > 1 and len(csv_entries) > 1:
+        if chunk_size is None and bounded:
+            chunk_size = 16
+        elif chunk_size is None:
+            chunk_size = max(1, len(csv_entries) // (4 * n_workers))
+        if bounded:
+            window = 4 * n_workers * chunk_size
+        else:
+            window = len(csv_entries)
+        if pool == 'thread':
+            executor = ThreadPoolExecutor(max_workers=n_workers)
+        else:
+            # 'spawn': in stream mode the files are read again by each run,
+            # once TensorFlow is running, and it does not survive a fork
+            executor = ProcessPoolExecutor(
+                max_workers=n_workers,
+                mp_context=multiprocessing.get_context('spawn'))
+        with executor:
+            # Executor.map gives the results back in submission order
+            for n in range(0, len(csv_entries), window):
+                yield from executor.map(read_entry,
+                                        csv_entries[n:n+window],
+                                        chunksize=chunk_size)
+    else:
+        yield from map(read_entry, csv_entries)
+
+
+def _cached_data_tuples(input_path, csv_entries, skiprows, classes,
+                        shard_size=1000, **kwargs):
+    """
+    Binary cache of the parsed csv data, kept in input_path/.hardy_cache/
+
+    The cleaned data of each file is stored as float64 values in .npy
+    shards (up to shard_size files per shard, raveled one after the
+    other), and a pickled manifest records for each file its size and
+    modification time, where its values sit in which shard, and its column
+    names. Files whose size and mtime still match the manifest (and that
+    were read with the same skiprows) are loaded back from the memory
+    mapped shards, all others are read from the csv files (kwargs are
+    passed to _read_data_tuples) and written to a new shard.
+
+    Returns
+    -------
+    list_of_tuples : list
+                     (FileName (no extension), DataFrame, LABEL) tuples, in
+                     the same order as csv_entries. The DataFrames of the
+                     cached files are read-only views of the shards.
+    """
+    cache_path = os.path.join(input_path, '.hardy_cache')
+    manifest_file = os.path.join(cache_path, 'manifest.pkl')
+    if not os.path.exists(cache_path):
+        os.makedirs(cache_path)
+
+    manifest = {'skiprows': skiprows, 'files': {}}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'rb') as file:
+            old_manifest = pickle.load(file)
+        if old_manifest['skiprows'] == skiprows:
+            manifest = old_manifest
+
+    # A file is a cache hit only if it did not change since it was cached
+    file_stats = {}
+    for entry in csv_entries:
+        stat = os.stat(os.path.join(input_path, entry))
+        file_stats[entry] = (stat.st_size, stat.st_mtime_ns)
+    missing = [entry for entry in csv_entries
+               if entry not in manifest['files'] or
+               manifest['files'][entry]['stat'] != file_stats[entry]]
+    n_cached = len(csv_entries) - len(missing)
+    print('Found {} of {} Files in the cache'.format(n_cached,
+                                                     len(csv_entries)))
+
+    # Read the missing files from the csv text, and add them to the cache
+    read_tuples = {}
+    if missing:
+        for data_tuple, entry in zip(
+                _read_data_tuples(input_path, missing, skiprows, classes,
+                                  **kwargs), missing):
+            read_tuples[entry] = data_tuple
+        shard_numbers = [record['shard'] for record in
+                         manifest['files'].values()]
+        next_shard = max(shard_numbers) + 1 if shard_numbers else 0
+        for n in range(0, len(missing), shard_size):
+            shard_entries = missing[n:n+shard_size]
+            values = [read_tuples[entry][1].to_numpy(dtype=np.float64)
+                      for entry in shard_entries]
+            offset = 0
+            for entry, file_values in zip(shard_entries, values):
+                manifest['files'][entry] = {
+                    'stat': file_stats[entry], 'shard': next_shard,
+                    'offset': offset, 'shape': file_values.shape,
+                    'columns': list(read_tuples[entry][1].columns)}
+                offset += file_values.size
+            np.save(os.path.join(cache_path,
+                                 'shard_{:05d}.npy'.format(next_shard)),
+                    np.concatenate([file_values.ravel() for file_values
+                                    in values] + [np.empty(0)]))
+            next_shard += 1
+
+    # Drop the files that left the folder, and the shards nobody uses
+    manifest['files'] = {entry: record for entry, record
+                         in manifest['files'].items() if entry in file_stats}
+    used_shards = set(record['shard'] for record in
+                      manifest['files'].values())
+    for shard_file in os.listdir(cache_path):
+        if shard_file.startswith('shard_') and \
+                int(shard_file[6:11]) not in used_shards:
+            os.remove(os.path.join(cache_path, shard_file))
+    # Write the manifest to a temporary file first, so that an interrupted
+    # run never leaves a half written manifest behind.
+    with open(manifest_file + '.tmp', 'wb') as file:
+        pickle.dump(manifest, file)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+    shards = {}
+    list_of_tuples = []
+    for entry in csv_entries:
+        if entry in read_tuples:
+            list_of_tuples.append(read_tuples[entry])
+            continue
+        record = manifest['files'][entry]
+        if record['shard'] not in shards:
+            shards[record['shard']] = np.load(
+                os.path.join(cache_path,
+                             'shard_{:05d}.npy'.format(record['shard'])),
+                mmap_mode='r')
+        size = record['shape'][0] * record['shape'][1]
+        file_values = shards[record['shard']][
+            record['offset']:record['offset']+size].reshape(record['shape'])
+        fdata = pd.DataFrame(file_values, columns=record['columns'],
+                             copy=False)
+        list_of_tuples.append((entry.rstrip(entry[-4:]), fdata,
+                               _label_from_fname(entry, classes)))
+    return list_of_tuples
+
+
+def _collect_data_tuples(data_tuples, n_total):
+    """
+    Gather the data tuples coming out of the file readers into a list,
+    printing the progress and the overall reading rate (files per second)
+    about ten times along the way.
+    """
     fread_timer = time.perf_counter()
-    n_total = len(os.listdir(input_path))
-    n_trigger = int(n_total/10)
-    n_counter = 0
-    n_reset = 0
-
-    last_skiprows = None
-    for entry in os.listdir(input_path):
-        n_counter += 1
-        n_reset += 1
-        if n_reset >= n_trigger:
-            fread_rate = int(n_trigger / (time.perf_counter() - fread_timer))
-            if fread_rate == 0:
-                fread_rate += 1
-            # Rate in Files per Second.
+    n_trigger = max(1, int(n_total/10))
+    list_of_tuples = []
+    for data_tuple in data_tuples:
+        list_of_tuples.append(data_tuple)
+        n_counter = len(list_of_tuples)
+        if n_counter % n_trigger == 0 or n_counter == n_total:
+            # Rate in Files per Second, over all of the workers.
+            fread_rate = n_counter / (time.perf_counter() - fread_timer)
             print('\rLoaded\t{} of {}\tFiles'.format(n_counter, n_total) +
-                  '\t at rate of {} Files per Second'.format(fread_rate),
-                  end='')
-            fread_timer = time.perf_counter()
-            n_reset = 0
-        else:
+                  '\t at rate of {} Files per Second'.format(
+                      max(1, int(fread_rate))), end='')
+    t_mins = round((time.perf_counter() - fread_timer)/60, 2)
+    print("\n\t Success!\t About {} Minutes...".format(t_mins))
+    # (Because timer has no Newline Character!)
+    return list_of_tuples
+
+
+def _read_data_tuple(entry, input_path='./', skiprows=0, classes=None,
+                     schema=None):
+    """
+    Read a single csv file of input_path into the data tuple format:
+    (FileName (no extension), DataFrame, LABEL)
+    Columns with bad data types are removed, and the label is the first
+    of the classes found in the file name (or "not_" the first class).
+    With a schema (see handling._infer_csv_schema) the file is first
+    parsed with the fixed schema, and only read the slow way if it does
+    not fit.
+    Kept at module level so that process pools can pickle it.
+    """
+    if schema is not None:
+        fdata = handling._schema_read_csv(input_path+entry, schema)
+        if fdata is not None:
+            return (entry.rstrip(entry[-4:]), fdata,
+                    _label_from_fname(entry, classes))
+    # Read data into pandas dataframe
+    fdata, last_skiprows = \
+        handling._smart_read_csv(input_path+entry, skiprows=skiprows)
+    # Now remove any columns with bad data types
+    # (Strings, objects, etc)
+    for column in fdata.columns:
+        if fdata[column].dtypes is float:
             pass
+        elif fdata[column].dtypes is np.dtype('float64'):
+            pass
+        elif fdata[column].dtypes is int:
+            pass
+        else:
+            # If type is not int, float, or numpy special float...
+            # It's either string, object, or something else bad..
+            fdata = fdata.drop(columns=column)
+
+    return (entry.rstrip(entry[-4:]), fdata,
+            _label_from_fname(entry, classes))
 
-        if entry.endswith('.csv'):
-            # Read data into pandas dataframe
-            fdata, last_skiprows = \
-                handling._smart_read_csv(input_path+entry,
-                                         skiprows=skiprows,
-                                         last_skiprows=last_skiprows)
-            # Now remove any columns with bad data types
-            # (Strings, objects, etc)
-            for column in fdata.columns:
-                if fdata[column].dtypes is float:
-                    pass
-                elif fdata[column].dtypes is np.dtype('float64'):
-                    pass
-                elif fdata[column].dtypes is int:
-                    pass
-                else:
-                    # If type is not int, float, or numpy special float...
-                    # It's either string, object, or something else bad..
-                    fdata = fdata.drop(columns=column)
-
-            label = None
-            for each_label in classes:
-                # Find the first label that matches.
-                if not label and each_label in entry:
-                    label = each_label
-                else:
-                    pass
-            if not label:
-                # If none of the labels fit, make new "not" first label
-                label = "not_" + classes[0]
-            else:
-                pass
 
-            list_of_tuples.append((entry.rstrip(entry[-4:]),
-                                  fdata, label))
+def _label_from_fname(entry, classes):
+    """
+    Classification label of a file name: the first of the classes found
+    in the name, or "not_" the first class if none of them is.
+    """
+    label = None
+    for each_label in classes:
+        # Find the first label that matches.
+        if not label and each_label in entry:
+            label = each_label
         else:
-            # If File is not csv, ignore
             pass
-    t_mins = round(n_total/fread_rate/60, 2)
-    print("\n\t Success!\t About {} Minutes...".format(t_mins))
-    # (Because timer has no Newline Character!)
-    return list_of_tuples
+    if not label:
+        # If none of the labels fit, make new "not" first label
+        label = "not_" + classes[0]
+    else:
+        pass
+    return label
+
+
+class PackedDataTuples():
+    """
+    Compact container of a whole raw data set, behind the usual
+    (SERIAL, DataFrame, LABEL) data tuple convention.
+
+    Instead of one DataFrame (and its index) per file, the data of all of
+    the files is held in one contiguous float32 buffer:
+        values :        1-d float32 array, the raveled (rows x columns)
+                        values of each file, one file after the other
+        offsets :       int64 array of n_files + 1 positions in values;
+                        file i sits in values[offsets[i]:offsets[i+1]]
+        n_rows :        int64 array of the row count of each file
+        column_table :  list of the distinct column name lists
+        column_ids :    int32 array, index of the column names of each
+                        file in column_table
+        serials :       list of the file names (no extension)
+        label_names :   sorted list of the distinct labels
+        labels :        int32 array, index of the label of each file in
+                        label_names
+
+    It acts like the list of data tuples (len, indexing, iteration), so it
+    can be passed to arbitrage.tform_tuples, rgb_list, etc. Each access
+    builds a small DataFrame on top of a read-only view of the buffer;
+    file_values(i) gives the bare array for vectorized code.
+    """
+
+    def __init__(self, values, offsets, n_rows, column_table, column_ids,
+                 serials, label_names, labels):
+        self.values = values
+        self.offsets = offsets
+        self.n_rows = n_rows
+        self.column_table = column_table
+        self.column_ids = column_ids
+        self.serials = serials
+        self.label_names = label_names
+        self.labels = labels
+
+    @classmethod
+    def from_tuples(cls, data_tuples, dtype=np.float32):
+        """
+        Pack an iterable (list or generator) of data tuples. The values of
+        each DataFrame are copied into dtype as the tuples come, so the
+        DataFrames can be freed one by one.
+        """
+        chunks = []
+        n_rows = []
+        column_table = []
+        column_keys = {}
+        column_ids = []
+        serials = []
+        label_list = []
+        for data_tuple in data_tuples:
+            fdata = data_tuple[1]
+            key = tuple(fdata.columns)
+            if key not in column_keys:
+                column_keys[key] = len(column_table)
+                column_table.append(list(key))
+            column_ids.append(column_keys[key])
+            chunks.append(fdata.to_numpy(dtype=dtype).ravel())
+            n_rows.append(len(fdata))
+            serials.append(data_tuple[0])
+            label_list.append(data_tuple[2])
+        offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([chunk.size for chunk in chunks])
+        values = np.concatenate(chunks + [np.empty(0, dtype=dtype)])
+        values.flags.writeable = False
+        label_names, labels = np.unique(np.array(label_list, dtype=str),
+                                        return_inverse=True)
+        return cls(values, offsets, np.array(n_rows, dtype=np.int64),
+                   column_table, np.array(column_ids, dtype=np.int32),
+                   serials, list(label_names), labels.astype(np.int32))
+
+    def __len__(self):
+        return len(self.serials)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('PackedDataTuples index out of range')
+        fdata = pd.DataFrame(self.file_values(index),
+                             columns=self.column_table[
+                                 self.column_ids[index]], copy=False)
+        return (self.serials[index], fdata,
+                self.label_names[self.labels[index]])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def file_values(self, index):
+        """
+        Read-only (rows x columns) view of the values of file index.
+        """
+        file_values = self.values[self.offsets[index]:self.offsets[index+1]]
+        n_columns = len(self.column_table[self.column_ids[index]])
+        return file_values.reshape(self.n_rows[index], n_columns)
+
+    @property
+    def nbytes(self):
+        """
+        Memory held by the arrays of the container (names not counted).
+        """
+        return (self.values.nbytes + self.offsets.nbytes +
+                self.n_rows.nbytes + self.column_ids.nbytes +
+                self.labels.nbytes)
 
 
 def rgb_list(data_tuples, plot_format='RgBrGb', column_names=None,
-             combine_method='add', scale=1.0):
+             combine_method='add', scale=1.0, batch_size=None,
+             resample='image', n_workers=1, precision=None):
     '''
     Input a path of csv files (with some guidance),
     Plot them RGB-wise into images
@@ -211,6 +602,20 @@ def rgb_list(data_tuples, plot_format='RgBrGb', column_names=None,
                         list given. (If no colums match, will ERROR.)
     scale :  float
              percentage fo the image to reduce its size to.
+    batch_size :    int (Optional)
+                    IF given, the images are made batch_size files at a
+                        time by rgb_batch, instead of one by one.
+    resample :      string
+                    'image' or 'profile': how to reach the scaled size
+                        (see visualization.rgb_plot)
+    n_workers :     int (Optional)
+                    IF above 1, the images are made by a pool of worker
+                        processes, writing into one shared array (see
+                        render_parallel). Same images as one worker.
+    precision :     string (Optional)
+                    None (float64 images), 'float32' or 'uint8': the images
+                        are made in float32 and given in that precision
+                        (see visualization.image_as_precision)
     Returns
     -------
     list_of_rgb_tuples  :   list of tuples
@@ -227,24 +632,71 @@ def rgb_list(data_tuples, plot_format='RgBrGb', column_names=None,
 
     print("Making rgb Images from Data...", end='\t')
     t = time.perf_counter()
-    list_of_rgb_tuples = []
+    render_kwargs = {'plot_format': plot_format,
+                     'column_names': column_names,
+                     'combine_method': combine_method, 'scale': scale,
+                     'batch_size': batch_size, 'resample': resample,
+                     'precision': precision}
+    if n_workers is None or n_workers > 1:
+        list_of_rgb_tuples = render_parallel(data_tuples, plot='rgb',
+                                             n_workers=n_workers,
+                                             **render_kwargs)
+    else:
+        list_of_rgb_tuples = list(iter_rgb_tuples(data_tuples,
+                                                  **render_kwargs))
+
+    t_sec = round(time.perf_counter()-t, 2)
+    print("Success in {}seconds!".format(t_sec))
+    return list_of_rgb_tuples
+
+
+def iter_rgb_tuples(data_tuples, plot_format='RgBrGb', column_names=None,
+                    combine_method='add', scale=1.0, batch_size=None,
+                    resample='image', precision=None):
+    '''
+    Generator version of rgb_list: yields the (SERIAL, IMG, LABEL) tuple of
+    each data tuple as soon as its image is made, so that data_tuples can
+    itself be a generator (see image_tuples_to_tensor).
+
+    With a batch_size, batch_size tuples are taken at a time and their
+    images made at once by rgb_batch (the images are views of the batch
+    array). A batch whose files do not all have the same length is made
+    one by one instead.
+    '''
+    if batch_size:
+        data_tuples = iter(data_tuples)
+        batch = list(itertools.islice(data_tuples, batch_size))
+        while batch:
+            if len(set(len(data_tuple[1]) for data_tuple in batch)) == 1:
+                rgb_images = rgb_batch(batch, plot_format, combine_method,
+                                       column_names, scale=scale,
+                                       resample=resample,
+                                       precision=precision)
+            else:
+                # Files of different lengths can't be stacked together
+                rgb_images = [rgb_visualize(data_tuple[1], plot_format,
+                                            combine_method, column_names,
+                                            scale=scale, resample=resample,
+                                            precision=precision)
+                              for data_tuple in batch]
+            for data_tuple, rgb_image in zip(batch, rgb_images):
+                yield (data_tuple[0], rgb_image, data_tuple[2])
+            batch = list(itertools.islice(data_tuples, batch_size))
+        return
+
     for data_tuple in data_tuples:
         # For each dataframe given
         fdata = data_tuple[1]
 
         rgb_image = rgb_visualize(fdata, plot_format, combine_method,
-                                  column_names, scale=scale)
+                                  column_names, scale=scale,
+                                  resample=resample, precision=precision)
         # Need some check that the visualization worked?
 
-        rgb_tuple = (data_tuple[0], rgb_image, data_tuple[2])
-        list_of_rgb_tuples.append(rgb_tuple)
-
-    t_sec = round(time.perf_counter()-t, 2)
-    print("Success in {}seconds!".format(t_sec))
-    return list_of_rgb_tuples
+        yield (data_tuple[0], rgb_image, data_tuple[2])
 
 
-def regular_plot_list(data_tuples, scale=1.0):
+def regular_plot_list(data_tuples, scale=1.0, n_workers=1, precision=None):
     '''
     Returns a list of tuples containing the arrays of images
     representing x-y plot
@@ -256,6 +708,12 @@ def regular_plot_list(data_tuples, scale=1.0):
                      (filenames, dataframe, label)
     scale :  float
           percentage fo the image to reduce its size to.
+    n_workers : int
+                number of worker processes to draw the plots with
+                (see render_parallel)
+    precision : str
+                None (float64 images), 'float32' or 'uint8'
+                (see visualization.get_img_from_canvas)
     Returns
     -------
     list_of_rgb_tuples  :   list of tuples
@@ -265,20 +723,542 @@ def regular_plot_list(data_tuples, scale=1.0):
 
     print("Making regular plot Images from Data...", end='\t')
     t = time.perf_counter()
-    list_of_plot_tuples = []
+    if n_workers is None or n_workers > 1:
+        list_of_plot_tuples = render_parallel(data_tuples, plot='regular',
+                                              n_workers=n_workers,
+                                              scale=scale,
+                                              precision=precision)
+    else:
+        list_of_plot_tuples = list(iter_regular_plot_tuples(
+            data_tuples, scale=scale, precision=precision))
+
+    t_sec = round(time.perf_counter()-t, 2)
+    print("Success in {}seconds!".format(t_sec))
+    return list_of_plot_tuples
+
+
+def iter_regular_plot_tuples(data_tuples, scale=1.0, precision=None):
+    '''
+    Generator version of regular_plot_list: yields the
+    (filename, image array, label) tuple of each data tuple as soon as its
+    image is made.
+    '''
+    # One figure is drawn on for all of the files
+    figure = vis.regular_plot_figure()
     for data_tuple in data_tuples:
         # For each dataframe given
         fdata = data_tuple[1]
 
-        plot_image = vis.regular_plot(fdata, scale=scale)
+        plot_image = vis.regular_plot(fdata, scale=scale, figure=figure,
+                                      precision=precision)
         # Need some check that the visualization worked?
 
-        plot_tuple = (data_tuple[0], plot_image, data_tuple[2])
-        list_of_plot_tuples.append(plot_tuple)
+        yield (data_tuple[0], plot_image, data_tuple[2])
 
-    t_sec = round(time.perf_counter()-t, 2)
-    print("Success in {}seconds!".format(t_sec))
-    return list_of_plot_tuples
+
+def render_parallel(data_tuples, plot='rgb', n_workers=None,
+                    chunk_size=None, **render_kwargs):
+    '''
+    Make the images of data_tuples with a pool of worker processes.
+
+    The first image is made here, to know the image shape and type; then
+    one (n_files, H, W, 3) array is allocated in shared memory, and
+    each worker writes the images of its chunk of files straight into it,
+    by index. Only the dataframes go to the workers; no image is pickled
+    back, nor copied out: the returned images are views of the shared
+    array, whose memory is freed once none of them is left. The images are
+    the same, bit for bit, as the ones of the serial iter_rgb_tuples /
+    iter_regular_plot_tuples.
+
+    Parameters
+    ----------
+    data_tuples :   list of tuples
+                    (SERIAL, DataFrame, LABEL) tuples
+    plot :          str
+                    'rgb' (iter_rgb_tuples) or 'regular'
+                    (iter_regular_plot_tuples)
+    n_workers :     int
+                    number of worker processes. None uses one per cpu.
+    chunk_size :    int (optional)
+                    number of files given to a worker at a time
+    render_kwargs : the options of iter_rgb_tuples or
+                    iter_regular_plot_tuples (scale, plot_format, ...)
+
+    Returns
+    -------
+    list_of_image_tuples : list of tuples
+                           (SERIAL, IMG, LABEL) tuples, where the images
+                           are views of one (n_files, H, W, 3) array.
+    '''
+    data_tuples = list(data_tuples)
+    n_files = len(data_tuples)
+    if n_files == 0:
+        return []
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    frames = [data_tuple[1] for data_tuple in data_tuples]
+    first_image = np.asarray(_render_frames(frames[:1], plot,
+                                            render_kwargs)[0])
+    shape = (n_files,) + first_image.shape
+    dtype = first_image.dtype
+
+    shared = shared_memory.SharedMemory(
+        create=True, size=max(1, int(np.prod(shape))*dtype.itemsize))
+    image_tensor = np.ndarray(shape, dtype=dtype, buffer=shared.buf)
+    try:
+        image_tensor[0] = first_image
+        if chunk_size is None:
+            chunk_size = max(1, (n_files-1) // (4 * n_workers))
+        # 'spawn': TensorFlow may be running already (e.g. in the later
+        # runs of hardy_multi_transform), and does not survive a fork
+        with ProcessPoolExecutor(
+                max_workers=n_workers,
+                mp_context=multiprocessing.get_context('spawn')) as executor:
+            jobs = [executor.submit(_render_into_shared, shared.name, shape,
+                                    dtype, start,
+                                    frames[start:start+chunk_size], plot,
+                                    render_kwargs)
+                    for start in range(1, n_files, chunk_size)]
+            for job in jobs:
+                # Raises here any error of the worker
+                job.result()
+    except BaseException:
+        # (the array is let go first: a block can't close under a view)
+        image_tensor = None
+        shared.close()
+        raise
+    finally:
+        # Only the name goes: the mapped block stays until it is closed
+        shared.unlink()
+    # The block is closed when the images (views of image_tensor) are gone
+    weakref.finalize(image_tensor, shared.close)
+    return [(data_tuple[0], image_tensor[i], data_tuple[2])
+            for i, data_tuple in enumerate(data_tuples)]
+
+
+def _render_frames(frames, plot, render_kwargs):
+    '''
+    The images of a list of dataframes, made by the serial generators.
+    '''
+    data_tuples = [(None, fdata, None) for fdata in frames]
+    if plot == 'regular':
+        image_tuples = iter_regular_plot_tuples(data_tuples, **render_kwargs)
+    else:
+        image_tuples = iter_rgb_tuples(data_tuples, **render_kwargs)
+    return [image_tuple[1] for image_tuple in image_tuples]
+
+
+def _render_into_shared(shared_name, shape, dtype, start, frames, plot,
+                        render_kwargs):
+    '''
+    Worker of render_parallel: writes the images of frames into the
+    shared (n_files, H, W, 3) array, from index start on.
+    Kept at module level so that process pools can pickle it.
+    '''
+    shared = shared_memory.SharedMemory(name=shared_name)
+    try:
+        image_tensor = np.ndarray(shape, dtype=dtype, buffer=shared.buf)
+        for i, image in enumerate(_render_frames(frames, plot,
+                                                 render_kwargs)):
+            image_tensor[start+i] = image
+        del image_tensor
+    finally:
+        shared.close()
+
+
+def image_tuples_to_tensor(image_tuples, n_files):
+    '''
+    Stack the images of a stream of image tuples into one preallocated
+    array, as they come.
+
+    Chained with the generators (_data_tuples_from_fnames with stream=True,
+    arbitrage.iter_tform_tuples and iter_rgb_tuples) each file goes from
+    csv to image without any intermediate list, so the memory used is
+    bounded by the final image array.
+
+    Parameters
+    ----------
+    image_tuples : iterable of tuples
+                   (filename, image array, label) tuples. All of the
+                   images need to have the same shape.
+    n_files : int
+              the number of tuples in image_tuples, used to allocate the
+              array of shape (n_files, H, W, 3) when the first image comes.
+
+    Returns
+    -------
+    list_of_image_tuples : list of tuples
+                           (filename, image array, label) tuples, where each
+                           image array is a view into the one stacked array.
+    '''
+    image_tensor = None
+    list_of_image_tuples = []
+    for i, image_tuple in enumerate(image_tuples):
+        image = image_tuple[1]
+        if image_tensor is None:
+            image_tensor = np.empty((n_files,) + np.shape(image),
+                                    dtype=np.asarray(image).dtype)
+        assert np.shape(image) == image_tensor.shape[1:], \
+            'image of {} has shape {}, expected {}'.format(
+                image_tuple[0], np.shape(image), image_tensor.shape[1:])
+        image_tensor[i] = image
+        list_of_image_tuples.append((image_tuple[0], image_tensor[i],
+                                     image_tuple[2]))
+    assert len(list_of_image_tuples) == n_files, \
+        'expected {} images, got {}'.format(n_files,
+                                            len(list_of_image_tuples))
+    return list_of_image_tuples
+
+
+class ProfileImages():
+    """
+    Compact, lazy stand-in for the list of RGBrgb image tuples.
+
+    Each RGBrgb image is fully set by the (normalized, resized) red, green
+    and blue arrays of its x image and of its y image, so only these are
+    kept, and the dense images are made when they are asked for:
+        profiles_x :     (n_files, n, 3) float array of the x profiles
+        profiles_y :     (n_files, n, 3) float array of the y profiles,
+                         or None for images made of the x image only
+        combine_method : "add" or "mlt"
+        serials :        list of the file names
+        labels :         list of the labels
+
+    The memory used goes from n_files*n*n*3 to n_files*2*n*3 values.
+    It acts like the list of image tuples (len, indexing, iteration give
+    (SERIAL, IMG, LABEL) with a dense image), and images(indices) gives
+    the dense images of many files at once, as used by learning_set and
+    test_set through sequences.ImageSequence.
+    """
+
+    def __init__(self, profiles_x, profiles_y, combine_method, serials,
+                 labels):
+        self.profiles_x = profiles_x
+        self.profiles_y = profiles_y
+        self.combine_method = combine_method
+        self.serials = serials
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.serials)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('ProfileImages index out of range')
+        return (self.serials[index], self.images([index])[0],
+                self.labels[index])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def images(self, indices):
+        """
+        Dense (len(indices), n, n, 3) images of the files at indices.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if self.profiles_y is None:
+            return vis.profile_images_batch(self.profiles_x[indices])
+        return vis.profile_images_batch(self.profiles_x[indices],
+                                        self.profiles_y[indices],
+                                        self.combine_method)
+
+    def subset(self, indices):
+        """
+        New ProfileImages of the files at indices (in that order).
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        profiles_y = None
+        if self.profiles_y is not None:
+            profiles_y = self.profiles_y[indices]
+        return ProfileImages(self.profiles_x[indices], profiles_y,
+                             self.combine_method,
+                             [self.serials[i] for i in indices],
+                             [self.labels[i] for i in indices])
+
+    @property
+    def nbytes(self):
+        """
+        Memory held by the profile arrays.
+        """
+        if self.profiles_y is None:
+            return self.profiles_x.nbytes
+        return self.profiles_x.nbytes + self.profiles_y.nbytes
+
+
+class ImageTensor():
+    """
+    The images of a list of image tuples, stacked once into one tensor.
+
+        tensor :  (n_files, n, n, channels) uint8 array of the images,
+                  in the 0-255 form given to the ImageDataGenerator flow
+        serials : list of the file names
+        labels :  list of the labels
+
+    Like ProfileImages, it acts like the list of image tuples, and
+    images(indices) gathers the images of a batch, so that learning_set
+    can cut the folds of a k-fold as index arrays over this one tensor
+    (through sequences.ImageSequence) instead of copying the images of
+    each fold.
+    """
+
+    def __init__(self, tensor, serials, labels):
+        self.tensor = tensor
+        self.serials = serials
+        self.labels = labels
+
+    @classmethod
+    def from_tuples(cls, image_list, target_size=(80, 80), color_mode='rgb'):
+        """
+        Stack a list of (SERIAL, IMG, LABEL) image tuples, with float (0 to
+        1) or uint8 images, as learning_set does.
+        """
+        if isinstance(image_list, ImageTensor):
+            return image_list
+        n = target_size[0]
+        channels = 3 if color_mode == 'rgb' else 1
+        tensor = np.array([image_tuple[1] for image_tuple in image_list])
+        if tensor.ndim != 4:
+            tensor = tensor.reshape(tensor.shape[0], n, n, channels)
+        if tensor.dtype != np.uint8:
+            tensor = vis.image_as_precision(tensor, 'uint8')
+        return cls(tensor, [image_tuple[0] for image_tuple in image_list],
+                   [image_tuple[2] for image_tuple in image_list])
+
+    def __len__(self):
+        return len(self.serials)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('ImageTensor index out of range')
+        return (self.serials[index], self.tensor[index], self.labels[index])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def images(self, indices):
+        """
+        (len(indices), n, n, channels) uint8 images of the files at indices.
+        """
+        return self.tensor[np.asarray(indices, dtype=np.int64)]
+
+    @functools.cached_property
+    def tf_tensor(self):
+        """
+        The tensor as a tensorflow constant (made once, for all of the
+        tf.data sets of sequences.image_dataset over these images).
+        """
+        return tf.constant(self.tensor)
+
+    @property
+    def nbytes(self):
+        return self.tensor.nbytes
+
+
+class RenderedImages():
+    """
+    Lazy stand-in for the list of image tuples, keeping only the
+    (transformed) data tuples and making the images of a batch when they
+    are asked for, so that the image set is never held in memory.
+
+        data_tuples :   list of (SERIAL, DataFrame, LABEL) tuples, or a
+                        PackedDataTuples
+        plot :          'rgb' (images of iter_rgb_tuples) or 'regular'
+                        (iter_regular_plot_tuples)
+        render_kwargs : the options of iter_rgb_tuples or
+                        iter_regular_plot_tuples (plot_format, scale,
+                        batch_size, resample, precision...)
+        n_workers :     number of worker processes making the images of a
+                        batch (each worker makes a part of the batch)
+        cache_bytes :   memory budget (in bytes) of the made images kept,
+                        least recently used first out, for the next epochs.
+                        0 keeps none.
+
+    Like ProfileImages, it acts like the list of image tuples and
+    images(indices) gives the images of many files at once, as used by
+    learning_set and test_set through sequences.ImageSequence (or
+    sequences.image_dataset). The images are the same as the ones of
+    rgb_list / regular_plot_list with the same options. Call close() to
+    stop the worker processes. images() can be called from many threads
+    at once (e.g. by the parallel map of sequences.image_dataset).
+    """
+
+    def __init__(self, data_tuples, plot='rgb', n_workers=1, cache_bytes=0,
+                 **render_kwargs):
+        if not hasattr(data_tuples, '__getitem__'):
+            # A stream of data tuples: only the 1-D data is kept
+            data_tuples = list(data_tuples)
+        self.data_tuples = data_tuples
+        if isinstance(data_tuples, PackedDataTuples):
+            self.serials = data_tuples.serials
+            self.labels = [data_tuples.label_names[i]
+                           for i in data_tuples.labels]
+        else:
+            self.serials = [data_tuple[0] for data_tuple in data_tuples]
+            self.labels = [data_tuple[2] for data_tuple in data_tuples]
+        self.plot = plot
+        self.render_kwargs = render_kwargs
+        self.n_workers = n_workers
+        self.cache_bytes = cache_bytes
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = collections.OrderedDict()
+        # Guards the cache and its counters
+        self._lock = threading.Lock()
+        # The worker pool, shared with the subsets
+        self._pool = {'executor': None, 'lock': threading.Lock()}
+
+    def __len__(self):
+        return len(self.serials)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('RenderedImages index out of range')
+        return (self.serials[index], self.images([index])[0],
+                self.labels[index])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def images(self, indices):
+        """
+        (len(indices), H, W, 3) images of the files at indices. Only the
+        files that are not kept in the cache are made.
+        """
+        indices = [int(i) for i in np.asarray(indices, dtype=np.int64)]
+        # The cached images are taken at once, so that another call can't
+        # evict them while the missing ones are made
+        with self._lock:
+            found = dict((i, self._cached(i)) for i in dict.fromkeys(indices)
+                         if i in self._images)
+            missing = [i for i in dict.fromkeys(indices) if i not in found]
+            self.misses += len(missing)
+            self.hits += len(indices) - len(missing)
+        made = dict(zip(missing, self._render(missing)))
+        batch = np.stack([found[i] if i in found else made[i]
+                          for i in indices])
+        with self._lock:
+            for i, image in made.items():
+                if i not in self._images:
+                    self._put(i, image)
+        return batch
+
+    def _render(self, indices):
+        frames = [self.data_tuples[i][1] for i in indices]
+        if not self.n_workers or self.n_workers <= 1 or len(frames) < 2:
+            return _render_frames(frames, self.plot, self.render_kwargs)
+        with self._pool['lock']:
+            if self._pool['executor'] is None:
+                # 'spawn': the images are made while TensorFlow is running,
+                # which does not survive a fork
+                self._pool['executor'] = ProcessPoolExecutor(
+                    max_workers=self.n_workers,
+                    mp_context=multiprocessing.get_context('spawn'))
+        chunk_size = -(-len(frames) // self.n_workers)
+        chunks = [frames[start:start+chunk_size]
+                  for start in range(0, len(frames), chunk_size)]
+        jobs = self._pool['executor'].map(
+            _render_frames, chunks, itertools.repeat(self.plot),
+            itertools.repeat(self.render_kwargs))
+        return [image for images in jobs for image in images]
+
+    def _cached(self, index):
+        self._images.move_to_end(index)
+        return self._images[index]
+
+    def _put(self, index, image):
+        image = np.array(image)
+        if image.nbytes > self.cache_bytes:
+            return
+        self._images[index] = image
+        self.cached_bytes += image.nbytes
+        while self.cached_bytes > self.cache_bytes:
+            old_index, old_image = self._images.popitem(last=False)
+            self.cached_bytes -= old_image.nbytes
+
+    def subset(self, indices):
+        """
+        New RenderedImages of the files at indices (in that order), with
+        the same options and worker pool (and an empty cache).
+        """
+        subset = RenderedImages([self.data_tuples[i] for i in indices],
+                                self.plot, self.n_workers, self.cache_bytes,
+                                **self.render_kwargs)
+        subset._pool = self._pool
+        return subset
+
+    def close(self):
+        """
+        Stop the worker processes of this set and of its subsets (they are
+        started again if needed).
+        """
+        with self._pool['lock']:
+            if self._pool['executor'] is not None:
+                self._pool['executor'].shutdown()
+                self._pool['executor'] = None
+
+
+# Image lists that give the images of a batch (see sequences.ImageSequence)
+_IMAGE_SOURCES = (ProfileImages, ImageTensor, RenderedImages,
+                  records.ImageRecords)
+
+
+def rgb_profiles(data_tuples, plot_format='RgBrGb', column_names=None,
+                 combine_method='add', scale=1.0):
+    '''
+    Lazy version of rgb_list: keeps only the profiles of each image, in a
+    ProfileImages container. Its images are the ones of rgb_list with
+    resample='profile' (all of the files need to have the same length).
+
+    Parameters
+    ----------
+    data_tuples :   list of tuples
+                    (SERIAL, DataFrame, LABEL) tuples
+    plot_format, column_names, combine_method, scale :
+                    as in rgb_list
+
+    Returns
+    -------
+    profile_images : ProfileImages
+    '''
+    profiles_x = []
+    profiles_y = []
+    serials = []
+    labels = []
+    for data_tuple in data_tuples:
+        profile_x, profile_y = _rgb_profiles(data_tuple[1], plot_format,
+                                             column_names)
+        resized_dimension = len(profile_x)*scale
+        profiles_x.append(vis._resample_profiles(
+            vis.normalize_batch(profile_x[np.newaxis]), resized_dimension)[0])
+        profiles_y.append(vis._resample_profiles(
+            vis.normalize_batch(profile_y[np.newaxis]), resized_dimension)[0])
+        serials.append(data_tuple[0])
+        labels.append(data_tuple[2])
+
+    # The same special cases as rgb_visualize
+    if plot_format == 'single':
+        return ProfileImages(np.stack(profiles_x), None, combine_method,
+                             serials, labels)
+    if plot_format == 'else':
+        combine_method = 'add'
+    return ProfileImages(np.stack(profiles_x), np.stack(profiles_y),
+                         combine_method, serials, labels)
 
 
 def data_set_split(image_list, test_set_filenames):
@@ -286,6 +1266,9 @@ def data_set_split(image_list, test_set_filenames):
     Function that splits the list of image arrays into a test set and a
     learning setto use for the classification step
 
+    The tuples are not copied: the two lists hold the same tuples as
+    image_list, in the same order (see data_set_split_indices).
+
     Parameters
     ----------
     image_list : list
@@ -307,14 +1290,52 @@ def data_set_split(image_list, test_set_filenames):
                         the learning set
 
     '''
-    test_set_list = [n for n in image_list if n[0][:][:] in test_set_filenames]
-    learning_set_list = [n for n in image_list if n not in test_set_list]
+    if isinstance(image_list, (ProfileImages, RenderedImages,
+                               records.ImageRecords)):
+        test_indices, learning_indices = data_set_split_indices(
+            image_list.serials, test_set_filenames)
+        return (image_list.subset(test_indices),
+                image_list.subset(learning_indices))
+
+    test_indices, learning_indices = data_set_split_indices(
+        [n[0] for n in image_list], test_set_filenames)
+    test_set_list = [image_list[i] for i in test_indices]
+    learning_set_list = [image_list[i] for i in learning_indices]
 
     return test_set_list, learning_set_list
 
 
+def data_set_split_indices(serials, test_set_filenames):
+    '''
+    Function that gives the positions of the test set and of the learning
+    set files in a list of filenames, by looking each one up in a set of the
+    test set filenames (one pass, no comparison of the images).
+
+    Parameters
+    ----------
+    serials : list
+              The filenames of the data set, in order (e.g. the first item
+              of each image tuple)
+    test_set_filenames : list
+                         List of strings containig the filename of the datasets
+                         selected to the be in the test set
+
+    Returns
+    -------
+    test_indices : np.ndarray
+                   sorted int array of the positions of the test set files
+    learning_indices : np.ndarray
+                       sorted int array of the positions of the other files
+    '''
+    test_set_filenames = set(test_set_filenames)
+    in_test_set = np.fromiter((serial in test_set_filenames
+                               for serial in serials), dtype=bool)
+    return np.flatnonzero(in_test_set), np.flatnonzero(~in_test_set)
+
+
 def rgb_visualize(fdata, plot_format='RGBrgb', combine_method='add',
-                  column_names=None, scale=1.0):
+                  column_names=None, scale=1.0, resample='image',
+                  precision=None):
     '''
     Input a list of dataframes (already read and/or processed),
     Plot them RGB-wise into images
@@ -340,6 +1361,10 @@ def rgb_visualize(fdata, plot_format='RGBrgb', combine_method='add',
     combine_method: "add" or "mlt" - which visualization fn to use
     scale :  float
              percentage fo the image to reduce its size to.
+    resample :  'image' or 'profile', passed to visualization.rgb_plot
+    precision : None, 'float32' or 'uint8'. With a precision, the images
+                are made and combined in float32, and the result given in
+                that precision (see visualization.image_as_precision).
 
     Returns
     -------
@@ -354,16 +1379,21 @@ def rgb_visualize(fdata, plot_format='RGBrgb', combine_method='add',
     '''
     if not column_names:
         column_names = list(fdata.columns)
+    # The images are combined in float32 when a precision is asked for
+    working = None if precision is None else 'float32'
     # This plot_format [single / else] could be removed. Discuss it
     if plot_format == 'single':
         rgb_image = vis.rgb_plot(red_array=fdata[column_names[0]],
                                  blue_array=fdata[column_names[1]],
-                                 plot=False, scale=scale)
+                                 plot=False, scale=scale, resample=resample,
+                                 precision=working)
     elif plot_format == "else":
         rgb_image_x = vis.rgb_plot(red_array=fdata[column_names[0]],
-                                   plot=False, scale=scale)
+                                   plot=False, scale=scale,
+                                   resample=resample, precision=working)
         rgb_image_y = vis.rgb_plot(blue_array=fdata[column_names[1]],
-                                   plot=False, scale=scale)
+                                   plot=False, scale=scale,
+                                   resample=resample, precision=working)
         rgb_image = vis.orthogonal_images_add(rgb_image_x, rgb_image_y,
                                               plot=False)
     else:
@@ -391,9 +1421,11 @@ def rgb_visualize(fdata, plot_format='RGBrgb', combine_method='add',
             if b is None and plot_format[i] == "b":
                 b = fdata[column_names[i]]
         rgb_image_x = vis.rgb_plot(red_array=R, green_array=G,
-                                   blue_array=B, plot=False, scale=scale)
+                                   blue_array=B, plot=False, scale=scale,
+                                   resample=resample, precision=working)
         rgb_image_y = vis.rgb_plot(red_array=r, green_array=g,
-                                   blue_array=b, plot=False, scale=scale)
+                                   blue_array=b, plot=False, scale=scale,
+                                   resample=resample, precision=working)
 
         # Default to "Add", but check for the option of using the mlt fn.
         if combine_method == "mlt":
@@ -404,7 +1436,87 @@ def rgb_visualize(fdata, plot_format='RGBrgb', combine_method='add',
             rgb_image = vis.orthogonal_images_add(rgb_image_x,
                                                   rgb_image_y,
                                                   plot=False)
-    return rgb_image
+    return vis.image_as_precision(rgb_image, precision)
+
+
+def _rgb_profiles(fdata, plot_format='RGBrgb', column_names=None):
+    '''
+    The (n_points, 3) red, green and blue arrays of the x and of the y image
+    of one dataframe, as rgb_visualize picks them from the plot_format
+    string (zeros for a channel that is not plotted).
+    '''
+    if not column_names:
+        column_names = list(fdata.columns)
+    # The to-be-depreciated formats, as written in rgb_visualize
+    if plot_format == 'single':
+        plot_format = 'RB'
+    elif plot_format == 'else':
+        plot_format = 'Rb'
+    profiles_x = np.zeros((len(fdata), 3))
+    profiles_y = np.zeros((len(fdata), 3))
+    found = set()
+    for i in range(len(plot_format)):
+        # React to FIRST encounter of each letter, as in rgb_visualize
+        letter = plot_format[i]
+        if letter in found or letter.upper() not in 'RGB':
+            continue
+        found.add(letter)
+        channel = 'RGB'.index(letter.upper())
+        if letter.isupper():
+            profiles_x[:, channel] = fdata[column_names[i]]
+        else:
+            profiles_y[:, channel] = fdata[column_names[i]]
+    return profiles_x, profiles_y
+
+
+def rgb_batch(data_tuples, plot_format='RGBrgb', combine_method='add',
+              column_names=None, scale=1.0, resample='image',
+              precision=None):
+    '''
+    Batch version of rgb_visualize: makes the images of all of the
+    dataframes of data_tuples at once, with the batch functions of
+    visualization (no loop over the files other than to gather the data).
+
+    Parameters
+    ----------
+    data_tuples :   list of tuples
+                    (SERIAL, DataFrame, LABEL) tuples. All of the
+                    dataframes need to have the same number of rows.
+    plot_format :   see rgb_visualize
+    combine_method: "add" or "mlt"
+    column_names :  see rgb_visualize
+    scale :  float
+             percentage fo the image to reduce its size to.
+    resample :  'image' or 'profile', see visualization.rgb_plot
+    precision : None, 'float32' or 'uint8', see rgb_visualize
+
+    Returns
+    -------
+    rgb_images :    ndarray of shape (n_files, N, N, 3)
+                    the same images as rgb_visualize makes for each file.
+                    (Raises ValueError if the files differ in length.)
+    '''
+    profiles = [_rgb_profiles(data_tuple[1], plot_format, column_names)
+                for data_tuple in data_tuples]
+    profiles_x = np.stack([profile[0] for profile in profiles])
+    profiles_y = np.stack([profile[1] for profile in profiles])
+
+    working = None if precision is None else 'float32'
+    rgb_images_x = vis.rgb_plot_batch(profiles_x, scale=scale,
+                                      resample=resample, precision=working)
+    if plot_format == 'single':
+        # Only the x image, as in rgb_visualize
+        return vis.image_as_precision(rgb_images_x, precision)
+    rgb_images_y = vis.rgb_plot_batch(profiles_y, scale=scale,
+                                      resample=resample, precision=working)
+    if combine_method == "mlt" and plot_format != 'else':
+        rgb_images = vis.orthogonal_images_mlt_batch(rgb_images_x,
+                                                     rgb_images_y)
+    else:
+        rgb_images = vis.orthogonal_images_add_batch(rgb_images_x,
+                                                     rgb_images_y)
+    return vis.image_as_precision(rgb_images, precision)
+
 
 # The following funciton needs to be revised and connected
 #  to the amin code wrapping function
@@ -494,7 +1606,9 @@ def _safe_clear_dirflow(the_path):
 def learning_set(path=None, split=0.1, target_size=(80, 80),
                  classes=['noisy', 'not_noisy'], batch_size=32,
                  color_mode='rgb', iterator_mode='arrays',
-                 image_list=None, k_fold=None, k=None, fold=None, **kwargs):
+                 image_list=None, k_fold=None, k=None, fold=None,
+                 fold_order=None, label_codec=None, seed=None, cache=False,
+                 **kwargs):
     '''
     A funciton that will create an iterator for the files representing the
     learning sets
@@ -521,13 +1635,43 @@ def learning_set(path=None, split=0.1, target_size=(80, 80),
                     string indicating which Keras IamgeDataGenerator mode
                     to use. Options are 'arrays' or 'images'. The first will
                     use the "flow" option, the second will use
-                    "flow_from_directory" option
+                    "flow_from_directory" option. 'tfdata' makes
+                    tf.data.Dataset sets from image_list instead (see
+                    sequences.image_dataset), with the ImageDataGenerator
+                    **kwargs transforms run in a parallel map and the
+                    batches prefetched.
     image_list: list
                  The list of tuples in the following format
                  (filenames, image_array, label)
+                 The image arrays are float (0 to 1) or uint8 (0 to 255,
+                 as made with precision='uint8') arrays.
+                 It can also be a ProfileImages, an ImageTensor, a
+                 RenderedImages or a records.ImageRecords, in which case
+                 the sets are sequences.ImageSequence batch generators that
+                 only make (or gather) the images of each batch.
     k_fold: Bool
+            option to return the training and validation sets of one fold
+            of a k-fold. The sets are ImageSequence batch generators over
+            the indices of the fold, with no copy of the images.
     k:  int
+        the number of folds
     fold: int
+          the fold to use as the validation set
+    fold_order: array (optional)
+                the permutation of the files the k folds are cut from. Give
+                the same one for each fold (as cnn.k_fold_model does) for
+                the folds to split the files. Default is a new random
+                permutation.
+    label_codec: labels.LabelCodec (optional)
+                 the label -> class index mapping to encode the labels
+                 with (see image_label_codec), to number the classes the
+                 same way in every set. Default is the sorted labels of
+                 image_list.
+    seed: int (optional)
+          seed of the shuffling of the ImageSequence and tf.data sets
+    cache: bool
+           option to keep the images of the tf.data sets in memory after
+           the first epoch (for a ProfileImages image_list)
 
     Returns
     -------
@@ -537,7 +1681,18 @@ def learning_set(path=None, split=0.1, target_size=(80, 80),
                 The training set containg labelled images
     '''
 
-    if iterator_mode == 'arrays':
+    if iterator_mode == 'tfdata' or (iterator_mode == 'arrays' and (
+            k_fold or isinstance(image_list, _IMAGE_SOURCES))):
+        assert image_list, 'the image arrays should be provided'
+        if not isinstance(image_list, _IMAGE_SOURCES):
+            image_list = ImageTensor.from_tuples(image_list, target_size,
+                                                 color_mode)
+        training_set, validation_set = _sequence_learning_set(
+            image_list, split=split, classes=classes, batch_size=batch_size,
+            k_fold=k_fold, k=k, fold=fold, fold_order=fold_order,
+            label_codec=label_codec, iterator_mode=iterator_mode, seed=seed,
+            cache=cache, **kwargs)
+    elif iterator_mode == 'arrays':
         n = target_size[0]
         if color_mode == 'rgb':
             channels = 3
@@ -551,83 +1706,31 @@ def learning_set(path=None, split=0.1, target_size=(80, 80),
                                 for i in range(len(image_list))])
 
         image_data = image_arrays.reshape(image_arrays.shape[0], n,
-                                          n, channels).astype('float32')
-        image_data = (image_data*255).astype('uint8')
-        image_labels = np.array([image_list[i][:][2]
-                                 for i in range(len(image_list))])
-        for i, label in enumerate(np.unique(image_labels)):
-            for j in range(len(image_labels)):
-                if image_labels[j] == label:
-                    image_labels[j] = i
-
-        if len(np.unique(image_labels)) != len(np.unique(classes)):
-            print('The number of unique labels was found to be {},'
-                  ' expected {}'.format(len(np.unique(image_labels)),
-                                        len(np.unique(classes))))
-
-        if k_fold:
-
-            assert k, 'The number of folds needs to be provided'
-
-            image_data_list = [(image_data[i], image_labels[i])
-                               for i in range(len(image_data))]
-            np.random.shuffle(image_data_list)
-
-            num_validation_samples = len(image_data_list) // k
-            # define the training and validation set for the given fold
-
-            x_train = np.array(
-                [image_data_list[i][0] for i in np.concatenate(
-                    (np.arange(0, num_validation_samples*fold),
-                     np.arange(num_validation_samples*(fold+1),
-                               len(image_data_list))))])
-
-            y_train = [image_data_list[i][1] for i in
-                       np.concatenate((
-                           np.arange(0, num_validation_samples*fold),
-                           np.arange(num_validation_samples*(fold+1),
-                                     len(image_data_list))))]
-            y_train = keras.utils.to_categorical(
-                y_train, num_classes=len(np.unique(image_labels)))
-
-            x_val = np.array(
-                [image_data_list[i][0] for i in np.arange(
-                    num_validation_samples*fold,
-                    num_validation_samples*(fold+1))])
-
-            y_val = [image_data_list[i][1] for i in
-                     np.arange(num_validation_samples*fold,
-                     num_validation_samples*(fold+1))]
-            y_val = keras.utils.to_categorical(
-                y_val, num_classes=len(np.unique(image_labels)))
+                                          n, channels)
+        if image_data.dtype != np.uint8:
+            # uint8 images (precision='uint8') are already in this form
+            image_data = vis.image_as_precision(image_data, 'uint8')
+        label_codec, image_labels = _encode_labels(image_list, classes,
+                                                   label_codec)
 
+        image_labels = keras.utils.to_categorical(
+            image_labels, num_classes=label_codec.num_classes)
+
+        if split == 0:
             data = ImageDataGenerator(**kwargs)
 
-            training_set = data.flow(x=x_train, y=y_train,
-                                     shuffle=False,
-                                     batch_size=batch_size)
-            validation_set = data.flow(x=x_val, y=y_val,
-                                       shuffle=False,
-                                       batch_size=batch_size)
+            training_set = data.flow(x=image_data, y=image_labels,
+                                     batch_size=batch_size, shuffle=False)
+            validation_set = []
         else:
-            image_labels = keras.utils.to_categorical(
-                image_labels, num_classes=len(np.unique(image_labels)))
+            data = ImageDataGenerator(validation_split=split, **kwargs)
 
-            if split == 0:
-                data = ImageDataGenerator(**kwargs)
-
-                training_set = data.flow(x=image_data, y=image_labels,
-                                         batch_size=batch_size, shuffle=False)
-                validation_set = []
-            else:
-                data = ImageDataGenerator(validation_split=split, **kwargs)
-
-                training_set = data.flow(x=image_data, y=image_labels,
-                                         batch_size=batch_size,
-                                         subset='training')
-                validation_set = data.flow(x=image_data, y=image_labels,
-                                           batch_size=batch_size,
-                                           subset='validation')
+            training_set = data.flow(x=image_data, y=image_labels,
+                                     batch_size=batch_size,
+                                     subset='training')
+            validation_set = data.flow(x=image_data, y=image_labels,
+                                       batch_size=batch_size,
+                                       subset='validation')
 
     else:
         data = ImageDataGenerator(validation_split=split, **kwargs)
@@ -649,10 +1752,128 @@ def learning_set(path=None, split=0.1, target_size=(80, 80),
     return training_set, validation_set
 
 
+def image_label_codec(image_list):
+    '''
+    The LabelCodec of the labels of an image list (list of image tuples,
+    ProfileImages or ImageTensor), to share between the learning and test
+    sets made from it.
+    '''
+    return labels.LabelCodec.from_labels(_image_labels(image_list))
+
+
+def _image_labels(image_list):
+    '''
+    The labels of an image list, in order.
+    '''
+    if isinstance(image_list, _IMAGE_SOURCES):
+        return image_list.labels
+    return [image_tuple[2] for image_tuple in image_list]
+
+
+def _image_serials(image_list):
+    '''
+    The file names of an image list, in order (without making the images
+    of the lazy image lists).
+    '''
+    if isinstance(image_list, _IMAGE_SOURCES):
+        return list(image_list.serials)
+    return [image_tuple[0] for image_tuple in image_list]
+
+
+def _encode_labels(image_list, classes, label_codec=None):
+    '''
+    (label_codec, class indices) of the labels of an image list. The codec
+    of the image list itself is made if none is given.
+    '''
+    if label_codec is None:
+        label_codec = image_label_codec(image_list)
+    if label_codec.num_classes != len(np.unique(classes)):
+        print('The number of unique labels was found to be {},'
+              ' expected {}'.format(label_codec.num_classes,
+                                    len(np.unique(classes))))
+    return label_codec, label_codec.encode(_image_labels(image_list))
+
+
+def _sequence_labels(image_source, classes, label_codec=None):
+    '''
+    One-hot labels of a ProfileImages or ImageTensor, numbered as in
+    learning_set / test_set.
+    '''
+    label_codec, image_labels = _encode_labels(image_source, classes,
+                                               label_codec)
+    return keras.utils.to_categorical(image_labels,
+                                      num_classes=label_codec.num_classes)
+
+
+def _sequence_learning_set(image_source, split=0.1, classes=None,
+                           batch_size=32, k_fold=None, k=None, fold=None,
+                           fold_order=None, label_codec=None,
+                           iterator_mode='arrays', seed=None, cache=False,
+                           **kwargs):
+    '''
+    learning_set for a ProfileImages or ImageTensor: the same split of the
+    files as the ImageDataGenerator flow (the first split part is the
+    validation set, or the given fold of a shuffled order), with
+    ImageSequence sets (or tf.data sets, for iterator_mode='tfdata') over
+    the indices of each part.
+    '''
+    image_labels = _sequence_labels(image_source, classes, label_codec)
+    data = ImageDataGenerator(**kwargs) if kwargs else None
+    make_set = _sequence_set_maker(iterator_mode, seed, cache)
+    n_files = len(image_source)
+    if k_fold:
+        assert k, 'The number of folds needs to be provided'
+        if fold_order is None:
+            fold_order = np.random.default_rng(seed).permutation(n_files)
+        order = np.asarray(fold_order, dtype=np.int64)
+        assert len(order) == n_files, \
+            'the fold order should be a permutation of the files'
+        num_validation_samples = n_files // k
+        val_indices = order[num_validation_samples*fold:
+                            num_validation_samples*(fold+1)]
+        train_indices = np.concatenate(
+            (order[:num_validation_samples*fold],
+             order[num_validation_samples*(fold+1):]))
+        training_set = make_set(
+            image_source, image_labels, indices=train_indices,
+            batch_size=batch_size, image_data_generator=data)
+        validation_set = make_set(
+            image_source, image_labels, indices=val_indices,
+            batch_size=batch_size, image_data_generator=data)
+    elif split == 0:
+        training_set = make_set(
+            image_source, image_labels, batch_size=batch_size,
+            image_data_generator=data)
+        validation_set = []
+    else:
+        split_idx = int(n_files * split)
+        training_set = make_set(
+            image_source, image_labels,
+            indices=np.arange(split_idx, n_files), batch_size=batch_size,
+            shuffle=True, image_data_generator=data)
+        validation_set = make_set(
+            image_source, image_labels, indices=np.arange(split_idx),
+            batch_size=batch_size, shuffle=True, image_data_generator=data)
+    return training_set, validation_set
+
+
+def _sequence_set_maker(iterator_mode, seed=None, cache=False):
+    '''
+    The batch generator of the sets of an image source: an
+    sequences.ImageSequence, or a sequences.image_dataset tf.data
+    pipeline for iterator_mode='tfdata'.
+    '''
+    if iterator_mode == 'tfdata':
+        return functools.partial(sequences.image_dataset, seed=seed,
+                                 cache=cache)
+    return functools.partial(sequences.ImageSequence, seed=seed)
+
+
 def test_set(path=None, target_size=(80, 80),
              classes=['noisy', 'not_noisy'], batch_size=32,
              color_mode='rgb', iterator_mode='arrays',
-             image_list=None, **kwargs):
+             image_list=None, label_codec=None, seed=None, cache=False,
+             **kwargs):
     '''
     A funciton that will create an iterator for the files representing the
     test set
@@ -676,10 +1897,22 @@ def test_set(path=None, target_size=(80, 80),
                     string indicating which Keras IamgeDataGenerator mode
                     to use. Options are 'arrays' or 'images'. The first will
                     use the "flow" option, the second will use
-                    "flow_from_directory" option
+                    "flow_from_directory" option, and 'tfdata' a
+                    tf.data.Dataset (see learning_set)
     image_list : list
                  The list of tuples in the following format
                  (filenames, image_array, label)
+                 (float or uint8 image arrays, see learning_set)
+                 or a ProfileImages, ImageTensor, RenderedImages or
+                 records.ImageRecords (see learning_set)
+    label_codec : labels.LabelCodec (optional)
+                  the label -> class index mapping (see learning_set)
+    seed : int (optional)
+           seed of the ImageSequence and tf.data set (see learning_set;
+           the test files are never shuffled)
+    cache : bool
+            option to cache the images of the tf.data set (see
+            learning_set)
 
     Returns
     -------
@@ -688,7 +1921,19 @@ def test_set(path=None, target_size=(80, 80),
                 the learning dataset
     '''
     data = ImageDataGenerator(**kwargs)
-    if iterator_mode == 'arrays':
+    if iterator_mode == 'tfdata' or (iterator_mode == 'arrays' and
+                                     isinstance(image_list, _IMAGE_SOURCES)):
+        assert image_list, 'the image arrays should be provided'
+        if not isinstance(image_list, _IMAGE_SOURCES):
+            image_list = ImageTensor.from_tuples(image_list, target_size,
+                                                 color_mode)
+        make_set = _sequence_set_maker(iterator_mode, seed=seed,
+                                       cache=cache)
+        test_set = make_set(
+            image_list, _sequence_labels(image_list, classes, label_codec),
+            batch_size=batch_size, image_data_generator=data if kwargs
+            else None)
+    elif iterator_mode == 'arrays':
         n = target_size[0]
         if color_mode == 'rgb':
             channels = 3
@@ -707,20 +1952,14 @@ def test_set(path=None, target_size=(80, 80),
             n = len(image_arrays[0][1])
 
         image_data = image_arrays.reshape(image_arrays.shape[0], n,
-                                          n, channels).astype('float32')
-        image_data = (image_data*255).astype('uint8')
-        image_labels = np.array([image_list[i][:][2]
-                                 for i in range(len(image_list))])
-        for i, label in enumerate(np.unique(image_labels)):
-            for j in range(len(image_labels)):
-                if image_labels[j] == label:
-                    image_labels[j] = i
-        if len(np.unique(image_labels)) != len(np.unique(classes)):
-            print('The number of unique labels was found to be {},'
-                  ' expected {}'.format(len(np.unique(image_labels)),
-                                        len(np.unique(classes))))
+                                          n, channels)
+        if image_data.dtype != np.uint8:
+            # uint8 images (precision='uint8') are already in this form
+            image_data = vis.image_as_precision(image_data, 'uint8')
+        label_codec, image_labels = _encode_labels(image_list, classes,
+                                                   label_codec)
         image_labels = keras.utils.to_categorical(
-            image_labels, num_classes=len(np.unique(image_labels)))
+            image_labels, num_classes=label_codec.num_classes)
         test_set = data.flow(x=image_data, y=image_labels,
                              batch_size=batch_size,
                              shuffle=False)
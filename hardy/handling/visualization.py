@@ -4,6 +4,8 @@ import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from skimage.transform import resize
 
 
@@ -78,11 +80,52 @@ def normalize_image(color_image_array):
     return normalized_image
 
 
+def image_as_precision(image, precision=None):
+    '''Function that casts an image (or a batch of images) with entries in
+    the range zero to one to the given image precision.
+
+    Parameters
+    ----------
+    image : array-like
+            the image array, with float entries in range zero to one
+    precision : str
+                None keeps the image as it is. 'float32' gives a float32
+                image (zero to one), 'uint8' the 0-255 image that
+                learning_set and test_set hand to Keras (the float32 values
+                times 255, truncated).
+
+    Returns
+    -------
+    image :  array-like
+             the image in the given precision
+    '''
+    if precision is None:
+        return image
+    elif precision == 'float32':
+        return np.asarray(image, dtype=np.float32)
+    elif precision == 'uint8':
+        image = np.asarray(image, dtype=np.float32)*255
+        return image.astype(np.uint8)
+    raise ValueError("precision should be None, 'float32' or 'uint8', "
+                     "got {}".format(precision))
+
+
+def _working_dtype(precision=None):
+    '''
+    The float type images are made in: float64 by default, float32 when an
+    image precision is asked for (so no float64 image is ever made).
+    '''
+    if precision is None:
+        return np.float64
+    return np.float32
+
+
 ######################################################################
 # Plotting Functions
 def rgb_plot(red_array=None, green_array=None, blue_array=None,
              plot=True, save_image=None, filename=None,
-             save_location=None, scale=1.0):
+             save_location=None, scale=1.0, resample='image',
+             precision=None):
     '''Returns a plot which represents the input data as a color gradient of
     one of the three color channels available: red, blue or green.
 
@@ -118,6 +161,17 @@ def rgb_plot(red_array=None, green_array=None, blue_array=None,
                  in a .png file format.
                  The filename used for the file will be the same
                  as the raw data file created in this function.
+    resample : str
+               'image' (default) builds the full n x n image and resizes it
+               by scale. 'profile' resizes the three 1-D arrays to the final
+               width first, and builds the image at that size directly: as
+               every row of the image is the same array, the two agree to
+               within 1e-12 (float rounding), for a cost of O(width**2)
+               instead of O(n**2). (The plot, if any, is of the final image.)
+    precision : str
+                None (default) makes a float64 image. 'float32' or 'uint8'
+                make the image in float32 and give it in that precision
+                (see image_as_precision).
     Returns
     -------
     rbg_plot :  matplotlib plot
@@ -146,17 +200,20 @@ def rgb_plot(red_array=None, green_array=None, blue_array=None,
     green_array = normalize(arrays['green_array'])
     blue_array = normalize(arrays['blue_array'])
 
-    arbitrary_axis = np.linspace(0, 1, n[0])
-
-    r_big, a = np.meshgrid(red_array, arbitrary_axis)
-    g_big, a = np.meshgrid(green_array, arbitrary_axis)
-    b_big, a = np.meshgrid(blue_array, arbitrary_axis)
+    if resample == 'profile':
+        resized_dimension = n[0]*scale
+        red_array = _resample_profiles(red_array, resized_dimension)
+        green_array = _resample_profiles(green_array, resized_dimension)
+        blue_array = _resample_profiles(blue_array, resized_dimension)
+        n = [len(red_array)]
+        scale = 1.0
 
-    rgb_plot = np.ndarray(shape=(n[0], n[0], 3))
+    # Every row of the image is the same array (the y-axis is arbitrary)
+    rgb_plot = np.empty((n[0], n[0], 3), dtype=_working_dtype(precision))
 
-    rgb_plot[:, :, 0] = r_big
-    rgb_plot[:, :, 1] = g_big
-    rgb_plot[:, :, 2] = b_big
+    rgb_plot[:, :, 0] = np.asarray(red_array)
+    rgb_plot[:, :, 1] = np.asarray(green_array)
+    rgb_plot[:, :, 2] = np.asarray(blue_array)
 
     if plot:
         big, bax = plt.subplots(1, 1, figsize=[6, 6])
@@ -170,7 +227,20 @@ def rgb_plot(red_array=None, green_array=None, blue_array=None,
 
     resized_dimension = np.shape(rgb_plot)[0]*scale
     rgb_plot = resize(rgb_plot, (resized_dimension, resized_dimension))
-    return rgb_plot
+    return image_as_precision(rgb_plot, precision)
+
+
+def _resample_profiles(profiles, resized_dimension):
+    '''
+    Resize 1-D arrays (or (n_files, n_points, 3) batches of them, along
+    n_points) to resized_dimension points, the same way the resize of the
+    whole image does it along its data axis.
+    '''
+    profiles = np.asarray(profiles, dtype=np.float64)
+    if profiles.ndim == 1:
+        return resize(profiles, (resized_dimension,))
+    return resize(profiles, (profiles.shape[0], resized_dimension,
+                             profiles.shape[2]))
 
 
 def orthogonal_images_add(image_x, image_y, plot=True, save_image=None,
@@ -211,9 +281,8 @@ def orthogonal_images_add(image_x, image_y, plot=True, save_image=None,
                       colors: red, blue or green
 
     """
-    image_flip = np.ndarray(shape=image_y.shape)
-    for channel in range(3):
-        image_flip[:, :, channel] = image_y[:, :, channel].transpose()
+    # Transposed view of each channel (no copy)
+    image_flip = np.transpose(image_y, (1, 0, 2))
 
     if np.count_nonzero(image_flip) == 0:
         combined_image = image_x
@@ -292,9 +361,8 @@ def orthogonal_images_mlt(image_x, image_y, plot=True, save_image=None,
         else:
             pass
 
-    image_flip = np.ndarray(shape=image_y.shape)
-    for channel in range(3):
-        image_flip[:, :, channel] = image_y[:, :, channel].transpose()
+    # Transposed view of each channel (no copy)
+    image_flip = np.transpose(image_y, (1, 0, 2))
 
     combined_image = (image_x * image_flip)
 
@@ -310,10 +378,186 @@ def orthogonal_images_mlt(image_x, image_y, plot=True, save_image=None,
     return combined_image
 
 
-def regular_plot(tform_df_tuple, scale=1.0):
+######################################################################
+# Batch Functions
+#   The same images as rgb_plot and orthogonal_images_add/mlt, made for a
+#   whole batch of files at once through numpy broadcasting.
+def normalize_batch(profiles):
+    '''Function that normalizes a batch of profiles the way normalize does
+    each one: shifted up to zero if their minimum is negative, and divided by
+    their maximum if it is above one. All-zero profiles are left as they are.
+
+    Parameters
+    ----------
+    profiles : array-like
+               array of shape (n_files, n_points, n_channels). Each
+               (file, channel) profile is normalized along n_points.
+
+    Returns
+    -------
+    normalized_profiles :  array-like
+                           float64 array of the same shape, with entries in
+                           the range zero to one.
+    '''
+    profiles = np.asarray(profiles, dtype=np.float64)
+    minimum = np.amin(profiles, axis=1, keepdims=True)
+    temp_profiles = profiles + np.where(minimum < 0, -minimum, 0)
+    maximum = np.amax(temp_profiles, axis=1, keepdims=True)
+    return np.divide(temp_profiles, maximum, out=temp_profiles,
+                     where=maximum > 1)
+
+
+def rgb_plot_batch(profiles, scale=1.0, resample='image', precision=None):
+    '''Function that returns the color gradient images of a batch of files,
+    as rgb_plot does for each one (without plotting or saving).
+
+    Parameters
+    ----------
+    profiles : array-like
+               array of shape (n_files, n_points, 3) holding the red, green
+               and blue arrays of each file (zeros for a channel not given).
+    scale :  float
+             percentage fo the image to reduce its size to.
+    resample : str
+               'image' or 'profile', see rgb_plot. With 'profile' no
+               n_points x n_points image is ever made.
+    precision : str
+                None, 'float32' or 'uint8', see rgb_plot
+
+    Returns
+    -------
+    rgb_plots :  array-like
+                 array of shape (n_files, H, W, 3) (float64 by default),
+                 where each image has the data as a color gradient on the
+                 x-axis.
+    '''
+    profiles = normalize_batch(profiles)
+    if resample == 'profile':
+        profiles = _resample_profiles(profiles, profiles.shape[1]*scale)
+        scale = 1.0
+    profiles = profiles.astype(_working_dtype(precision), copy=False)
+    n_files, n_points = profiles.shape[:2]
+    # Every row of an image is the same normalized profile
+    rgb_plots = np.broadcast_to(profiles[:, np.newaxis, :, :],
+                                (n_files, n_points, n_points, 3))
+
+    resized_dimension = n_points*scale
+    if round(resized_dimension) != n_points:
+        # skimage resize works on the whole batch just like on one image,
+        # since the file and channel axes are not resized.
+        rgb_plots = resize(rgb_plots, (n_files, resized_dimension,
+                                       resized_dimension, 3))
+    else:
+        rgb_plots = np.array(rgb_plots)
+    return image_as_precision(rgb_plots, precision)
+
+
+def orthogonal_images_add_batch(images_x, images_y):
+    '''Function that combines two batches of images as orthogonal_images_add
+    does for each pair: images_y are rotated 90 degrees, added to images_x
+    and the sum is normalized per channel (as in normalize_image).
+    Images where one of the two is all zero are just the other one.
+
+    Parameters
+    ----------
+    images_x : array-like
+               array of shape (n_files, n, n, 3) with entries in range zero
+               to one
+    images_y : array-like
+               array of shape (n_files, n, n, 3) with entries in range zero
+               to one
+
+    Returns
+    -------
+    combined_images :  array-like
+                       float64 array of shape (n_files, n, n, 3)
+    '''
+    images_flip = np.swapaxes(images_y, 1, 2)
+    combined_images = images_x + images_flip
+    # Normalizing data per channel, skipping the all zero channels
+    maximum = np.amax(combined_images, axis=1, keepdims=True)
+    has_data = np.any(combined_images != 0, axis=(1, 2), keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized_images = np.where(has_data, combined_images / maximum,
+                                     combined_images)
+    # (normalize_image gives float32 images)
+    normalized_images = normalized_images.astype(np.float32)
+
+    flip_empty = ~np.any(images_flip != 0, axis=(1, 2, 3))
+    x_empty = ~np.any(images_x != 0, axis=(1, 2, 3))
+    return np.where(flip_empty[:, np.newaxis, np.newaxis, np.newaxis],
+                    images_x,
+                    np.where(x_empty[:, np.newaxis, np.newaxis, np.newaxis],
+                             images_flip, normalized_images))
+
+
+def orthogonal_images_mlt_batch(images_x, images_y):
+    '''Function that combines two batches of images as orthogonal_images_mlt
+    does for each pair: images_y are rotated 90 degrees and multiplied with
+    images_x. Where only one of the two channels has data everywhere, the
+    other one is taken as all ones. The inputs are not changed.
+
+    Parameters
+    ----------
+    images_x : array-like
+               array of shape (n_files, n, n, 3) with entries in range zero
+               to one
+    images_y : array-like
+               array of shape (n_files, n, n, 3) with entries in range zero
+               to one
+
+    Returns
+    -------
+    combined_images :  array-like
+                       float64 array of shape (n_files, n, n, 3)
+    '''
+    x_full = np.all(images_x != 0, axis=(1, 2), keepdims=True)
+    y_full = np.all(images_y != 0, axis=(1, 2), keepdims=True)
+    images_x = np.where(~x_full & y_full, 1.0, images_x)
+    images_y = np.where(x_full & ~y_full, 1.0, images_y)
+    return images_x * np.swapaxes(images_y, 1, 2)
+
+
+def profile_images_batch(profiles_x, profiles_y=None, combine_method='add'):
+    '''Function that expands a batch of normalized (and already resized)
+    profiles into their dense images, with the same result as
+    rgb_plot_batch(resample='profile') followed by the orthogonal
+    combination.
+
+    Parameters
+    ----------
+    profiles_x : array-like
+                 array of shape (n_files, n, 3), the profiles of the x image
+    profiles_y : array-like (optional)
+                 array of shape (n_files, n, 3), the profiles of the y image.
+                 If None, the images are the x images alone.
+    combine_method : str
+                     "add" or "mlt", as in orthogonal_images_add/mlt
+
+    Returns
+    -------
+    images :  array-like
+              array of shape (n_files, n, n, 3)
+    '''
+    n_files, n_points = np.shape(profiles_x)[:2]
+    shape = (n_files, n_points, n_points, 3)
+    images_x = np.broadcast_to(np.asarray(profiles_x)[:, np.newaxis], shape)
+    if profiles_y is None:
+        return np.array(images_x)
+    images_y = np.broadcast_to(np.asarray(profiles_y)[:, np.newaxis], shape)
+    if combine_method == 'mlt':
+        return orthogonal_images_mlt_batch(images_x, images_y)
+    else:
+        return orthogonal_images_add_batch(images_x, images_y)
+
+
+def regular_plot(tform_df_tuple, scale=1.0, figure=None, precision=None):
     '''
     Function that generates standard x-y plots
 
+    The plot is drawn on an Agg canvas and read straight from its pixel
+    buffer (see get_img_from_canvas), without going through a PNG file.
+
     Parameters
     ----------
     tform_df_tuple : list
@@ -321,6 +565,13 @@ def regular_plot(tform_df_tuple, scale=1.0):
                      (filenames, dataframe, label)
     scale :  float
              percentage fo the image to reduce its size to.
+    figure : matplotlib figure (optional)
+             a figure made by regular_plot_figure, to draw on instead of a
+             new one. When it already holds a plot of as many series, only
+             the data of the points is changed, which saves most of the
+             drawing setup. (The image is the same either way.)
+    precision : str
+                None, 'float32' or 'uint8', see get_img_from_canvas
     Returns
     -------
     img :  np.array
@@ -332,17 +583,99 @@ def regular_plot(tform_df_tuple, scale=1.0):
         if isinstance(entry, str):
             arrays_to_plot.append(entry)
 
-    fig = plt.figure(figsize=(5, 5))
-    ax = fig.add_subplot(1, 1, 1)
-    for i in range(len(arrays_to_plot)-1):
-        ax.scatter(tform_df_tuple[arrays_to_plot[0]],
-                   tform_df_tuple[arrays_to_plot[i+1]])
-    ax.axis('off')
-    img = get_img_from_fig(fig, scale=scale)
-    plt.close()
+    if figure is None:
+        figure = regular_plot_figure()
+    ax = figure.axes[0]
+    n_series = len(arrays_to_plot)-1
+    if n_series > 0 and len(ax.collections) == n_series:
+        # Same plot as the last one, with new points and new limits
+        ax.ignore_existing_data_limits = True
+        for i, collection in enumerate(ax.collections):
+            collection.set_offsets(np.column_stack(
+                (tform_df_tuple[arrays_to_plot[0]],
+                 tform_df_tuple[arrays_to_plot[i+1]])))
+            ax.update_datalim(collection.get_datalim(ax.transData))
+        ax.autoscale_view()
+    else:
+        ax.cla()
+        for i in range(n_series):
+            ax.scatter(tform_df_tuple[arrays_to_plot[0]],
+                       tform_df_tuple[arrays_to_plot[i+1]])
+        ax.axis('off')
+    img = get_img_from_canvas(figure, scale=scale, precision=precision)
     return img
 
 
+def regular_plot_figure(dpi=100):
+    '''
+    The figure regular_plot draws on: a 5 x 5 inch figure on its own Agg
+    canvas (outside of pyplot, so nothing needs to be closed), with one
+    set of axes.
+    '''
+    figure = Figure(figsize=(5, 5), dpi=dpi)
+    FigureCanvasAgg(figure)
+    figure.add_subplot(1, 1, 1)
+    return figure
+
+
+def regular_plot_batch(tform_dfs, scale=1.0, precision=None):
+    '''
+    Batch version of regular_plot: the x-y plots of many dataframes, all
+    drawn on one reused figure.
+
+    Parameters
+    ----------
+    tform_dfs : iterable
+                the dataframes to plot
+    scale :  float
+             percentage fo the image to reduce its size to.
+    precision : str
+                None, 'float32' or 'uint8', see get_img_from_canvas
+    Returns
+    -------
+    imgs :  np.array
+            array of shape (n_files, H, W, 3) of the images
+    '''
+    figure = regular_plot_figure()
+    return np.stack([regular_plot(tform_df, scale=scale, figure=figure,
+                                  precision=precision)
+                     for tform_df in tform_dfs])
+
+
+def get_img_from_canvas(fig, scale=1.0, precision=None):
+    '''
+    Transforms a matplotlib figure into an array, by drawing it and reading
+    its Agg pixel buffer. This gives the same image as get_img_from_fig
+    (at the figure dpi) without the PNG encoding and decoding.
+
+    Parameters
+    ----------
+    fig : matplotlib figure
+          The figure containing the x-y plot of the data, on an Agg canvas
+
+    scale :  float
+             percentage fo the image to reduce its size to.
+    precision : str
+                None (default) gives a float64 image. 'float32' or 'uint8'
+                resize the image in float32 and give it in that precision
+                (see image_as_precision).
+    Returns
+    -------
+    img :  np.array
+           A numpy arrays representing the image. Iamge will be in rgb mode
+
+    '''
+    fig.canvas.draw()
+    img = np.array(fig.canvas.buffer_rgba())[:, :, :3]
+    if precision is not None:
+        # Scaled to zero to one here, so that resize keeps float32
+        img = img.astype(np.float32)/255
+
+    resized_dimension = np.shape(img)[0]*scale
+    img = resize(img, (resized_dimension, resized_dimension))
+    return image_as_precision(img, precision)
+
+
 def get_img_from_fig(fig, scale=1.0, dpi=100):
     '''
     Transforms a matplotlib figure into an array
@@ -190,7 +190,8 @@ def report_on_metrics(model, test_set, target_names=['noisy', 'not_noisy']):
              a string containg the overall report of the performance
              of the model. Accuracy, recall and F1 scores are reported.
     '''
-    test_set.reset()
+    if not isinstance(test_set, tf.data.Dataset):
+        test_set.reset()
     Y_pred = model.predict_generator(test_set, len(test_set))
     y_pred = np.argmax(Y_pred, axis=1)
     print('Confusion Matrix \n')
@@ -198,6 +199,13 @@ def report_on_metrics(model, test_set, target_names=['noisy', 'not_noisy']):
         conf_matrix = confusion_matrix(test_set.classes, y_pred)
         report = classification_report(test_set.classes, y_pred,
                                        target_names=target_names)
+    elif isinstance(test_set, tf.data.Dataset):
+        # The labels of the (unshuffled) test set, batch by batch
+        y_true = np.argmax(np.concatenate(
+            [batch_y for batch_x, batch_y in test_set.as_numpy_iterator()]),
+            axis=1)
+        conf_matrix = confusion_matrix(y_true, y_pred)
+        report = classification_report(y_true, y_pred)
     else:
         conf_matrix = confusion_matrix(np.argmax(test_set.y, axis=1), y_pred)
         report = classification_report(np.argmax(test_set.y, axis=1), y_pred)
@@ -371,17 +379,28 @@ def feature_map_layers(img_feature_array, model, list_layer_pos, save,
 def k_fold_model(k, config_path='./', target_size=(80, 80),
                  classes=['noisy', 'not_noisy'], batch_size=32,
                  color_mode='rgb', iterator_mode='arrays',
-                 image_list=None, test_set=None, **kwargs):
+                 image_list=None, test_set=None, seed=None, **kwargs):
     '''
     '''
 
     validation_score = []
 
+    # The images are stacked once, and each fold is a pair of index
+    # arrays over the same permutation of them
+    if not isinstance(image_list, (to_catalogue.ProfileImages,
+                                   to_catalogue.RenderedImages,
+                                   to_catalogue.records.ImageRecords)):
+        image_list = to_catalogue.ImageTensor.from_tuples(
+            image_list, target_size=target_size, color_mode=color_mode)
+    fold_order = np.random.default_rng(seed).permutation(len(image_list))
+
     for fold in range(k):
         train_data, val_data = to_catalogue.learning_set(
             target_size=target_size, classes=classes, batch_size=batch_size,
-            color_mode=color_mode, iterator_mode='arrays',
-            image_list=image_list, k_fold=True, k=k, fold=fold, **kwargs)
+            color_mode=color_mode,
+            image_list=image_list, k_fold=True, k=k, fold=fold,
+            fold_order=fold_order, iterator_mode=iterator_mode, seed=seed,
+            **kwargs)
         model, history = build_model(train_data, config_path=config_path)
         validation_score.append(evaluate_model(model, val_data)[1])
 
@@ -393,8 +412,8 @@ def k_fold_model(k, config_path='./', target_size=(80, 80),
     # and return its performance
     train_data, val_data = to_catalogue.learning_set(
         target_size=target_size, classes=classes, batch_size=batch_size,
-        color_mode=color_mode, iterator_mode='arrays', split=0,
-        image_list=image_list, **kwargs)
+        color_mode=color_mode, iterator_mode=iterator_mode, split=0,
+        image_list=image_list, seed=seed, **kwargs)
     model, history = build_model(train_data, config_path=config_path)
     final_score = evaluate_model(model, test_set)
 
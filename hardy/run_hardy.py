@@ -1,35 +1,60 @@
 # from datetime import datetime
+import itertools
+import multiprocessing
 import time
 import os.path
 import shutil
 import tracemalloc
 import yaml
 
+import tensorflow as tf
+
 import hardy.recognition.cnn as cnn
 import hardy.recognition.tuner as tuner
 import hardy.data_reporting.reporting as reporting
 
 from hardy.handling import pre_processing as preprocessing
+from hardy.handling import records as records
 from hardy.handling import to_catalogue as to_catalogue
 from hardy.arbitrage import arbitrage
+from concurrent.futures import ProcessPoolExecutor
 from time import perf_counter
 
+# The iterator modes that give the classifier the images in memory
+_ARRAY_MODES = ('arrays', 'tfdata')
+# The data_wrapper options that change the images of a run
+_IMAGE_OPTIONS = ('plot_format', 'scale', 'skiprows', 'classes',
+                  'homogeneous', 'packed', 'resample', 'image_precision',
+                  'lazy_images')
+# The raw data tuples of a run process, set once by _init_run_process
+_run_raw_tuples = None
+
 
 def hardy_multi_transform(  # Data and Config Paths
                           raw_datapath, tform_config_path,
                           classifier_config_path,
                           # Optional for Data
                           iterator_mode='arrays', plot_format="RGBrgb",
-                          print_out=True, skiprows=0,
+                          print_out=True, skiprows=0, n_workers=1,
+                          cache=False, stream=False, homogeneous=False,
+                          packed=False, render_batch_size=None,
+                          resample='image', lazy_images=False,
+                          render_workers=1, image_precision=None,
+                          tform_cache_bytes=None, batch_tforms=False,
+                          run_workers=1, tf_threads=None, resume=False,
+                          render_on_demand=False, render_cache_bytes=0,
+                          records_dir=None,
                           # Optional for Classifier
                           num_test_files_class=300, scale=1.0,
                           classifier='tuner', split=0.1, target_size=(80, 80),
                           batch_size=32, classes=['class_1', 'class_2'],
                           project_name='tuner_run', k_fold=False, k=None,
-                          color_mode='rgb', seed=None):
+                          color_mode='rgb', seed=None, image_cache=False):
     """
     OVERALL wrapper function, to pass initial configurations and allow
         all other internal functions to understand and call upon each other.
+        Data options that contradict each other (e.g. stream and packed)
+        raise a ValueError before anything is read.
 
     Parameters
     ----------
@@ -44,12 +69,104 @@ def hardy_multi_transform(  # Data and Config Paths
                              representing the classifier hyperparameters
     iterator_mode : str
                     option to use images from arrays directly or save the
-                    .png and use a directory iterator mode
+                    .png and use a directory iterator mode ('tfdata' uses
+                    the arrays through tf.data pipelines)
     plot_format : str
                   option for standard or RGB color gradient
     print_out : bool
                 option for printing out feedback on conputational time taken to
                 initialize the data and generate the images
+    n_workers : int
+                number of worker processes used to read the raw .csv files.
+                None will use one worker per cpu.
+    cache : bool
+            option to keep the parsed .csv data in a binary cache inside
+            raw_datapath, so that following runs only read new or changed
+            files
+    stream : bool
+             option to stream each file from .csv to image (see data_wrapper)
+             instead of keeping the whole raw data set in memory
+    homogeneous : bool
+                  option to infer the columns and dtypes of the .csv files
+                  from the first one, and parse all of the others with that
+                  fixed schema (files that do not fit are read as usual)
+    packed : bool
+             option to keep the raw data set shared by the transform runs
+             in one compact float32 buffer (to_catalogue.PackedDataTuples)
+             instead of one DataFrame per file
+    render_batch_size : int
+                        number of files to make the RGBrgb images of at once
+                        (see to_catalogue.rgb_batch). None makes them one by
+                        one
+    resample : str
+               'image' resizes the full size RGBrgb images by scale,
+               'profile' resizes the data first and builds the images at the
+               final size (same images to within float rounding, see
+               visualization.rgb_plot, and much faster for long files)
+    lazy_images : bool
+                  option to keep only the 1-D profiles of each RGBrgb image
+                  (to_catalogue.ProfileImages), the dense images being made
+                  batch by batch while training. Uses the 'profile' resample.
+    render_workers : int
+                     number of worker processes making the images of each
+                     transform run, into one shared array (see
+                     to_catalogue.render_parallel). None uses one per cpu.
+    image_precision : str
+                      None keeps the float64 images. 'uint8' makes the
+                      images in float32 and keeps them as the 0-255 uint8
+                      arrays handed to Keras (8 times less memory than
+                      float64); 'float32' keeps float32 images.
+    tform_cache_bytes : int
+                        memory budget (in bytes) of a cache of the
+                        transformed columns shared by the runs
+                        (arbitrage.TformCache): the (transform, source)
+                        pairs found in more than one run of the config are
+                        computed once per file, all before the first run.
+                        If they don't fit in the budget, the cache is not
+                        used. None (or run_workers other than 1) computes
+                        every run from scratch.
+    batch_tforms : bool
+                   option to apply each transform to all of the files (of
+                   the same length) at once (arbitrage.batch_tform_tuples)
+                   instead of file by file. Can't be used with stream or
+                   tform_cache_bytes.
+    render_on_demand : bool
+                       option to keep only the transformed data of each run
+                       (to_catalogue.RenderedImages) and make the images of
+                       each batch while training, with render_workers
+                       worker processes. The image set is never held in
+                       memory; each epoch makes the images again.
+    render_cache_bytes : int
+                         with render_on_demand, memory budget (in bytes) of
+                         the made images kept for the next epochs
+    records_dir : str (optional)
+                  folder of the image records of the runs (see
+                  data_wrapper). The images of each run are written there
+                  once, and read back by any later run with the same
+                  transforms, data and image options. Not with lazy_images
+                  or render_on_demand, which make the images while
+                  training.
+    run_workers : int
+                  number of transform runs done at the same time, each in
+                  its own process (see _transform_run). The reports land in
+                  the same folders as with one run at a time. The transform
+                  cache is not shared between the processes. The processes
+                  are started with 'spawn', which imports the calling
+                  script again: call hardy_multi_transform under an
+                  if __name__ == '__main__': guard.
+    tf_threads : tuple (optional)
+                 (intra_op, inter_op) number of TensorFlow threads of each
+                 run process. Default splits the cpus between the
+                 run_workers processes, so that they don't oversubscribe
+                 the cores.
+    resume : bool
+             option to skip the runs already completed (with the same
+             transforms, data files and options) by an earlier call. Each
+             finished run leaves a completion marker in its report folder
+             (see pre_processing.write_run_marker); a run folder without
+             a valid marker is deleted and the run made again. The held out
+             test files are part of what a run is made with: give a seed,
+             so that the calls hold out the same test files.
     num_test_files_class : int or float
                             numebr of files per class to select for the test
                             set
@@ -79,8 +196,13 @@ def hardy_multi_transform(  # Data and Config Paths
        integer value indicating how many k folds needs to be performed.
     seed: int
           used in hold_out_test_set to isolate the testing data randomly for
-          use in training of neural network. Can be assigned value to repeat
-          the selection.
+          use in training of neural network, and for the order of the k-fold
+          sets. Can be assigned value to repeat the selection.
+    image_cache : bool
+                  option to keep the images of the 'tfdata' sets in memory
+                  after their first epoch (see to_catalogue.learning_set),
+                  e.g. for lazy_images, whose images are otherwise made
+                  again at each epoch
 
     Function Calls:  (see their related documentation)
     ---------------
@@ -112,6 +234,13 @@ def hardy_multi_transform(  # Data and Config Paths
     # ================================================
     # Section 1: Setup and Import Transforms
     # ================================================
+    # Before anything is read, so that a bad call fails at once
+    _check_data_options(
+        iterator_mode=iterator_mode, plot_format=plot_format, stream=stream,
+        packed=packed, lazy_images=lazy_images,
+        render_on_demand=render_on_demand,
+        render_cache_bytes=render_cache_bytes, batch_tforms=batch_tforms,
+        tform_cache=tform_cache_bytes, records_dir=records_dir)
     if tform_config_path is None:
         # ALLOWED so we can test functions without Transfoms
         #    If so, create a list of one Tform_config, which will be "None"
@@ -122,115 +251,459 @@ def hardy_multi_transform(  # Data and Config Paths
         tform_command_list, tform_command_dict = \
             arbitrage.import_tform_config(tform_config_path)
         pass
+    test_set_filenames = preprocessing.hold_out_test_set(
+        raw_datapath, number_of_files_per_class=num_test_files_class,
+        classes=classes, seed=seed)
+
+    # Read the raw files only once: every transform run starts from the
+    # same list of raw data tuples, which are never edited downstream.
+    # (When streaming, each run reads the files again, one at a time.)
+    if stream:
+        raw_tuples_list = None
+    else:
+        raw_tuples_list = to_catalogue._data_tuples_from_fnames(
+            raw_datapath, classes=classes, skiprows=skiprows,
+            n_workers=n_workers, cache=cache, homogeneous=homogeneous,
+            packed=packed)
+
     # ===========================
     # 1b) ANY OTHER SETUP?
     # ===========================
+    # The cache can't be shared by the run processes
+    if (tform_cache_bytes and tform_config_path is not None
+            and run_workers == 1):
+        # Only the columns that more than one run will ask for are kept,
+        # all made first, one file at a time
+        key_runs = arbitrage.plan_tform_keys(tform_command_dict,
+                                             tform_command_list)
+        tform_cache = arbitrage.TformCache(
+            tform_cache_bytes, shared_keys=[key for key, runs in
+                                            key_runs.items() if runs > 1])
+        if stream:
+            raw_source = to_catalogue._data_tuples_from_fnames(
+                raw_datapath, classes=classes, skiprows=skiprows,
+                n_workers=n_workers, cache=cache, stream=True,
+                homogeneous=homogeneous)
+        else:
+            raw_source = raw_tuples_list
+        if not tform_cache.fill(raw_source):
+            print('The shared transformed columns need more than '
+                  'tform_cache_bytes: the transform cache is not used')
+            tform_cache = None
+    else:
+        tform_cache = None
+
+    data_kwargs = {'plot_format': plot_format, 'print_out': print_out,
+                   'scale': scale, 'project_name': project_name,
+                   'classes': classes, 'skiprows': skiprows,
+                   'raw_tuples': raw_tuples_list, 'n_workers': n_workers,
+                   'cache': cache, 'stream': stream,
+                   'homogeneous': homogeneous, 'packed': packed,
+                   'render_batch_size': render_batch_size,
+                   'resample': resample, 'lazy_images': lazy_images,
+                   'render_workers': render_workers,
+                   'image_precision': image_precision,
+                   'tform_cache': tform_cache, 'batch_tforms': batch_tforms,
+                   'render_on_demand': render_on_demand,
+                   'render_cache_bytes': render_cache_bytes,
+                   'records_dir': records_dir}
+    classifier_kwargs = {'classifier': classifier, 'split': split,
+                         'color_mode': color_mode,
+                         'target_size': target_size,
+                         'batch_size': batch_size, 'classes': classes,
+                         'project_name': project_name, 'k_fold': k_fold,
+                         'k': k, 'seed': seed, 'image_cache': image_cache}
+
+    # Hash of each run, for its completion marker
+    manifest = preprocessing.data_manifest(raw_datapath)
+    run_options = {'iterator_mode': iterator_mode,
+                   'classifier_config_path': classifier_config_path,
+                   'test_set_filenames': sorted(test_set_filenames),
+                   **dict((name, data_kwargs[name])
+                          for name in _IMAGE_OPTIONS),
+                   **classifier_kwargs}
+    run_hashes = {tform_name: preprocessing.run_hash(
+        tform_command_dict[tform_name], manifest, **run_options)
+        for tform_name in tform_command_list}
+    if resume:
+        tform_command_list = _runs_to_resume(
+            raw_datapath, project_name, tform_command_list, run_hashes)
+
+    if run_workers is None or run_workers > 1:
+        # One process per run at a time, each with its share of the cpus
+        if run_workers is None:
+            run_workers = min(len(tform_command_list), os.cpu_count())
+        if tf_threads is None:
+            intra_op = max(1, os.cpu_count() // run_workers)
+            tf_threads = (intra_op, min(2, intra_op))
+        # The raw data is sent once to each process, not with each run
+        del data_kwargs['raw_tuples']
+        # 'spawn': TensorFlow does not survive a fork once it is running
+        with ProcessPoolExecutor(
+                max_workers=run_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_run_process,
+                initargs=tuple(tf_threads) + (raw_tuples_list,)) as executor:
+            runs = [executor.submit(
+                _transform_run, raw_datapath, test_set_filenames, tform_name,
+                tform_command_dict[tform_name], classifier_config_path,
+                iterator_mode, data_kwargs, classifier_kwargs,
+                run_hashes[tform_name])
+                for tform_name in tform_command_list]
+            for run in runs:
+                # Raises here any error of the run
+                run.result()
+    else:
+        for tform_name in tform_command_list:
+            _transform_run(raw_datapath, test_set_filenames, tform_name,
+                           tform_command_dict[tform_name],
+                           classifier_config_path, iterator_mode,
+                           data_kwargs, classifier_kwargs,
+                           run_hashes[tform_name])
 
-    test_set_filenames = preprocessing.hold_out_test_set(
-        raw_datapath, number_of_files_per_class=num_test_files_class,
-        classes=classes, seed=seed)
+    return None
 
+
+def _runs_to_resume(raw_datapath, project_name, tform_command_list,
+                    run_hashes):
+    """
+    The runs of tform_command_list still to be made: the ones without a
+    completion marker of the same hash. The folders of those runs (left
+    by a run that did not finish, or made with other transforms, data or
+    options) are deleted first.
+    """
+    runs_to_make = []
     for tform_name in tform_command_list:
+        run_path = os.path.join(raw_datapath, project_name, tform_name)
+        if preprocessing.run_is_complete(run_path, run_hashes[tform_name]):
+            print("Run {} already completed, skipping.".format(tform_name))
+            continue
+        if os.path.exists(run_path):
+            print("Run {} was not completed, starting it again."
+                  .format(tform_name))
+            shutil.rmtree(run_path)
+        runs_to_make.append(tform_name)
+    return runs_to_make
+
+
+def _transform_run(raw_datapath, test_set_filenames, tform_name,
+                   tform_commands, classifier_config_path, iterator_mode,
+                   data_kwargs, classifier_kwargs, run_hash=None):
+    """
+    One transform run of hardy_multi_transform: makes the images of the
+    transform tform_name, then trains and reports on the classifier, into
+    the run_name folder of the project. Kept at module level, so that
+    process pools can run it.
 
-        # ============================================
-        # Section 2: Data Wrapper        (Setup + Run)
-        # ============================================
-        tform_commands = tform_command_dict[tform_name]
+    Parameters
+    ----------
+    tform_commands : list
+                     the transform commands of the run (None for no
+                     transform)
+    data_kwargs : dict
+                  the options passed on to data_wrapper. Without
+                  'raw_tuples', the ones given to the process by
+                  _init_run_process are used.
+    classifier_kwargs : dict
+                        the options passed on to classifier_wrapper
+    run_hash : str (optional)
+               if given, the run is marked as complete with it at the end
+               (see pre_processing.write_run_marker). The marker of an
+               earlier run is removed at the start in any case.
+    """
+    if 'raw_tuples' not in data_kwargs:
+        data_kwargs = dict(data_kwargs, raw_tuples=_run_raw_tuples)
+    # The outputs of an earlier run are about to be overwritten
+    preprocessing.clear_run_marker(os.path.join(
+        raw_datapath, classifier_kwargs['project_name'], tform_name))
+    # ============================================
+    # Section 2: Data Wrapper        (Setup + Run)
+    # ============================================
+    if iterator_mode in _ARRAY_MODES:
+        image_data = data_wrapper(
+            raw_datapath, tform_commands=tform_commands,
+            iterator_mode=iterator_mode, run_name=tform_name, **data_kwargs)
+        image_path = None
+    else:
+        image_data = None
+        image_path = data_wrapper(
+            raw_datapath, tform_commands=tform_commands,
+            iterator_mode=iterator_mode, run_name=tform_name, **data_kwargs)
+
+    # ============================================
+    # Section 3: Classifier Wrapper  (Setup + Run)
+    # ============================================
+
+    # Image PATH is none, but we can pass DATA
+    classifier_wrapper(raw_datapath, test_set_filenames,
+                       tform_name, classifier_config_path,
+                       image_data=image_data,
+                       iterator_mode=iterator_mode,
+                       image_path=image_path, **classifier_kwargs)
+    if isinstance(image_data, to_catalogue.RenderedImages):
+        image_data.close()
+    # NO OUTPUT? - it outputs the report file
+    if run_hash is not None:
+        run_path = preprocessing.save_to_folder(
+            raw_datapath, classifier_kwargs['project_name'], tform_name)
+        preprocessing.write_run_marker(run_path, tform_name, run_hash)
+    return None
 
-        if iterator_mode == 'arrays':
-            image_data = data_wrapper(
-                raw_datapath, tform_commands=tform_commands,
-                plot_format=plot_format, iterator_mode=iterator_mode,
-                print_out=print_out, run_name=tform_name, scale=scale,
-                project_name=project_name, classes=classes, skiprows=skiprows)
-            image_path = None
-        else:
-            image_data = None
-            image_path = data_wrapper(
-                raw_datapath, tform_commands=tform_commands,
-                plot_format=plot_format, iterator_mode=iterator_mode,
-                print_out=print_out, run_name=tform_name, scale=scale,
-                project_name=project_name, classes=classes, skiprows=skiprows)
 
-        # ============================================
-        # Section 3: Classifier Wrapper  (Setup + Run)
-        # ============================================
+def _init_run_process(intra_op_threads, inter_op_threads,
+                      raw_tuples=None):
+    """
+    Sets the TensorFlow thread budget of a run process of
+    hardy_multi_transform, before TensorFlow runs anything, and keeps the
+    raw data tuples that its runs start from.
+    """
+    global _run_raw_tuples
+    _run_raw_tuples = raw_tuples
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
 
-        # Image PATH is none, but we can pass DATA
-        classifier_wrapper(raw_datapath, test_set_filenames,
-                           tform_name, classifier_config_path,
-                           image_data=image_data,
-                           classifier=classifier,
-                           iterator_mode=iterator_mode,
-                           split=split, color_mode=color_mode,
-                           target_size=target_size,
-                           batch_size=batch_size,
-                           image_path=image_path,
-                           classes=classes,
-                           project_name=project_name, k_fold=k_fold, k=k)
-        # NO OUTPUT? - it outputs the report file
 
-    return None
+def _check_data_options(iterator_mode='arrays', plot_format='RGBrgb',
+                        stream=False, packed=False, raw_tuples=None,
+                        lazy_images=False, render_on_demand=False,
+                        render_cache_bytes=0, batch_tforms=False,
+                        tform_cache=None, records_dir=None):
+    """
+    Raises a ValueError for the data options of data_wrapper (or
+    hardy_multi_transform) that contradict each other, where one of them
+    would otherwise be quietly ignored.
+    """
+    conflicts = []
+    if stream and raw_tuples is not None:
+        conflicts.append('stream reads the files itself: no raw_tuples')
+    if stream and packed:
+        conflicts.append('stream and packed')
+    if stream and batch_tforms:
+        conflicts.append('stream and batch_tforms')
+    if batch_tforms and tform_cache:
+        conflicts.append('batch_tforms and the transform cache')
+    if lazy_images and render_on_demand:
+        conflicts.append('lazy_images and render_on_demand')
+    if lazy_images and plot_format != 'RGBrgb':
+        conflicts.append('lazy_images needs the RGBrgb plot_format')
+    if render_cache_bytes and not render_on_demand:
+        conflicts.append('render_cache_bytes without render_on_demand')
+    if records_dir is not None:
+        if lazy_images or render_on_demand:
+            conflicts.append('records_dir and lazy_images or '
+                             'render_on_demand')
+        if iterator_mode not in _ARRAY_MODES:
+            conflicts.append('records_dir needs the iterator_mode '
+                             '{}'.format(' or '.join(_ARRAY_MODES)))
+    if conflicts:
+        raise ValueError('contradictory data options: {}'.format(
+            '; '.join(conflicts)))
 
 
 def data_wrapper(raw_datapath, tform_commands=None, classes=None,
                  plot_format="RGBrgb", iterator_mode='arrays',
                  print_out=True, project_name=None, run_name=None,
-                 skiprows=0, scale=1.0):
+                 skiprows=0, scale=1.0, raw_tuples=None, n_workers=1,
+                 cache=False, stream=False, homogeneous=False,
+                 packed=False, render_batch_size=None, resample='image',
+                 lazy_images=False, render_workers=1,
+                 image_precision=None, tform_cache=None,
+                 batch_tforms=False, render_on_demand=False,
+                 render_cache_bytes=0, records_dir=None):
     """
     Overall "One-Click" Wrapper to create the three "Keras Ready" Datasets
         needed to train the model: "Training Set", "Validation Set" and
         "Test Set", all in the same format which is created via the
         Keras.Preprocessing.Data.Flow (<--- Not exact package/function)
 
+    raw_tuples : list of tuples (optional)
+                 The raw data tuples (filename, DataFrame, label) already
+                 loaded from raw_datapath. If given, the csv files are not
+                 read again, so one load can be shared by every transform
+                 run of hardy_multi_transform.
+    stream : bool
+             option to pass each file through the read, transform and image
+             steps one at a time, writing its image straight into one
+             preallocated array, instead of building the full list of each
+             step. Same output, with a much lower peak memory.
+    homogeneous : bool
+                  option to read the .csv files with the schema of the first
+                  one (see to_catalogue._data_tuples_from_fnames)
+    packed : bool
+             option to read the raw data into a to_catalogue.PackedDataTuples
+             (float32), when raw_tuples is not given. Give it with the
+             raw_tuples that are packed: the float32 data can change the
+             images, so it is part of the key of the records.
+    render_batch_size : int
+                        number of files to make the RGBrgb images of at once
+    resample : str
+               'image' or 'profile', how the RGBrgb images reach their scaled
+               size (see visualization.rgb_plot)
+    lazy_images : bool
+                  option to return a to_catalogue.ProfileImages (only the
+                  profiles of each RGBrgb image) instead of the list of
+                  dense image tuples
+    render_workers : int
+                     number of worker processes making the images (not used
+                     with stream or lazy_images)
+    image_precision : str
+                      None (float64 images), 'float32' or 'uint8' (see
+                      visualization.image_as_precision)
+    tform_cache : arbitrage.TformCache
+                  memo of the transformed columns, shared by the transform
+                  runs (see arbitrage.apply_tform)
+    batch_tforms : bool
+                   option to transform the files in batches of the same
+                   length (see arbitrage.batch_tform_tuples)
+    render_on_demand : bool
+                       option to return a to_catalogue.RenderedImages (the
+                       transformed data tuples, the images of each batch
+                       being made when it is asked for, by render_workers
+                       worker processes) instead of the image tuples
+    render_cache_bytes : int
+                         memory budget of the RenderedImages cache of
+                         made images
+    records_dir : str (optional)
+                  folder of the image records (see records), in a
+                  sub-folder per run_name. The images are streamed into
+                  records and returned as a records.ImageRecords. When the
+                  records of the run already hold the images of the same
+                  transforms, data and image options, they are returned
+                  without reading or rendering anything. Not with
+                  lazy_images or render_on_demand.
     """
+    _check_data_options(
+        iterator_mode=iterator_mode, plot_format=plot_format, stream=stream,
+        packed=packed, raw_tuples=raw_tuples, lazy_images=lazy_images,
+        render_on_demand=render_on_demand,
+        render_cache_bytes=render_cache_bytes, batch_tforms=batch_tforms,
+        tform_cache=tform_cache, records_dir=records_dir)
     if print_out:
         clock = time.perf_counter()
         print("Processing Data...\t", end="")
-    # Make the raw Dataframe Tuples List
-    raw_tuples_list = to_catalogue._data_tuples_from_fnames(
-        raw_datapath, classes=classes, skiprows=skiprows)
+    use_records = records_dir is not None
+    if use_records:
+        records_path = os.path.join(records_dir, str(run_name))
+        records_key = preprocessing.run_hash(
+            tform_commands, preprocessing.data_manifest(raw_datapath),
+            plot_format=plot_format, scale=scale, skiprows=skiprows,
+            classes=classes, resample=resample, packed=packed)
+        image_records = records.open_image_records(records_path,
+                                                   key=records_key)
+        if image_records is not None:
+            if project_name and run_name:
+                _write_run_tform(raw_datapath, project_name, run_name,
+                                 image_records.metadata['run_tform'])
+            if print_out:
+                print_time(time.perf_counter()-clock)
+            return image_records
+    # Make the raw Dataframe Tuples List (unless it was already loaded)
+    if raw_tuples is None:
+        raw_tuples_list = to_catalogue._data_tuples_from_fnames(
+            raw_datapath, classes=classes, skiprows=skiprows,
+            n_workers=n_workers, cache=cache, stream=stream,
+            homogeneous=homogeneous, packed=packed)
+        n_files = len([entry for entry in os.listdir(raw_datapath)
+                       if entry.endswith('.csv')])
+    else:
+        raw_tuples_list = raw_tuples
+        n_files = len(raw_tuples)
     # Now perform trasnsform if given
     if tform_commands is None:
         tform_tuples_list = raw_tuples_list
+    elif stream:
+        tform_tuples_list = arbitrage.iter_tform_tuples(
+            raw_tuples_list, tform_commands, rgb_format=plot_format,
+            cache=tform_cache)
+    elif batch_tforms:
+        tform_tuples_list = arbitrage.batch_tform_tuples(
+            raw_tuples_list, tform_commands, rgb_format=plot_format)
     else:
         tform_tuples_list = arbitrage.tform_tuples(raw_tuples_list,
                                                    tform_commands,
-                                                   rgb_format=plot_format)
+                                                   rgb_format=plot_format,
+                                                   cache=tform_cache)
+    if stream:
+        # Take out the first tuple for the report, then put it back
+        tform_tuples_list = iter(tform_tuples_list)
+        first_tuple = next(tform_tuples_list)
+        tform_tuples_list = itertools.chain([first_tuple], tform_tuples_list)
+    else:
+        first_tuple = tform_tuples_list[0]
 
     # save the tranformation info in a yaml file for final report
+    run_tform = None
     if project_name and run_name:
         output = [[i, name.split('__')[0], name.split('__')[-1]] for
-                  i, name in enumerate(list(tform_tuples_list[0][1]))
+                  i, name in enumerate(list(first_tuple[1]))
                   if isinstance(name, str)]
     # save the tranform info in a dictionary
         run_tform = {'run_name': run_name}
         for i in range(len(output)):
             run_tform['tform_' + str(i)] = output[i]
-        # generate a yaml file to store the trasnformation info
-        output_path = preprocessing.save_to_folder(raw_datapath, project_name,
-                                                   run_name)
-        report_location = output_path+'/report/'
-        if not os.path.exists(report_location):
-            os.makedirs(report_location)
-        with open(report_location+'run_tform_config.yaml',
-                  'w') as yaml_file:
-            yaml.dump(run_tform, yaml_file)
-            yaml_file.close()
+        _write_run_tform(raw_datapath, project_name, run_name, run_tform)
     else:
         pass
     # Next make the rgb images Tuples List
-    if plot_format == 'RGBrgb':
+    if use_records and plot_format == 'RGBrgb':
+        tuples_list = records.write_image_records(
+            to_catalogue.iter_rgb_tuples(tform_tuples_list, scale=scale,
+                                         plot_format=plot_format,
+                                         batch_size=render_batch_size,
+                                         resample=resample,
+                                         precision='uint8'),
+            records_path, key=records_key, metadata={'run_tform': run_tform})
+    elif use_records:
+        tuples_list = records.write_image_records(
+            to_catalogue.iter_regular_plot_tuples(tform_tuples_list,
+                                                  scale=scale,
+                                                  precision='uint8'),
+            records_path, key=records_key, metadata={'run_tform': run_tform})
+    elif render_on_demand and plot_format == 'RGBrgb':
+        tuples_list = to_catalogue.RenderedImages(
+            tform_tuples_list, plot='rgb', n_workers=render_workers,
+            cache_bytes=render_cache_bytes, scale=scale,
+            plot_format=plot_format, batch_size=render_batch_size,
+            resample=resample, precision=image_precision)
+    elif render_on_demand:
+        tuples_list = to_catalogue.RenderedImages(
+            tform_tuples_list, plot='regular', n_workers=render_workers,
+            cache_bytes=render_cache_bytes, scale=scale,
+            precision=image_precision)
+    elif lazy_images and plot_format == 'RGBrgb':
+        tuples_list = to_catalogue.rgb_profiles(tform_tuples_list,
+                                                scale=scale,
+                                                plot_format=plot_format)
+    elif stream and plot_format == 'RGBrgb':
+        tuples_list = to_catalogue.image_tuples_to_tensor(
+            to_catalogue.iter_rgb_tuples(tform_tuples_list, scale=scale,
+                                         plot_format=plot_format,
+                                         batch_size=render_batch_size,
+                                         resample=resample,
+                                         precision=image_precision),
+            n_files)
+    elif stream:
+        tuples_list = to_catalogue.image_tuples_to_tensor(
+            to_catalogue.iter_regular_plot_tuples(tform_tuples_list,
+                                                  scale=scale,
+                                                  precision=image_precision),
+            n_files)
+    elif plot_format == 'RGBrgb':
         tuples_list = to_catalogue.rgb_list(tform_tuples_list, scale=scale,
-                                            plot_format=plot_format)
+                                            plot_format=plot_format,
+                                            batch_size=render_batch_size,
+                                            resample=resample,
+                                            n_workers=render_workers,
+                                            precision=image_precision)
     else:
         tuples_list = to_catalogue.regular_plot_list(
-            tform_tuples_list, scale=scale)
+            tform_tuples_list, scale=scale, n_workers=render_workers,
+            precision=image_precision)
 
     # OK! Now we have image arrays finished!
     #     EITHER Return that list of image tuples
     #     OR save images and Return the path to those folders!
-    if iterator_mode == 'arrays':
+    if iterator_mode in _ARRAY_MODES:
         if print_out:
             print_time(time.perf_counter()-clock)
         return tuples_list
@@ -241,6 +714,20 @@ def data_wrapper(raw_datapath, tform_commands=None, classes=None,
         return os.path.join(raw_datapath, "images")
 
 
+def _write_run_tform(raw_datapath, project_name, run_name, run_tform):
+    """
+    Writes the transform info run_tform of a run to the
+    run_tform_config.yaml file of its report folder.
+    """
+    output_path = preprocessing.save_to_folder(raw_datapath, project_name,
+                                               run_name)
+    report_location = output_path+'/report/'
+    if not os.path.exists(report_location):
+        os.makedirs(report_location)
+    with open(report_location+'run_tform_config.yaml', 'w') as yaml_file:
+        yaml.dump(run_tform, yaml_file)
+
+
 def classifier_wrapper(input_path, test_set_filenames, run_name, config_path,
                        image_data=None, classifier='tuner',
                        iterator_mode='arrays', split=0.1,
@@ -248,7 +735,8 @@ def classifier_wrapper(input_path, test_set_filenames, run_name, config_path,
                        batch_size=32, image_path=None,
                        classes=['class_1', 'class_2'],
                        project_name='tuner_run',
-                       k_fold=False, k=None, **kwarg):
+                       k_fold=False, k=None, seed=None, image_cache=False,
+                       **kwarg):
     '''
     Single "Universal" Wrapping function to setup and run the CNN and Tuner
     on any properly labeled image set.
@@ -271,7 +759,8 @@ def classifier_wrapper(input_path, test_set_filenames, run_name, config_path,
                name use to create a folder for storing the results of this run
     iterator_mode : str
                     option to use images from arrays directly or save the
-                    .png and use a directory iterator mode
+                    .png and use a directory iterator mode ('tfdata' uses
+                    the arrays through tf.data pipelines)
     plot_format : str
                   option for standard or RGB color gradient
     print_out : bool
@@ -297,34 +786,47 @@ def classifier_wrapper(input_path, test_set_filenames, run_name, config_path,
     project_name : str
                    name of the folder to be created for storing the results of
                    the tuning
+    seed : int (optional)
+           seed of the order of the files cut into the k folds (and of the
+           shuffling of the learning sets), to repeat a k-fold
+    image_cache : bool
+                  option to keep the images of the 'tfdata' sets in memory
+                  after their first epoch (see to_catalogue.learning_set)
     '''
-    if iterator_mode == 'arrays':
+    if iterator_mode in _ARRAY_MODES:
 
         assert image_data, 'No image_data list provided'
 
         test_set_list, learning_set_list = to_catalogue.data_set_split(
             image_data, test_set_filenames)
+        # One class numbering for the learning, test and k-fold sets
+        label_codec = to_catalogue.image_label_codec(image_data)
 
         if k_fold:
             test_set = to_catalogue.test_set(image_list=test_set_list,
                                              target_size=target_size,
                                              classes=classes,
                                              color_mode=color_mode,
-                                             iterator_mode='arrays',
-                                             batch_size=batch_size)
+                                             iterator_mode=iterator_mode,
+                                             batch_size=batch_size,
+                                             label_codec=label_codec,
+                                             seed=seed, cache=image_cache)
         else:
             training_set, validation_set = to_catalogue.learning_set(
                 image_list=learning_set_list, split=split,
                 classes=classes, target_size=target_size,
-                iterator_mode='arrays', batch_size=batch_size,
-                color_mode=color_mode)
+                iterator_mode=iterator_mode, batch_size=batch_size,
+                color_mode=color_mode, label_codec=label_codec,
+                seed=seed, cache=image_cache)
 
             test_set = to_catalogue.test_set(image_list=test_set_list,
                                              target_size=target_size,
                                              classes=classes,
                                              color_mode=color_mode,
-                                             iterator_mode='arrays',
-                                             batch_size=batch_size)
+                                             iterator_mode=iterator_mode,
+                                             batch_size=batch_size,
+                                             label_codec=label_codec,
+                                             seed=seed, cache=image_cache)
     else:
 
         assert image_path, 'no path to the image folders was provided'
@@ -373,7 +875,8 @@ def classifier_wrapper(input_path, test_set_filenames, run_name, config_path,
                                  color_mode=color_mode,
                                  iterator_mode=iterator_mode,
                                  image_list=learning_set_list,
-                                 test_set=test_set)
+                                 test_set=test_set, label_codec=label_codec,
+                                 seed=seed, cache=image_cache)
             output_path = preprocessing.save_to_folder(input_path,
                                                        project_name,
                                                        run_name)
@@ -396,9 +899,10 @@ def classifier_wrapper(input_path, test_set_filenames, run_name, config_path,
                                     tuner=None, save_model=True,
                                     config_path=config_path)
 
-    if iterator_mode == 'arrays':
-        performance_evaluation = reporting.model_analysis(model, test_set,
-                                                          test_set_list)
+    if iterator_mode in _ARRAY_MODES:
+        performance_evaluation = reporting.model_analysis(
+            model, test_set, test_set_list, label_codec=label_codec)
+        label_codec.save(output_path+'report/')
         performance_evaluation.to_csv(
             output_path+'report/model_evaluation.csv')
     else:
@@ -454,7 +958,8 @@ def checkrun(raw_datapath, tform_config_path,
                              representing the classifier hyperparameters
     iterator_mode : str
                     option to use images from arrays directly or save the
-                    .png and use a directory iterator mode
+                    .png and use a directory iterator mode ('tfdata' uses
+                    the arrays through tf.data pipelines)
     plot_format : str
                   option for standard or RGB color gradient
     print_out : bool
@@ -611,7 +1116,8 @@ def checkpoint_datacreation(  # Data and Config Paths
                              representing the classifier hyperparameters
     iterator_mode : str
                     option to use images from arrays directly or save the
-                    .png and use a directory iterator mode
+                    .png and use a directory iterator mode ('tfdata' uses
+                    the arrays through tf.data pipelines)
     plot_format : str
                   option for standard or RGB color gradient
     print_out : bool
@@ -684,6 +1190,11 @@ def checkpoint_datacreation(  # Data and Config Paths
         raw_datapath, number_of_files_per_class=num_test_files_class,
         classes=classes, seed=seed)
 
+    # Read the raw files only once: every transform run starts from the
+    # same list of raw data tuples, which are never edited downstream.
+    raw_tuples_list = to_catalogue._data_tuples_from_fnames(
+        raw_datapath, classes=classes, skiprows=skiprows)
+
     for tform_name in tform_command_list:
 
         # ============================================
@@ -691,12 +1202,13 @@ def checkpoint_datacreation(  # Data and Config Paths
         # ============================================
         tform_commands = tform_command_dict[tform_name]
 
-        if iterator_mode == 'arrays':
+        if iterator_mode in _ARRAY_MODES:
             image_data = data_wrapper(
                 raw_datapath, tform_commands=tform_commands,
                 plot_format=plot_format, iterator_mode=iterator_mode,
                 print_out=print_out, run_name=tform_name, scale=scale,
-                project_name=project_name, classes=classes, skiprows=skiprows)
+                project_name=project_name, classes=classes, skiprows=skiprows,
+                raw_tuples=raw_tuples_list)
             image_path = None
         else:
             image_data = None
@@ -704,6 +1216,7 @@ def checkpoint_datacreation(  # Data and Config Paths
                 raw_datapath, tform_commands=tform_commands,
                 plot_format=plot_format, iterator_mode=iterator_mode,
                 print_out=print_out, run_name=tform_name, scale=scale,
-                project_name=project_name, classes=classes, skiprows=skiprows)
+                project_name=project_name, classes=classes, skiprows=skiprows,
+                raw_tuples=raw_tuples_list)
 
     return test_set_filenames, image_data, image_path
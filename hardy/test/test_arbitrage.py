@@ -1,9 +1,12 @@
 import os
 import unittest
+from unittest import mock
 
+import numpy as np
 import pandas as pd
 
 from hardy.arbitrage import arbitrage
+from hardy.arbitrage import transformations
 from hardy.handling import handling
 
 data_path = './hardy/test/test_data/'
@@ -69,3 +72,139 @@ class TestSimulationTools(unittest.TestCase):
             arbitrage.tform_tuples(sample_tuples, tform_example)
         except AssertionError:
             pass
+
+    def test_apply_tform_columns(self):
+        """
+        Testing that each transform lands in its Index column, named after
+            its source, and that list sources ([x, y]) are applied too.
+        """
+        commands = [[0, 'raw', 0], [2, 'cumsum', 1],
+                    [4, 'derivative_2d', [1, 2]]]
+        tform_df = arbitrage.apply_tform(raw_df, commands)
+        old_names = list(raw_df.columns)
+        expected_names = [
+            old_names[0] + '__tform__raw', 1,
+            old_names[1] + '__tform__cumsum', 3,
+            old_names[1] + '*' + old_names[2] + '__tform__derivative_2d', 5]
+        assert list(tform_df.columns) == expected_names, \
+            'the columns are not named after their transform'
+        np.testing.assert_array_equal(tform_df.iloc[:, 0], raw_df.iloc[:, 0])
+        np.testing.assert_array_equal(tform_df.iloc[:, 2],
+                                      np.cumsum(raw_df.iloc[:, 1]))
+        np.testing.assert_array_equal(
+            tform_df.iloc[:, 4],
+            transformations.derivative_2d(raw_df.iloc[:, 1],
+                                          raw_df.iloc[:, 2]))
+        assert not tform_df.iloc[:, [1, 3, 5]].any().any(), \
+            'the columns with no transform should be zeros'
+
+    def test_tform_cache(self):
+        """
+        Testing the transform cache: the runs give the same frames with it,
+            the shared columns are only made once per file, and the budget
+            is kept by dropping the least recently used columns.
+        """
+        tform_dict = {'run_1': [[0, 'raw', 0], [5, 'cumsum', 1]],
+                      'run_2': [[0, 'raw', 0], [4, 'raw', 2]],
+                      'run_3': None}
+        key_runs = arbitrage.plan_tform_keys(tform_dict)
+        expected_runs = {('raw', 0): 2, ('cumsum', 1): 1, ('raw', 2): 1}
+        assert key_runs == expected_runs, \
+            'the plan did not count the runs of each key'
+        cache = arbitrage.TformCache(
+            shared_keys=[key for key, runs in key_runs.items() if runs > 1])
+        for run in ['run_1', 'run_2']:
+            cached = arbitrage.tform_tuples(sample_tuples, tform_dict[run],
+                                            cache=cache)
+            for row, cached_row in zip(
+                    arbitrage.tform_tuples(sample_tuples, tform_dict[run]),
+                    cached):
+                pd.testing.assert_frame_equal(row[1], cached_row[1])
+        n_files = len(sample_tuples)
+        assert len(cache) == n_files, 'only the shared column should be kept'
+        assert cache.hits == n_files, 'the second run should use the cache'
+        assert cache.misses == n_files, \
+            'only the shared columns should count as misses'
+
+        # Made first, one file at a time, the shared columns are all there
+        #   for every run
+        filled = arbitrage.TformCache(shared_keys=[('raw', 0)])
+        assert filled.fill(sample_tuples), 'the columns should fit'
+        for run in ['run_1', 'run_2']:
+            arbitrage.tform_tuples(sample_tuples, tform_dict[run],
+                                   cache=filled)
+        assert filled.hits == 2*n_files and filled.misses == n_files, \
+            'each shared column should be made once per file'
+        # and not kept at all if they don't fit
+        too_small = arbitrage.TformCache(max_bytes=len(raw_df)*8,
+                                         shared_keys=[('raw', 0)])
+        assert not too_small.fill(sample_tuples), \
+            'the columns of all of the files should not fit'
+        assert len(too_small) == 0, 'the cache should be left empty'
+
+        column_bytes = len(raw_df)*8
+        small_cache = arbitrage.TformCache(max_bytes=2*column_bytes)
+        for command in [[0, 'raw', 0], [0, 'raw', 1], [0, 'raw', 0],
+                        [0, 'raw', 2]]:
+            arbitrage.apply_tform(raw_df, [command], cache=small_cache,
+                                  key='file')
+        assert small_cache.nbytes <= 2*column_bytes, 'the budget was passed'
+        with self.assertRaises(ValueError):
+            # Without the file key, the files would share their columns
+            arbitrage.apply_tform(raw_df, [[0, 'raw', 0]], cache=small_cache)
+        assert ('file', 'raw', 0) in small_cache and \
+            ('file', 'raw', 1) not in small_cache, \
+            'the least recently used column should go first'
+
+    def test_tform_tuples_read_only(self):
+        """
+        Testing that the transforms only get read-only views of the raw
+            data, and that the raw dataframes are left as they were.
+        """
+        raw_copies = [the_tuple[1].copy() for the_tuple in sample_tuples]
+        arbitrage.tform_tuples(sample_tuples, [[0, 'cumsum', 0],
+                                               [3, 'raw', 1]])
+        for the_tuple, raw_copy in zip(sample_tuples, raw_copies):
+            pd.testing.assert_frame_equal(the_tuple[1], raw_copy)
+        column = arbitrage._read_only_column(raw_df, 1)
+        np.testing.assert_array_equal(column, raw_df.iloc[:, 1])
+        with self.assertRaises(ValueError):
+            column[0] = 0
+        # A transform that edits its input in place can't reach the raw data
+        raw_copy = raw_df.copy()
+
+        def in_place(x):
+            x[0] = 0
+            return x
+        with mock.patch.object(transformations, 'in_place', in_place,
+                               create=True):
+            with self.assertRaises(ValueError):
+                arbitrage.apply_tform(raw_df, [[0, 'in_place', 1]])
+        pd.testing.assert_frame_equal(raw_df, raw_copy)
+
+    def test_batch_tform_tuples(self):
+        """
+        Testing the batch transforms against the file by file ones, with
+            files of two different lengths.
+        """
+        # Only the numeric columns can be stacked (the complex impedance
+        #   column is read as text)
+        ragged_tuples = [(the_tuple[0], the_tuple[1].select_dtypes('number'),
+                          the_tuple[2]) for the_tuple in sample_tuples]
+        ragged_tuples[1] = (ragged_tuples[1][0], ragged_tuples[1][1][:-5],
+                            ragged_tuples[1][2])
+        commands = [[0, 'raw', 0], [1, 'nlog', 1], [2, 'cumsum', 2],
+                    [3, 'derivative_1d', 5], [4, 'derivative_2d', [1, 2]],
+                    [5, 'power', [2, 5, 2, 1]]]
+        for tuples in [ragged_tuples, sample_tuples]:
+            batch_tuples = arbitrage.batch_tform_tuples(tuples, commands)
+            tform_tuples = arbitrage.tform_tuples(tuples, commands)
+            assert len(batch_tuples) == len(tform_tuples), \
+                'the batch gave a different number of files'
+            for row, batch_row in zip(tform_tuples, batch_tuples):
+                assert row[0] == batch_row[0] and row[2] == batch_row[2], \
+                    'the batch changed the file order'
+                pd.testing.assert_frame_equal(row[1], batch_row[1],
+                                              check_exact=True)
+        assert len(batch_tuples[1][1]) == len(raw_df), \
+            'the files should keep their length'
@@ -78,6 +78,29 @@ class TestSimulationTools(unittest.TestCase):
 
         pass
 
+    def test_schema_read_csv(self):
+        """
+        Testing the fixed-schema reader of homogeneous csv files against
+            the smart reader, and its refusal of files that do not fit.
+        """
+        csv_list = [entry for entry in file_list if entry.endswith('.csv')]
+        file = os.path.join(data_path, csv_list[0])
+        schema = handling._infer_csv_schema(file, skiprows=0)
+        assert 'Unnamed: 0' not in schema['usecols'], \
+            "The index column should not be in the schema"
+        assert 'complex_Z [ohm]' not in schema['usecols'], \
+            "The string column should not be in the schema"
+        for entry in csv_list:
+            file = os.path.join(data_path, entry)
+            fast = handling._schema_read_csv(file, schema)
+            slow, rows = handling._smart_read_csv(full_fname=file,
+                                                  skiprows=0)
+            pd.testing.assert_frame_equal(fast, slow[schema['usecols']])
+        other_schema = dict(schema, header=schema['header'] + ',extra')
+        assert handling._schema_read_csv(file, other_schema) is None, \
+            "A file with a different header passed the schema"
+        pass
+
     def test_test_df(self):
         """
         Testing Function for ensuring that read dataframes are at least a
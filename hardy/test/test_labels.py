@@ -0,0 +1,42 @@
+import keras
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from hardy.handling import labels
+
+
+class TestSimulationTools(unittest.TestCase):
+
+    def test_label_codec(self):
+        file_labels = ['one', 'noise', 'one', 'one', 'noise']
+        codec = labels.LabelCodec.from_labels(file_labels)
+        assert codec.label_names == ['noise', 'one'], \
+            'the classes should be numbered in sorted order'
+        codes = codec.encode(file_labels)
+        assert codes.dtype == np.int32, 'the class indices should be int32'
+        assert list(codes) == [1, 0, 1, 1, 0], 'the labels are wrongly encoded'
+        assert np.array_equal(codec.one_hot(file_labels),
+                              keras.utils.to_categorical(codes)), \
+            'the one-hot labels should match keras.utils.to_categorical'
+        assert codec.decode(codes) == file_labels, \
+            'decoding should give back the labels'
+        # A set with only some of the classes keeps the same numbering
+        assert list(codec.encode(['one', 'one'])) == [1, 1], \
+            'the index of a class should not depend on the set'
+        assert codec.one_hot(['one']).shape == (1, 2), \
+            'the one-hot labels should have a column per class'
+        with self.assertRaises(ValueError):
+            codec.encode(['other'])
+
+    def test_label_codec_save_load(self):
+        codec = labels.LabelCodec(['one', 'noise', 'not_noise'])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = codec.save(tmp_dir)
+            assert os.path.basename(path) == labels.LABEL_CODEC_FILE, \
+                'the codec should be saved under its file name in a folder'
+            loaded = labels.LabelCodec.load(tmp_dir)
+        assert loaded.class_indices == codec.class_indices, \
+            'the loaded codec should have the same class indices'
@@ -1,5 +1,6 @@
 import os
 import shutil
+import tempfile
 import unittest
 
 import numpy as np
@@ -26,6 +27,29 @@ class TestSimulationTools(unittest.TestCase):
             'the files selected to compose the test set should be unique'
         pass
 
+    def test_hold_out_test_set_sampling(self):
+        classes = ['noise', '']
+        # A fraction of the 10 files of each class
+        test_set_filenames = preprocessing.hold_out_test_set(
+            data_path, number_of_files_per_class=0.3, seed=4,
+            classes=classes)
+        assert classes == ['noise', ''], \
+            'the list of classes should not be changed'
+        assert len(test_set_filenames) == 6, \
+            'a fraction of the files of each class should be selected'
+        assert len([name for name in test_set_filenames
+                    if name.endswith('noise')]) == 3, \
+            'the same fraction should be selected from each class'
+        assert len(np.unique(test_set_filenames)) == 6, \
+            'the files selected to compose the test set should be unique'
+        assert test_set_filenames == preprocessing.hold_out_test_set(
+            data_path, number_of_files_per_class=0.3, seed=4,
+            classes=classes), 'the same seed should select the same files'
+        with self.assertRaises(ValueError):
+            preprocessing.hold_out_test_set(
+                data_path, number_of_files_per_class=11, classes=classes)
+        pass
+
     def test_set_folder(self):
         num_files = 5
         # Frm .csv files
@@ -60,3 +84,41 @@ class TestSimulationTools(unittest.TestCase):
         assert os.path.exists(folder_path), \
             'the fodler was not correctly created'
         pass
+
+    def test_run_marker(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_dir = os.path.join(tmp_dir, 'data')
+            os.makedirs(data_dir)
+            for name in ['a_noise.csv', 'b_one.csv']:
+                with open(os.path.join(data_dir, name), 'w') as file:
+                    file.write('x,y\n1,2\n')
+            manifest = preprocessing.data_manifest(data_dir)
+            assert [entry[0] for entry in manifest] == ['a_noise.csv',
+                                                        'b_one.csv'], \
+                'the manifest should list the csv files in order'
+            commands = [[0, 'raw', 0], [5, 'raw', 1]]
+            run_hash = preprocessing.run_hash(commands, manifest, scale=0.5)
+            assert run_hash == preprocessing.run_hash(commands, manifest,
+                                                      scale=0.5), \
+                'the hash should not change for the same run'
+            assert run_hash != preprocessing.run_hash(commands, manifest,
+                                                      scale=1.0), \
+                'the hash should change with the options'
+
+            run_path = os.path.join(tmp_dir, 'project', 'test_1')
+            assert not preprocessing.run_is_complete(run_path, run_hash), \
+                'a run with no folder is not complete'
+            preprocessing.write_run_marker(run_path, 'test_1', run_hash)
+            assert os.listdir(os.path.join(run_path, 'report')) == \
+                [preprocessing.RUN_MARKER], 'only the marker should be left'
+            assert preprocessing.run_is_complete(run_path, run_hash), \
+                'the marked run should be complete'
+
+            # A new data file invalidates the run
+            with open(os.path.join(data_dir, 'c_one.csv'), 'w') as file:
+                file.write('x,y\n1,2\n')
+            new_hash = preprocessing.run_hash(
+                commands, preprocessing.data_manifest(data_dir), scale=0.5)
+            assert not preprocessing.run_is_complete(run_path, new_hash), \
+                'the run should not be complete for new data'
+        pass
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from hardy.handling import records
+from hardy.handling import sequences
+
+
+class TestSimulationTools(unittest.TestCase):
+
+    def test_image_records(self):
+        rng = np.random.default_rng(0)
+        images = rng.integers(0, 256, size=(7, 4, 4, 3), dtype=np.uint8)
+        image_tuples = [('file_{}'.format(i), images[i],
+                         'one' if i % 2 else 'noise') for i in range(7)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'run')
+            image_records = records.write_image_records(
+                iter(image_tuples), path, shard_size=3, key='abc',
+                metadata={'run_tform': {'run_name': 'run'}})
+            assert len([name for name in os.listdir(path)
+                        if name.endswith('.u8')]) == 3, \
+                'the 7 images should be written in 3 shards of 3'
+            assert len(image_records) == 7, 'the records miss some images'
+            assert image_records.labels == [n[2] for n in image_tuples], \
+                'the labels should be kept in order'
+            assert np.array_equal(image_records.images([6, 0, 4]),
+                                  images[[6, 0, 4]]), \
+                'the images read across shards are different'
+            serial, image, label = image_records[-1]
+            assert serial == 'file_6' and label == 'noise', \
+                'the tuples of the records should match the written ones'
+            assert np.array_equal(image, images[6]), \
+                'the image of the tuple is different'
+
+            subset = image_records.subset([5, 1])
+            assert subset.serials == ['file_5', 'file_1'], \
+                'the subset should keep the order of its indices'
+            assert np.array_equal(subset.images([1, 0]), images[[1, 5]]), \
+                'the images of the subset are different'
+            batch = sequences.ImageSequence(subset, np.eye(2)[[1, 1]],
+                                            batch_size=2)[0][0]
+            assert np.array_equal(batch, images[[5, 1]]), \
+                'the records should make the batches of an ImageSequence'
+
+            reopened = records.open_image_records(path, key='abc')
+            assert reopened.metadata == {'run_tform': {'run_name': 'run'}}, \
+                'the metadata should be kept with the records'
+            assert records.open_image_records(path, key='other') is None, \
+                'records of another key should not be opened'
+            assert records.open_image_records(tmp_dir) is None, \
+                'a folder with no index holds no records'
+        pass
@@ -80,3 +80,34 @@ class TestSimulationTools(unittest.TestCase):
         result = reporting.model_analysis(model, testing_set, test_set_list)
 
         assert isinstance(result, pd.DataFrame)
+
+        # The tf.data sets plug into the same model and reports
+        train, val = catalogue.learning_set(image_list=learning_set_list,
+                                            split=split,
+                                            classes=['noise', 'one'],
+                                            iterator_mode='tfdata', seed=0)
+        testing_set = catalogue.test_set(image_list=test_set_list,
+                                         classes=['noise', 'one'],
+                                         iterator_mode='tfdata')
+        model, history = cnn.build_model(train, val,
+                                         config_path='./hardy/test/')
+        conf_matrix, report = cnn.report_on_metrics(model, testing_set)
+        assert conf_matrix.sum() == len(test_set_list), \
+            'every test file should be in the confusion matrix'
+        result = reporting.model_analysis(model, testing_set, test_set_list)
+        assert list(result['Actual_Labels']) == [
+            row[2] for row in test_set_list], 'the test files are out of order'
+
+        # The lazy image lists are not made again for the report
+        rendered_test = catalogue.RenderedImages(
+            [row for row in data_tups if row[0] in test_set_filenames])
+        testing_set = catalogue.test_set(image_list=rendered_test,
+                                         classes=['noise', 'one'],
+                                         iterator_mode='arrays')
+        model.predict(testing_set)
+        predict_misses = rendered_test.misses
+        result = reporting.model_analysis(model, testing_set, rendered_test)
+        assert list(result['Filenames']) == rendered_test.serials, \
+            'the test files are out of order'
+        assert rendered_test.misses == 2*predict_misses, \
+            'only the predictions should make the images'
@@ -1,10 +1,17 @@
 import os
 import shutil
+import tempfile
 import yaml
 
 import unittest
+from unittest import mock
+
+import numpy as np
+
 from hardy import run_hardy as run
 from hardy.handling import pre_processing as preprocessing
+from hardy.handling import records
+from hardy.handling import to_catalogue as catalogue
 # import pickle
 # import numpy as np
 
@@ -25,7 +32,8 @@ class TestSimulationTools(unittest.TestCase):
             data_path, tform_config_path, config_path,
             iterator_mode='arrays', classifier='tuner',
             num_test_files_class=1, classes=['noise', 'one'], split=0.5,
-            batch_size=1, project_name='test_wrapper')
+            batch_size=1, project_name='test_wrapper', seed=3,
+            tform_cache_bytes=2**24)
         output_path = preprocessing.save_to_folder(
                 data_path, 'test_wrapper', 'test_1')
         report_dir = output_path+'report/'
@@ -36,6 +44,30 @@ class TestSimulationTools(unittest.TestCase):
                     report = yaml.load(file, Loader=yaml.FullLoader)
                     assert isinstance(report, dict),\
                         'The filetype returned in not a dictionary'
+        assert preprocessing.RUN_MARKER in report_location, \
+            'the completed run should be marked'
+        # resuming skips the completed run
+        report_times = {item: os.path.getmtime(report_dir+item)
+                        for item in report_location}
+        run.hardy_multi_transform(
+            data_path, tform_config_path, config_path,
+            iterator_mode='arrays', classifier='tuner',
+            num_test_files_class=1, classes=['noise', 'one'], split=0.5,
+            batch_size=1, project_name='test_wrapper', seed=3, resume=True)
+        assert report_times == {item: os.path.getmtime(report_dir+item)
+                                for item in os.listdir(report_dir)}, \
+            'the completed run should not be made again'
+        # but not a run made with other images
+        run.hardy_multi_transform(
+            data_path, tform_config_path, config_path,
+            iterator_mode='arrays', classifier='tuner',
+            num_test_files_class=1, classes=['noise', 'one'], split=0.5,
+            batch_size=1, project_name='test_wrapper', seed=3, resume=True,
+            image_precision='uint8')
+        marker = report_dir + preprocessing.RUN_MARKER
+        assert os.path.getmtime(marker) != report_times[
+            preprocessing.RUN_MARKER], \
+            'the run should be made again with other image options'
         shutil.rmtree('./hardy/test/test_data/test_wrapper')
 
         # use k-fold validation
@@ -57,6 +89,67 @@ class TestSimulationTools(unittest.TestCase):
         shutil.rmtree('./hardy/test/test_data/test_wrapper')
         pass
 
+    def test_hardy_multi_transform_processes(self):
+        # two runs at once, each in its own process, into the usual folders
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            two_run_config = os.path.join(tmp_dir, 'tform_config.yaml')
+            with open(two_run_config, 'w') as file:
+                yaml.dump({'tform_command_list': ['test_1', 'test_2'],
+                           'tform_command_dict': {
+                               'test_1': [[0, 'raw', 6], [5, 'raw', 7]],
+                               'test_2': [[0, 'raw', 7], [5, 'raw', 6]]}},
+                          file)
+            run.hardy_multi_transform(
+                data_path, two_run_config, config_path, k_fold=True, k=2,
+                iterator_mode='arrays', classifier='cnn',
+                num_test_files_class=1, classes=['noise', 'one'],
+                batch_size=1, project_name='test_wrapper', run_workers=2,
+                tf_threads=(1, 1))
+        for run_name in ['test_1', 'test_2']:
+            output_path = preprocessing.save_to_folder(
+                    data_path, 'test_wrapper', run_name)
+            report_dir = output_path+'report/'
+            assert any(item.endswith('.yaml') and
+                       item != 'run_tform_config.yaml'
+                       for item in os.listdir(report_dir)), \
+                'the run {} has no report'.format(run_name)
+        shutil.rmtree('./hardy/test/test_data/test_wrapper')
+        pass
+
+    def test_runs_to_resume(self):
+        # completed runs are skipped, the others are cleaned up
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            project_path = os.path.join(tmp_dir, 'project')
+            run_hashes = {'done': 'hash_1', 'partial': 'hash_2',
+                          'changed': 'hash_3', 'new': 'hash_4'}
+            preprocessing.write_run_marker(
+                os.path.join(project_path, 'done'), 'done', 'hash_1')
+            os.makedirs(os.path.join(project_path, 'partial', 'report'))
+            preprocessing.write_run_marker(
+                os.path.join(project_path, 'changed'), 'changed', 'old_hash')
+            runs = run._runs_to_resume(tmp_dir, 'project',
+                                       list(run_hashes), run_hashes)
+            assert runs == ['partial', 'changed', 'new'], \
+                'only the completed run should be skipped'
+            assert sorted(os.listdir(project_path)) == ['done'], \
+                'the folders of the runs to make should be deleted'
+
+            # A run that crashes partway does not keep the marker of the
+            # earlier run of the same hash
+            raw_tuples = catalogue._data_tuples_from_fnames(data_path)
+            with mock.patch.object(run, 'classifier_wrapper',
+                                   side_effect=RuntimeError('crash')):
+                with self.assertRaises(RuntimeError):
+                    run._transform_run(
+                        tmp_dir, [], 'done', None, config_path, 'arrays',
+                        {'print_out': False, 'project_name': 'project',
+                         'raw_tuples': raw_tuples},
+                        {'project_name': 'project'}, run_hash='hash_1')
+            assert not preprocessing.run_is_complete(
+                os.path.join(project_path, 'done'), 'hash_1'), \
+                'the crashed run should not be marked as complete'
+        pass
+
     def test_classifier_wrapper(self):
         num_files = 3
         run_name = 'test_1'
@@ -82,6 +175,87 @@ class TestSimulationTools(unittest.TestCase):
         # correctly created
         shutil.rmtree(path+'test_classifier/')
         print('the result folder was correctly deleted after testing')
+
+        # The seed and the image cache reach the learning and test sets
+        image_data = [('{}.csv'.format(i), np.zeros((4, 4, 3)),
+                       classes[i % 2]) for i in range(6)]
+        for k_fold, set_maker in ((False, 'learning_set'),
+                                  (True, 'test_set')):
+            with mock.patch.object(catalogue, set_maker,
+                                   side_effect=RuntimeError('stop')) as made:
+                with self.assertRaises(RuntimeError):
+                    run.classifier_wrapper(
+                        path, ['0.csv'], run_name, config_path,
+                        image_data=image_data, classifier='cnn',
+                        iterator_mode='tfdata', classes=classes,
+                        k_fold=k_fold, k=2, seed=3, image_cache=True)
+            assert made.call_args.kwargs['seed'] == 3, \
+                'the seed should be passed to {}'.format(set_maker)
+            assert made.call_args.kwargs['cache'], \
+                'the image cache should be passed to {}'.format(set_maker)
+        pass
+
+    def test_data_wrapper(self):
+        # images made from a preloaded list of raw tuples should match the
+        # ones made by reading the csv files inside the wrapper
+        raw_tuples = catalogue._data_tuples_from_fnames(data_path)
+        images = run.data_wrapper(data_path, print_out=False)
+        images_shared = run.data_wrapper(data_path, print_out=False,
+                                         raw_tuples=raw_tuples)
+        assert len(images) == len(images_shared), \
+            'the shared raw data gave a different number of images'
+        for item, item_shared in zip(images, images_shared):
+            assert item[0] == item_shared[0], 'the file order changed'
+            assert np.array_equal(item[1], item_shared[1]), \
+                'the images made from the shared raw data are different'
+        images_stream = run.data_wrapper(data_path, print_out=False,
+                                         stream=True)
+        assert len(images) == len(images_stream), \
+            'the streamed data gave a different number of images'
+        for item, item_stream in zip(images, images_stream):
+            assert item[0] == item_stream[0], 'the file order changed'
+            assert np.array_equal(item[1], item_stream[1]), \
+                'the streamed images are different'
+        images_rendered = run.data_wrapper(data_path, print_out=False,
+                                           raw_tuples=raw_tuples,
+                                           render_on_demand=True)
+        assert isinstance(images_rendered, catalogue.RenderedImages), \
+            'the images should be made on demand'
+        assert np.array_equal(images_rendered.images([3])[0], images[3][1]), \
+            'the images made on demand are different'
+        with tempfile.TemporaryDirectory() as records_dir:
+            images_records = run.data_wrapper(data_path, print_out=False,
+                                              raw_tuples=raw_tuples,
+                                              records_dir=records_dir)
+            assert isinstance(images_records, records.ImageRecords), \
+                'the images should be written to records'
+            images_uint8 = run.data_wrapper(data_path, print_out=False,
+                                            raw_tuples=raw_tuples,
+                                            image_precision='uint8')
+            assert np.array_equal(images_records.images([3])[0],
+                                  images_uint8[3][1]), \
+                'the images of the records are different'
+            # The records are read back, without the data being needed
+            images_reused = run.data_wrapper(data_path, print_out=False,
+                                             raw_tuples=[],
+                                             records_dir=records_dir)
+            assert images_reused.serials == images_records.serials, \
+                'the records of the run should be reused'
+            # The float32 packed data make records of their own
+            images_packed = run.data_wrapper(
+                data_path, print_out=False, packed=True,
+                raw_tuples=catalogue._data_tuples_from_fnames(
+                    data_path, packed=True), records_dir=records_dir)
+            assert images_packed.key != images_records.key, \
+                'the records of the packed data should have another key'
+        # Contradictory options are refused, instead of one being ignored
+        with self.assertRaises(ValueError):
+            run.data_wrapper(data_path, print_out=False, stream=True,
+                             raw_tuples=raw_tuples)
+        with self.assertRaises(ValueError):
+            run.hardy_multi_transform(
+                data_path, tform_config_path, config_path,
+                records_dir='records', render_on_demand=True)
         pass
 
     def test_print_time(self):
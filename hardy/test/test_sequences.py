@@ -0,0 +1,127 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from keras.preprocessing.image import ImageDataGenerator
+
+from hardy.handling import sequences
+
+
+class ArraySource():
+    """
+    The simplest image source: a dense array of images.
+    """
+    def __init__(self, images):
+        self.dense = images
+
+    def __len__(self):
+        return len(self.dense)
+
+    def images(self, indices):
+        return self.dense[indices]
+
+
+images = np.random.default_rng(0).random((10, 8, 8, 3))
+labels = np.eye(2)[np.arange(10) % 2]
+
+
+class TestSimulationTools(unittest.TestCase):
+
+    def test_image_sequence(self):
+        source = ArraySource(images)
+        sequence = sequences.ImageSequence(source, labels, batch_size=4)
+        assert len(sequence) == 3, 'the number of batches is wrong'
+        batch_x, batch_y = sequence[2]
+        assert batch_x.shape == (2, 8, 8, 3), 'the last batch is wrong'
+        # The same images and labels as the ImageDataGenerator flow
+        flow = ImageDataGenerator().flow(
+            (images.astype('float32')*255).astype('uint8'), labels,
+            batch_size=4, shuffle=False)
+        for i in range(len(sequence)):
+            np.testing.assert_array_equal(sequence[i][0], flow[i][0])
+            np.testing.assert_array_equal(sequence[i][1], flow[i][1])
+        np.testing.assert_array_equal(sequence.y, labels)
+        with self.assertRaises(IndexError):
+            sequence[3]
+
+    def test_image_sequence_shuffle(self):
+        source = ArraySource(images)
+        sequence = sequences.ImageSequence(source, labels,
+                                           indices=np.arange(2, 10),
+                                           batch_size=3, shuffle=True,
+                                           seed=1)
+        np.testing.assert_array_equal(sequence.y, labels[2:])
+        seen = np.concatenate([sequence[i][0] for i in range(len(sequence))])
+        assert len(seen) == 8, 'the set should have 8 images'
+        # Every image of the set comes out once
+        expected = (images[2:].astype('float32')*255).astype('uint8')
+        for image in expected:
+            assert any(np.array_equal(image, x) for x in seen), \
+                'an image of the set is missing'
+        sequence.on_epoch_end()
+        sequence.reset()
+        pass
+
+    def test_image_sequence_generator(self):
+        source = ArraySource(images)
+        data = ImageDataGenerator(rescale=1./255)
+        sequence = sequences.ImageSequence(source, labels, batch_size=5,
+                                           image_data_generator=data)
+        batch_x, batch_y = sequence[0]
+        assert batch_x.max() <= 1, 'the generator rescale was not applied'
+
+    def test_image_dataset(self):
+        # A source that makes its images, and one that has them in a tensor
+        source = ArraySource(images)
+        tensor_source = ArraySource((images*255).astype('uint8'))
+        tensor_source.tf_tensor = tf.constant(tensor_source.dense)
+        sequence = sequences.ImageSequence(source, labels, batch_size=4)
+        for data_source in [source, tensor_source]:
+            dataset = sequences.image_dataset(data_source, labels,
+                                              batch_size=4)
+            assert len(dataset) == len(sequence), \
+                'the dataset has a different number of batches'
+            for i, (batch_x, batch_y) in enumerate(dataset):
+                np.testing.assert_array_equal(batch_x, sequence[i][0])
+                np.testing.assert_array_equal(batch_y, sequence[i][1])
+
+        # The same seed gives the same shuffled orders
+        def epoch(dataset):
+            return np.concatenate([batch_y[:, 0] for batch_x, batch_y
+                                   in dataset.as_numpy_iterator()])
+        for data_source in [source, tensor_source]:
+            dataset = sequences.image_dataset(
+                data_source, np.eye(10), batch_size=3, shuffle=True, seed=2,
+                cache=True)
+            again = sequences.image_dataset(
+                data_source, np.eye(10), batch_size=3, shuffle=True, seed=2)
+            assert len(dataset) == 4, 'the dataset should have 4 batches'
+            first_epoch = epoch(dataset)
+            np.testing.assert_array_equal(first_epoch, epoch(again))
+            assert sorted(first_epoch) == sorted(epoch(dataset)), \
+                'every file should come out once in each epoch'
+
+        # Without a cache, the files are shuffled before their images are
+        # made, so that the set is never made all at once
+        dense_images = source.images
+        source.asked = []
+        source.images = lambda indices: (source.asked.append(indices)
+                                         or dense_images(indices))
+        dataset = sequences.image_dataset(source, np.eye(10), batch_size=3,
+                                          shuffle=True, seed=2)
+        source.asked = []
+        order = np.concatenate([batch_y.argmax(axis=1) for batch_x, batch_y
+                                in dataset.as_numpy_iterator()])
+        assert [len(asked) for asked in source.asked] == [3, 3, 3, 1], \
+            'the images should be made a batch at a time'
+        np.testing.assert_array_equal(np.concatenate(source.asked), order)
+        assert not np.array_equal(order, np.arange(10)), \
+            'the files should be asked for in the shuffled order'
+
+        data = ImageDataGenerator(rescale=1./255)
+        dataset = sequences.image_dataset(source, labels, batch_size=5,
+                                          image_data_generator=data)
+        batch_x, batch_y = next(iter(dataset))
+        assert batch_x.numpy().max() <= 1, \
+            'the generator rescale was not applied'
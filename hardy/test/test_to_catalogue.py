@@ -1,5 +1,7 @@
 import keras
 import os
+import shutil
+import tempfile
 import unittest
 
 import numpy as np
@@ -8,6 +10,7 @@ import pandas as pd
 from hardy.handling.to_catalogue import learning_set, test_set
 from hardy.handling import to_catalogue as catalogue
 from hardy.handling import pre_processing as preprocessing
+from concurrent.futures import ThreadPoolExecutor
 
 path = './hardy/test/test_image/'
 data_path = './hardy/test/test_data/'
@@ -69,6 +72,30 @@ class TestSimulationTools(unittest.TestCase):
         assert isinstance(testing, keras.preprocessing.image.NumpyArrayIterator
                           ), 'the training set should be an image iterator'
 
+    def test_label_codec_sets(self):
+        data_tups = catalogue._data_tuples_from_fnames(input_path=data_path)
+        plot_tups = catalogue.rgb_list(data_tups)
+        codec = catalogue.image_label_codec(plot_tups)
+        assert codec.label_names == sorted(set(
+            [tup[2] for tup in plot_tups])), \
+            'the codec should have every label'
+        # A test set of a single class is numbered as the whole set
+        one_class = [tup for tup in plot_tups if tup[2] == 'one']
+        testing = test_set(image_list=one_class, batch_size=batch_size,
+                           iterator_mode='arrays', classes=classes,
+                           label_codec=codec)
+        assert testing.y.shape == (len(one_class), 2), \
+            'the labels should have a column for each class of the codec'
+        assert np.all(testing.y[:, codec.class_indices['one']] == 1), \
+            'the class index should come from the shared codec'
+        train, val = learning_set(image_list=plot_tups, split=0,
+                                  batch_size=batch_size,
+                                  iterator_mode='arrays', classes=classes,
+                                  label_codec=codec)
+        assert np.array_equal(train.y, codec.one_hot(
+            [tup[2] for tup in plot_tups])), \
+            'the learning set should be encoded with the shared codec'
+
     def test_save_load_data(self):
         # Simple pickeling save / load function
         data_tups = catalogue._data_tuples_from_fnames(input_path=data_path)
@@ -104,6 +131,130 @@ class TestSimulationTools(unittest.TestCase):
             assert type(row[2]) is str, "Class label is not a string?"
         pass
 
+    def test_data_tuples_from_fnames_workers(self):
+        """
+        Reading the files with a pool of workers should give back the same
+        List-Of-Tuples, in the same order, as the single worker loop.
+        """
+        data_tups = catalogue._data_tuples_from_fnames(input_path=data_path)
+        for pool in ['process', 'thread']:
+            pool_tups = catalogue._data_tuples_from_fnames(
+                input_path=data_path, n_workers=2, chunk_size=3, pool=pool)
+            assert len(pool_tups) == len(data_tups), \
+                'the {} pool lost some of the files'.format(pool)
+            for row, pool_row in zip(data_tups, pool_tups):
+                assert row[0] == pool_row[0], 'the file order changed'
+                assert row[2] == pool_row[2], 'the labels changed'
+                pd.testing.assert_frame_equal(row[1], pool_row[1])
+        pass
+
+    def test_data_tuples_from_fnames_homogeneous(self):
+        """
+        Testing the homogeneous directory reader: same tuples as the
+            default reader, and the usual read for a file that does not
+            fit the schema of the first one.
+        """
+        data_tups = catalogue._data_tuples_from_fnames(input_path=data_path)
+        fast_tups = catalogue._data_tuples_from_fnames(input_path=data_path,
+                                                       homogeneous=True)
+        assert len(data_tups) == len(fast_tups), \
+            'the homogeneous reader lost some files'
+        for row, fast_row in zip(data_tups, fast_tups):
+            assert row[0] == fast_row[0], 'the file order changed'
+            assert row[2] == fast_row[2], 'the labels changed'
+            pd.testing.assert_frame_equal(row[1], fast_row[1])
+
+        temp_path = tempfile.mkdtemp() + '/'
+        csv_list = sorted([entry for entry in os.listdir(data_path)
+                           if entry.endswith('.csv')])
+        for entry in csv_list:
+            shutil.copy(data_path + entry, temp_path + entry)
+        odd_file = temp_path + csv_list[2]
+        fdata = pd.read_csv(odd_file)
+        fdata['extra [ohm]'] = 1.0
+        fdata.to_csv(odd_file, index=False)
+        fast_tups = catalogue._data_tuples_from_fnames(
+            input_path=temp_path, classes=classes, homogeneous=True)
+        for row in fast_tups:
+            if row[0] + '.csv' == csv_list[2]:
+                assert 'extra [ohm]' in row[1].columns, \
+                    'the file that does not fit was not read the usual way'
+        shutil.rmtree(temp_path)
+        pass
+
+    def test_data_tuples_from_fnames_cache(self):
+        """
+        The binary cache should give back the same data as the csv files,
+        both when it is first written and when it is read back, and should
+        read again a file that was modified.
+        """
+        cache_path = tempfile.mkdtemp() + '/'
+        for file in os.listdir(data_path):
+            if file.endswith('.csv'):
+                shutil.copy(data_path + file, cache_path)
+        data_tups = catalogue._data_tuples_from_fnames(input_path=cache_path)
+        cold_tups = catalogue._data_tuples_from_fnames(
+            input_path=cache_path, cache=True, cache_shard_size=7)
+        assert os.path.exists(cache_path + '.hardy_cache/manifest.pkl'), \
+            'the cache manifest was not written'
+        warm_tups = catalogue._data_tuples_from_fnames(
+            input_path=cache_path, cache=True, cache_shard_size=7)
+        for tups in [cold_tups, warm_tups]:
+            assert len(tups) == len(data_tups), 'the cache lost some files'
+            for row, cache_row in zip(data_tups, tups):
+                assert row[0] == cache_row[0], 'the file order changed'
+                assert row[2] == cache_row[2], 'the labels changed'
+                pd.testing.assert_frame_equal(row[1], cache_row[1])
+        # Change one file, the cache should notice and read it again
+        changed = sorted(f for f in os.listdir(cache_path)
+                         if f.endswith('.csv'))[0]
+        fdata = pd.read_csv(cache_path + changed)
+        fdata.iloc[:, 1] = 2 * fdata.iloc[:, 1]
+        fdata.to_csv(cache_path + changed, index=False)
+        os.utime(cache_path + changed, ns=(0, 0))
+        changed_tups = catalogue._data_tuples_from_fnames(
+            input_path=cache_path, cache=True, cache_shard_size=7)
+        for row in changed_tups:
+            if row[0] + '.csv' == changed:
+                assert np.allclose(row[1].iloc[:, 0], fdata.iloc[:, 1]), \
+                    'the cache returned the data of the old file'
+        shutil.rmtree(cache_path)
+        pass
+
+    def test_packed_data_tuples(self):
+        """
+        Testing the packed container of the data tuples: same tuples as
+            the list (up to float32), read-only views of one buffer, and
+            usable by rgb_list.
+        """
+        data_tups = catalogue._data_tuples_from_fnames(input_path=data_path)
+        packed = catalogue._data_tuples_from_fnames(input_path=data_path,
+                                                    packed=True)
+        assert isinstance(packed, catalogue.PackedDataTuples), \
+            'packed=True did not give a PackedDataTuples'
+        assert len(packed) == len(data_tups), 'files were lost when packing'
+        assert packed.values.dtype == np.float32, 'values are not float32'
+        for row, packed_row in zip(data_tups, packed):
+            assert row[0] == packed_row[0], 'the file order changed'
+            assert row[2] == packed_row[2], 'the labels changed'
+            assert list(row[1].columns) == list(packed_row[1].columns), \
+                'the column names changed'
+            assert np.allclose(row[1].to_numpy(), packed_row[1].to_numpy(),
+                               rtol=1e-6), 'the values changed'
+        assert packed[-1][0] == data_tups[-1][0], 'negative index failed'
+        assert len(packed[1:3]) == 2, 'slicing failed'
+        with self.assertRaises(IndexError):
+            packed[len(packed)]
+        assert not packed.file_values(0).flags.writeable, \
+            'the views of the buffer should be read-only'
+
+        plot_tups = catalogue.rgb_list(packed)
+        assert len(plot_tups) == len(packed), 'rgb_list lost some images'
+        for row in plot_tups:
+            assert type(row[1]) is np.ndarray, \
+                "List-of-image-Tuples is not in np.ndarray format??"
+        pass
+
     def test_rgb_list(self):
         """
         Testing the Tuple-List image visualization wrapper
@@ -124,6 +275,179 @@ class TestSimulationTools(unittest.TestCase):
             assert type(row[2]) is str, "Class label is not a string?"
         pass
 
+    def test_rgb_list_precision(self):
+        """
+        Testing the uint8 images: within one step of the uint8 conversion
+            of the float64 images, and taken as they are by the Keras sets
+        """
+        data_tups = catalogue._data_tuples_from_fnames(input_path=data_path)
+        plot_tups = catalogue.rgb_list(data_tups, scale=0.2)
+        uint8_tups = catalogue.rgb_list(data_tups, scale=0.2,
+                                        precision='uint8')
+        batch_tups = catalogue.rgb_list(data_tups, scale=0.2, batch_size=4,
+                                        precision='uint8')
+        for row, uint8_row, batch_row in zip(plot_tups, uint8_tups,
+                                             batch_tups):
+            assert uint8_row[1].dtype == np.uint8, 'the image is not uint8'
+            expected = (row[1].astype('float32')*255).astype('uint8')
+            assert np.abs(uint8_row[1].astype(int) -
+                          expected.astype(int)).max() <= 1, \
+                'the uint8 image is too far from the float64 one'
+            np.testing.assert_array_equal(uint8_row[1], batch_row[1])
+        size = plot_tups[0][1].shape[:2]
+        train, val = learning_set(image_list=uint8_tups, split=0.5,
+                                  classes=['noise', 'one'],
+                                  target_size=size, batch_size=4)
+        # (flow takes the training set after the validation part)
+        np.testing.assert_array_equal(
+            train.x, np.array([row[1] for row in uint8_tups])[10:])
+        testing = test_set(image_list=uint8_tups, target_size=size,
+                           classes=['noise', 'one'], batch_size=4)
+        np.testing.assert_array_equal(
+            testing.x, np.array([row[1] for row in uint8_tups]))
+        pass
+
+    def test_rgb_batch(self):
+        """
+        Testing the batch image maker against rgb_visualize, and rgb_list
+            with a batch_size against the one by one rgb_list.
+        """
+        data_tups = catalogue._data_tuples_from_fnames(input_path=data_path)
+        for plot_format in ['RGBrgb', 'RgBrGb', 'single', 'else']:
+            for combine_method in ['add', 'mlt']:
+                rgb_images = catalogue.rgb_batch(data_tups[:3], plot_format,
+                                                 combine_method, scale=0.5)
+                for data_tuple, rgb_image in zip(data_tups, rgb_images):
+                    np.testing.assert_array_equal(
+                        rgb_image, catalogue.rgb_visualize(
+                            data_tuple[1], plot_format, combine_method,
+                            scale=0.5))
+
+        for combine_method in ['add', 'mlt']:
+            # The combined images are float32, hence the tolerance
+            rgb_images = catalogue.rgb_batch(data_tups, 'RGBrgb',
+                                             combine_method, scale=0.3)
+            profile_images = catalogue.rgb_batch(data_tups, 'RGBrgb',
+                                                 combine_method, scale=0.3,
+                                                 resample='profile')
+            np.testing.assert_allclose(profile_images, rgb_images, rtol=0,
+                                       atol=1e-6)
+
+        plot_tups = catalogue.rgb_list(data_tups)
+        batch_tups = catalogue.rgb_list(data_tups, batch_size=3)
+        assert len(plot_tups) == len(batch_tups), \
+            'the batches lost some images'
+        for row, batch_row in zip(plot_tups, batch_tups):
+            assert row[0] == batch_row[0], 'the file order changed'
+            assert row[2] == batch_row[2], 'the labels changed'
+            np.testing.assert_array_equal(row[1], batch_row[1])
+
+        # A batch of files of different lengths is made file by file
+        mixed_tups = [(data_tups[0][0], data_tups[0][1].iloc[:-10],
+                       data_tups[0][2])] + list(data_tups[1:3])
+        for row, batch_row in zip(catalogue.rgb_list(mixed_tups),
+                                  catalogue.rgb_list(mixed_tups,
+                                                     batch_size=3)):
+            np.testing.assert_array_equal(row[1], batch_row[1])
+        pass
+
+    def test_rgb_profiles(self):
+        """
+        Testing the lazy profile images: same images as rgb_list with the
+            'profile' resample, and the learning / test sets made from
+            them give the same batches as the dense arrays.
+        """
+        data_tups = catalogue._data_tuples_from_fnames(input_path=data_path)
+        plot_tups = catalogue.rgb_list(data_tups, resample='profile')
+        profiles = catalogue.rgb_profiles(data_tups)
+        assert isinstance(profiles, catalogue.ProfileImages), \
+            'rgb_profiles should give a ProfileImages'
+        assert profiles.nbytes < sum(row[1].nbytes for row in plot_tups), \
+            'the profiles are not smaller than the images'
+        for row, profile_row in zip(plot_tups, profiles):
+            assert row[0] == profile_row[0], 'the file order changed'
+            assert row[2] == profile_row[2], 'the labels changed'
+            np.testing.assert_array_equal(row[1], profile_row[1])
+
+        test_list, learning_list = catalogue.data_set_split(
+            profiles, [row[0] for row in plot_tups[::4]])
+        assert isinstance(test_list, catalogue.ProfileImages), \
+            'the split of ProfileImages should be ProfileImages'
+        assert len(test_list) + len(learning_list) == len(profiles), \
+            'files were lost in the split'
+
+        testing = test_set(image_list=profiles, batch_size=4,
+                           iterator_mode='arrays', classes=classes)
+        testing_dense = test_set(image_list=plot_tups, batch_size=4,
+                                 iterator_mode='arrays', classes=classes,
+                                 target_size=plot_tups[0][1].shape[:2])
+        assert len(testing) == len(testing_dense), \
+            'the profile test set has a different number of batches'
+        np.testing.assert_array_equal(testing.y, testing_dense.y)
+        for i in range(len(testing)):
+            np.testing.assert_array_equal(testing[i][0], testing_dense[i][0])
+
+        train, val = learning_set(image_list=profiles, split=0.25,
+                                  batch_size=4, iterator_mode='arrays',
+                                  classes=classes)
+        assert len(train.indices) + len(val.indices) == len(profiles), \
+            'files were lost in the learning set split'
+        assert list(val.indices) == list(range(len(val.indices))), \
+            'the validation set should be the first part, as in flow'
+        batch_x, batch_y = train[0]
+        assert batch_x.shape == (4,) + plot_tups[0][1].shape, \
+            'the training batch has the wrong shape'
+        assert batch_x.dtype == np.float32, 'the batch should be float32'
+        pass
+
+    def test_k_fold_learning_set(self):
+        """
+        Testing the k-fold sets: index arrays over one ImageTensor, the
+            validation sets of the k folds of one order splitting the files.
+        """
+        data_tups = catalogue._data_tuples_from_fnames(input_path=data_path)
+        plot_tups = catalogue.rgb_list(data_tups)
+        size = plot_tups[0][1].shape[:2]
+        images = catalogue.ImageTensor.from_tuples(plot_tups, size)
+        assert images.tensor.dtype == np.uint8, 'the tensor should be uint8'
+        assert images.tensor.shape == (len(plot_tups),) + \
+            plot_tups[0][1].shape, 'the tensor has the wrong shape'
+        assert [row[0] for row in images] == [row[0] for row in plot_tups], \
+            'the file order changed'
+
+        k = 4
+        order = np.random.permutation(len(images))
+        val_indices = []
+        for fold in range(k):
+            train, val = learning_set(image_list=images, batch_size=3,
+                                      iterator_mode='arrays',
+                                      classes=classes, target_size=size,
+                                      k_fold=True, k=k, fold=fold,
+                                      fold_order=order)
+            assert train.source is images and val.source is images, \
+                'the folds should index the same tensor'
+            assert len(train.indices) + len(val.indices) == len(images), \
+                'files were lost in the fold'
+            val_indices.extend(val.indices)
+        assert sorted(val_indices) == list(range(len(images))), \
+            'the validation sets of the folds should split the files'
+
+        # A list of image tuples gives the same batches
+        train_list, val_list = learning_set(
+            image_list=plot_tups, batch_size=3, iterator_mode='arrays',
+            classes=classes, target_size=size, k_fold=True, k=k,
+            fold=k-1, fold_order=order)
+        np.testing.assert_array_equal(train_list[0][0], train[0][0])
+        np.testing.assert_array_equal(val_list.y, val.y)
+
+        # The same seed cuts the same folds
+        folds = [learning_set(image_list=images, batch_size=3,
+                              iterator_mode='arrays', classes=classes,
+                              target_size=size, k_fold=True, k=k, fold=1,
+                              seed=5)[1].indices for i in range(2)]
+        np.testing.assert_array_equal(folds[0], folds[1])
+        pass
+
     def test_regular_plot_list(self):
         """
         Testing the Tuple-List image visualization wrapper
@@ -144,6 +468,121 @@ class TestSimulationTools(unittest.TestCase):
             assert type(row[2]) is str, "Class label is not a string?"
         pass
 
+    def test_image_tuples_to_tensor(self):
+        """
+        Testing the streaming path: the generators chained into one
+            preallocated array give the same images as rgb_list
+        """
+        data_tups = catalogue._data_tuples_from_fnames(input_path=data_path)
+        plot_tups = catalogue.rgb_list(data_tups)
+
+        stream = catalogue._data_tuples_from_fnames(input_path=data_path,
+                                                    stream=True)
+        assert not isinstance(stream, list), 'stream=True gave back a list'
+        stream_tups = catalogue.image_tuples_to_tensor(
+            catalogue.iter_rgb_tuples(stream), len(data_tups))
+        assert len(stream_tups) == len(plot_tups), \
+            'the stream gave a different number of images'
+        base = stream_tups[0][1].base
+        for row, stream_row in zip(plot_tups, stream_tups):
+            assert row[0] == stream_row[0], 'the file order changed'
+            assert row[2] == stream_row[2], 'the labels changed'
+            assert np.array_equal(row[1], stream_row[1]), \
+                'the streamed images are different'
+            assert stream_row[1].base is base, \
+                'the images are not views of one array'
+        with self.assertRaises(AssertionError):
+            catalogue.image_tuples_to_tensor(
+                catalogue.iter_rgb_tuples(data_tups), len(data_tups)+1)
+        pass
+
+    def test_render_parallel(self):
+        """
+        Testing the worker process rendering: the images written into the
+            shared array are the same as the serial ones
+        """
+        data_tups = catalogue._data_tuples_from_fnames(input_path=data_path)
+        rgb_tups = catalogue.rgb_list(data_tups, scale=0.2)
+        parallel_tups = catalogue.rgb_list(data_tups, scale=0.2, n_workers=2)
+        plot_tups = catalogue.regular_plot_list(data_tups[:4], scale=0.2)
+        parallel_plots = catalogue.render_parallel(
+            data_tups[:4], plot='regular', n_workers=2, chunk_size=1,
+            scale=0.2)
+        for serial, parallel in [(rgb_tups, parallel_tups),
+                                 (plot_tups, parallel_plots)]:
+            assert len(serial) == len(parallel), \
+                'the workers gave a different number of images'
+            for row, parallel_row in zip(serial, parallel):
+                assert row[0] == parallel_row[0], 'the file order changed'
+                assert row[2] == parallel_row[2], 'the labels changed'
+                assert np.array_equal(row[1], parallel_row[1]), \
+                    'the images of the workers are different'
+        assert parallel_plots[0][1].base is parallel_plots[3][1].base, \
+            'the images should be views of the shared array, not copies'
+        assert catalogue.render_parallel([], n_workers=2) == [], \
+            'no files should give no images'
+        pass
+
+    def test_rendered_images(self):
+        """
+        Testing the on demand images: same images as rgb_list, made by
+            workers, kept within the cache budget, and split / used as the
+            other lazy image lists.
+        """
+        data_tups = catalogue._data_tuples_from_fnames(input_path=data_path)
+        rgb_tups = catalogue.rgb_list(data_tups, scale=0.2)
+        image_bytes = rgb_tups[0][1].nbytes
+        rendered = catalogue.RenderedImages(data_tups, n_workers=2,
+                                            cache_bytes=3*image_bytes,
+                                            scale=0.2)
+        batch = rendered.images([4, 1, 4, 2])
+        for i, index in enumerate([4, 1, 4, 2]):
+            assert np.array_equal(batch[i], rgb_tups[index][1]), \
+                'the images made on demand are different'
+        assert rendered.misses == 3 and len(rendered._images) == 3, \
+            'each file of the batch should be made once, and kept'
+        rendered.images([1, 5])
+        assert rendered.hits == 2, 'the kept image should be used'
+        assert rendered.cached_bytes <= 3*image_bytes, \
+            'the cache is over its budget'
+        assert [row[0] for row in rendered] == [row[0] for row in rgb_tups], \
+            'the file order changed'
+
+        test_list, learning_list = catalogue.data_set_split(
+            rendered, [row[0] for row in rgb_tups[::4]])
+        assert isinstance(test_list, catalogue.RenderedImages), \
+            'the split of RenderedImages should be RenderedImages'
+        testing = test_set(image_list=test_list, batch_size=2,
+                           iterator_mode='arrays', classes=classes)
+        testing_dense = test_set(image_list=rgb_tups[::4], batch_size=2,
+                                 iterator_mode='arrays', classes=classes,
+                                 target_size=rgb_tups[0][1].shape[:2])
+        for i in range(len(testing)):
+            np.testing.assert_array_equal(testing[i][0], testing_dense[i][0])
+        rendered.close()
+
+        # The regular plots, one worker
+        plot_tups = catalogue.regular_plot_list(data_tups[:2], scale=0.2)
+        rendered = catalogue.RenderedImages(data_tups[:2], plot='regular',
+                                            scale=0.2)
+        assert np.array_equal(rendered.images([1])[0], plot_tups[1][1]), \
+            'the plot made on demand is different'
+
+        # Calls from many threads, evicting the images of each other
+        rendered = catalogue.RenderedImages(data_tups[:4],
+                                            cache_bytes=image_bytes,
+                                            scale=0.2)
+        batches = [[0, 1], [1, 2], [2, 3], [3, 0]]*5
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            made = list(executor.map(rendered.images, batches))
+        for indices, batch in zip(batches, made):
+            for i, index in enumerate(indices):
+                assert np.array_equal(batch[i], rgb_tups[index][1]), \
+                    'the images made from many threads are different'
+        assert rendered.cached_bytes <= image_bytes, \
+            'the cache is over its budget'
+        pass
+
     def test_rgb_visualize(self):
         """
         Individual data frame image maker. This is included in prior wrapps
@@ -175,6 +614,23 @@ class TestSimulationTools(unittest.TestCase):
             'the test set is not the correct length'
         assert isinstance(test_set_list, list), 'format should be a list'
         assert isinstance(learning_set_list, list), 'format should be a list'
+        # the same tuples (not copies), in the order of the image list
+        assert [row[0] for row in test_set_list] == \
+            [row[0] for row in plot_tups if row[0] in test_set_filenames], \
+            'the test set is not the test files, in order'
+        assert sorted(row[0] for row in test_set_list + learning_set_list) \
+            == sorted(row[0] for row in plot_tups), \
+            'files were lost in the split'
+        assert test_set_list[0] is plot_tups[
+            [row[0] for row in plot_tups].index(test_set_list[0][0])], \
+            'the tuples should not be copied'
+
+        serials = ['a', 'b', 'c', 'd', 'e']
+        test_indices, learning_indices = catalogue.data_set_split_indices(
+            serials, ['d', 'b', 'z'])
+        assert list(test_indices) == [1, 3] and \
+            list(learning_indices) == [0, 2, 4], \
+            'the split gave the wrong positions'
         pass
 
     def test_safe_clear_dirflow(self):
@@ -72,6 +72,28 @@ class TestSimulationTools(unittest.TestCase):
         assert test_array_x[0] == result[0], "The returned\
                 multiplication output is not correct"
 
+        # Arrays (or Series) as y, with powers
+        result = tforms.power(np.array(test_array_x), np.array(test_array_y),
+                              meta_data=[2, 1])
+        assert np.array_equal(result, np.power(test_array_x, 2) *
+                              np.array(test_array_y)), "The returned\
+                power output is not correct"
+
+    def test_transforms_2d(self):
+        # A 2-D array is transformed row by row, along its last axis
+        test_arrays = np.array([[1., 2., 4., 7., 11.],
+                                [3., 1., 2., 8., 5.]])
+        for tform in [tforms.exp, tforms.nlog, tforms.log10,
+                      tforms.reciprocal, tforms.cumsum, tforms.derivative_1d]:
+            result = tform(test_arrays)
+            for row, test_array in zip(result, test_arrays):
+                assert np.array_equal(row, tform(test_array)), \
+                    "{} is not applied row by row".format(tform.__name__)
+        result = tforms.derivative_2d(test_arrays, test_arrays[::-1])
+        for row, x, y in zip(result, test_arrays, test_arrays[::-1]):
+            assert np.array_equal(row, tforms.derivative_2d(x, y)), \
+                "derivative_2d is not applied row by row"
+
     def test_cwt_1d(self):
         """
         Testing Package for a 1-dimensional Continuous-Wavelet Transform
@@ -110,6 +132,32 @@ class TestSimulationTools(unittest.TestCase):
         result_y = tforms.cwt_1d(test_df, "y")
         assert np.allclose(result_1, result_y), "Not accepting y as 1 input"
 
+    def test_cwt_batch(self):
+        # The FFT transform of many signals against the direct convolution
+        #   of each signal with each wavelet (as scipy.signal.cwt does it)
+        x_linear = np.linspace(0, 10, 300)
+        signals = np.array([np.sin(2 * np.pi * f * x_linear) + 0.1 * x_linear
+                            for f in [0.1, 0.5, 2.0]])
+        widths = tforms.cwt_widths(len(x_linear), w_method='log',
+                                   n_widths=12)
+        assert len(widths) <= 12 and widths[0] == 1 and \
+            widths[-1] == len(x_linear) - 1, "The log widths are not right"
+        result = tforms.cwt_batch(signals, widths)
+        assert result.shape == (3, len(widths), len(x_linear)), \
+            "The returned shape is not (signals, widths, points)"
+        for signal, cwt_matrix in zip(signals, result):
+            for width, row in zip(widths, cwt_matrix):
+                wavelet = tforms.ricker(
+                    int(np.ceil(min(10 * width, len(signal)))), width)
+                expected = np.convolve(signal, wavelet[::-1], mode='same')
+                assert np.allclose(row, expected, rtol=0, atol=1e-10), \
+                    "The FFT convolution is not the direct one"
+        assert np.allclose(tforms.cwt_1d(signals[1], widths=widths),
+                           result[1]), "cwt_1d is not cwt_batch of one signal"
+        assert tforms.cwt_1d(signals[1]).shape == (len(x_linear) - 1,
+                                                   len(x_linear)), \
+            "The linear widths should give every width up to M-1"
+
     def test_derivative_2d(self):
 
         x = [1, 2, 3, 4, 5, 6, 7, 8]
@@ -1,12 +1,19 @@
 import unittest
 
+import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
 # import hardy.handling.visualization as visualization
 from hardy.handling.visualization import (normalize, normalize_image, rgb_plot,
                                           orthogonal_images_add,
-                                          orthogonal_images_mlt)
+                                          orthogonal_images_mlt,
+                                          normalize_batch, rgb_plot_batch,
+                                          orthogonal_images_add_batch,
+                                          orthogonal_images_mlt_batch,
+                                          regular_plot, regular_plot_batch,
+                                          get_img_from_fig,
+                                          image_as_precision)
 
 #####################################################################
 # Define arrays for testing the funcitons in visualization
@@ -20,6 +27,12 @@ image_to_normalize[:, :, 0] = array_to_normalize
 image_to_normalize[:, :, 1] = array_to_normalize*2 + 1
 image_to_normalize[:, :, 2] = np.sqrt(array_to_normalize) + 2
 
+# A batch of (n_files, n_points, 3) profiles, with an all-zero channel
+profiles_to_plot = np.zeros([4, n, 3])
+for i in range(4):
+    profiles_to_plot[i, :, 0] = array_to_normalize*(i+1) - 10
+    profiles_to_plot[i, :, 1] = np.sin(array_to_normalize + i)/2
+
 
 class TestSimulationTools(unittest.TestCase):
 
@@ -86,3 +99,123 @@ class TestSimulationTools(unittest.TestCase):
             'array or a pandas dataframe'
         assert isinstance(rgb_plot_array, np.ndarray), \
             'the resulting image should be a numpy array'
+
+    def test_normalize_batch(self):
+        normalized_profiles = normalize_batch(profiles_to_plot)
+        assert normalized_profiles.shape == profiles_to_plot.shape, \
+            'the normalized batch changed shape'
+        for i in range(len(profiles_to_plot)):
+            for channel in range(3):
+                np.testing.assert_array_equal(
+                    normalized_profiles[i, :, channel],
+                    normalize(profiles_to_plot[i, :, channel]),
+                    err_msg='the batch is not normalized as each profile')
+
+    def test_rgb_plot_batch(self):
+        for scale in [1.0, 0.5]:
+            rgb_plots = rgb_plot_batch(profiles_to_plot, scale=scale)
+            assert rgb_plots.shape == (4, n*scale, n*scale, 3), \
+                'the batch of images has the wrong shape'
+            for i in range(len(profiles_to_plot)):
+                rgb_plot_array = rgb_plot(profiles_to_plot[i, :, 0],
+                                          profiles_to_plot[i, :, 1],
+                                          profiles_to_plot[i, :, 2],
+                                          plot=False, scale=scale)
+                np.testing.assert_array_equal(
+                    rgb_plots[i], rgb_plot_array,
+                    err_msg='the batch images differ from rgb_plot')
+
+    def test_orthogonal_images_batch(self):
+        images_x = rgb_plot_batch(profiles_to_plot)
+        images_y = rgb_plot_batch(profiles_to_plot[:, ::-1, ::-1])
+        # An image with no data at all, to check the zero-image cases
+        images_y[1] = 0
+        combined_add = orthogonal_images_add_batch(images_x, images_y)
+        combined_mlt = orthogonal_images_mlt_batch(images_x, images_y)
+        for i in range(len(images_x)):
+            np.testing.assert_array_equal(
+                combined_add[i],
+                orthogonal_images_add(images_x[i], images_y[i], plot=False),
+                err_msg='the batch differs from orthogonal_images_add')
+            np.testing.assert_array_equal(
+                combined_mlt[i],
+                orthogonal_images_mlt(images_x[i].copy(), images_y[i].copy(),
+                                      plot=False),
+                err_msg='the batch differs from orthogonal_images_mlt')
+
+    def test_resample_profile(self):
+        # Resizing the data first must give the resized image, to within
+        # float rounding, for one image and for a batch
+        for scale in [0.5, 0.3, 1.5]:
+            rgb_plot_image = rgb_plot(profiles_to_plot[0, :, 0],
+                                      profiles_to_plot[0, :, 1],
+                                      plot=False, scale=scale)
+            rgb_plot_profile = rgb_plot(profiles_to_plot[0, :, 0],
+                                        profiles_to_plot[0, :, 1],
+                                        plot=False, scale=scale,
+                                        resample='profile')
+            assert rgb_plot_image.shape == rgb_plot_profile.shape, \
+                'the resampled image has the wrong shape'
+            np.testing.assert_allclose(rgb_plot_profile, rgb_plot_image,
+                                       rtol=0, atol=1e-12)
+            np.testing.assert_allclose(
+                rgb_plot_batch(profiles_to_plot, scale=scale,
+                               resample='profile'),
+                rgb_plot_batch(profiles_to_plot, scale=scale),
+                rtol=0, atol=1e-12)
+
+    def test_image_as_precision(self):
+        # uint8 images are the 0-255 values learning_set makes from floats
+        image = rgb_plot(profiles_to_plot[0, :, 0], profiles_to_plot[0, :, 1],
+                         plot=False, scale=0.5)
+        assert image_as_precision(image) is image, \
+            'no precision should leave the image as it is'
+        image_uint8 = image_as_precision(image, 'uint8')
+        assert image_uint8.dtype == np.uint8, 'the image should be uint8'
+        np.testing.assert_array_equal(
+            image_uint8, (image.astype('float32')*255).astype('uint8'))
+        with self.assertRaises(ValueError):
+            image_as_precision(image, 'float16')
+        # Images made in float32 are within float32 rounding of the float64
+        # ones (so within one step of the uint8 ones)
+        for precision in ['float32', 'uint8']:
+            plot_precision = rgb_plot(profiles_to_plot[0, :, 0],
+                                      profiles_to_plot[0, :, 1],
+                                      plot=False, scale=0.5,
+                                      precision=precision)
+            assert plot_precision.dtype == np.dtype(precision), \
+                'the image is not in the given precision'
+            assert plot_precision.shape == image.shape, \
+                'the image has the wrong shape'
+            np.testing.assert_allclose(
+                plot_precision.astype(np.float64),
+                image_as_precision(image, precision).astype(np.float64),
+                rtol=0, atol=1e-6 if precision == 'float32' else 1)
+        assert rgb_plot_batch(profiles_to_plot, scale=0.5,
+                              precision='uint8').dtype == np.uint8, \
+            'the batch is not in the given precision'
+
+    def test_regular_plot(self):
+        # The direct rasterization must give the image of the PNG round-trip
+        dataframes = [pd.DataFrame({'x': array_to_normalize,
+                                    'y': np.sin(array_to_normalize*i),
+                                    'z': np.cos(array_to_normalize)*i})
+                      for i in range(1, 4)]
+        dataframes.append(dataframes[0][['x', 'y']])
+        png_images = []
+        for dataframe in dataframes:
+            fig = plt.figure(figsize=(5, 5))
+            ax = fig.add_subplot(1, 1, 1)
+            for column in list(dataframe)[1:]:
+                ax.scatter(dataframe['x'], dataframe[column])
+            ax.axis('off')
+            png_images.append(get_img_from_fig(fig, scale=0.2))
+            plt.close()
+        plot_images = regular_plot_batch(dataframes, scale=0.2)
+        assert plot_images.shape == (4, 100, 100, 3), \
+            'the batch of plots has the wrong shape'
+        for dataframe, png_image, plot_image in zip(dataframes, png_images,
+                                                    plot_images):
+            np.testing.assert_array_equal(plot_image, png_image)
+            np.testing.assert_array_equal(
+                regular_plot(dataframe, scale=0.2), png_image)